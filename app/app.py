@@ -3,25 +3,43 @@
 ## This file contains the Flask app, database models (Book, User, Purchase),
 ## authentication (Flask-Login) and manager-only routes for inventory and
 ## purchase review. Comments explain the purpose of each section.
-from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, make_response, session, Response
+from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, make_response, session, Response, abort, send_from_directory, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
+from flask_login import LoginManager, UserMixin, AnonymousUserMixin, login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import datetime, timedelta
 from functools import wraps
-from sqlalchemy import text, union_all, or_
-from io import StringIO
+from sqlalchemy import text, union_all, or_, literal_column
+from sqlalchemy.orm.attributes import set_committed_value
 import os, json
+import hmac
 import csv
 import random
+import re
 import string
-import smtplib
+import time
+import uuid
 from payment_utils import validate_payment_method, process_payment, handle_payment_error, detect_card_type, luhn_check
 from payment_utils import PaymentError, CardDeclinedError, InvalidPaymentMethodError, InsufficientFundsError, NetworkTimeoutError
-from encryption_utils import DataEncryption
+from encryption_utils import DataEncryption, EncryptedField
+from search_index import ensure_search_index, isbn_fragment, search_subquery
+from mail_queue import MailDispatcher, SMTPTransport, FileTransport, MemoryTransport
+from cart_pricing import price_cart
+from pagination import apply_order_filters, clamp_page_size, paginate_keyset
+from order_stats import OrderStatistics
+from live_events import EventBus, stream_events
+from inventory_import import ImportReport, import_books
+from csv_export import iter_chunks, iter_csv
+from sales_reporting import GROUPINGS, SalesReporting, year_earlier
+from sales_rollup import SalesRollup
+from inventory import InsufficientStock, InventoryService
+from sqlite_tuning import check_settings, engine_options, install_pragmas, pragma_profile
+from schema_migrations import full_scan_warnings, migrate as migrate_schema
+from session_store import ServerSessionInterface, SqlSessionStore
+from book_cache import BookCache
+from ciphertext_jobs import CiphertextRewriter, EncryptedColumns
+from request_metrics import RequestMetrics
 
 # Initialize Flask app
 app = Flask(__name__, instance_relative_config=True)
@@ -32,6 +50,11 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)  # Fallback timeo
 app.config['SESSION_COOKIE_HTTPONLY'] = True  # Security: prevent JavaScript access to session cookie
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HTTPS
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # CSRF protection
+# Session data lives in the server_sessions table and the cookie holds only its ID;
+# SESSION_BACKEND=cookie switches back to Flask's signed cookie sessions
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'server').lower()
+# Sessions kept decoded per process (use 0 when running several worker processes)
+app.config['SESSION_CACHE_SIZE'] = int(os.environ.get('SESSION_CACHE_SIZE', 1024))
 
 # Auto-logout configuration for admin inactivity
 ADMIN_SESSION_TIMEOUT = timedelta(minutes=10)  # 10 minutes of inactivity
@@ -49,13 +72,27 @@ os.makedirs(app.instance_path, exist_ok=True)
 # Configure file upload to use instance/uploads
 app.config['UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024
+# Inventory CSV imports stream large catalog feeds; only /upload_csv uses this limit
+app.config['CSV_IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('CSV_IMPORT_MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+IMPORT_REPORT_FOLDER = os.path.join(app.config['UPLOAD_FOLDER'], 'import_reports')
+# Process pool size for decrypting large CSV exports (0 = decrypt in the request process)
+app.config['EXPORT_DECRYPT_WORKERS'] = int(os.environ.get('EXPORT_DECRYPT_WORKERS', 0))
+# Rows fetched, decrypted and written per step of a streamed CSV export
+app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+# Rows per page in the admin order views and the orders API
+app.config['ORDERS_PAGE_SIZE'] = int(os.environ.get('ORDERS_PAGE_SIZE', 50))
 ALLOWED_EXTENSIONS = {'csv'}
 
-# Configure SQLAlchemy to use DB inside instance
+# Configure SQLAlchemy to use DB inside instance (DATABASE_URL points elsewhere, e.g. for tests)
 db_path = os.path.join(app.instance_path, 'inventory.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# WAL, busy_timeout etc. on every connection (SQLITE_<PRAGMA> env vars override)
+SQLITE_PRAGMAS = pragma_profile()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(SQLITE_PRAGMAS)
 db = SQLAlchemy(app)
+with app.app_context():
+    install_pragmas(db.engine, SQLITE_PRAGMAS)
 
 # =============================
 # DISCOUNT CODE CONFIGURATION
@@ -99,29 +136,100 @@ BOOK_GENRES = [
 # Initialize encryption for sensitive data
 encryption = DataEncryption()
 
+# =============================
+# OUTBOUND EMAIL CONFIGURATION
+# =============================
+# Requests only write to the email outbox; background workers deliver it.
+# MAIL_TRANSPORT: 'smtp' (default), 'file' (writes .eml files) or 'memory' (tests)
+MAIL_SENDER = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
+MAIL_TRANSPORT = os.environ.get('MAIL_TRANSPORT', 'smtp').lower()
+
+if MAIL_TRANSPORT == 'file':
+    mail_transport = FileTransport(os.path.join(app.instance_path, 'outbox_mail'))
+elif MAIL_TRANSPORT == 'memory':
+    mail_transport = MemoryTransport()
+else:
+    mail_transport = SMTPTransport('smtp.gmail.com', 587, MAIL_SENDER,
+                                   os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
+
+mail_dispatcher = MailDispatcher(
+    transport=mail_transport,
+    sender=MAIL_SENDER,
+    workers=int(os.environ.get('MAIL_WORKERS', 2)),
+    # Bodies carry 2FA codes, reset links and contact details: encrypted until sent, then blanked
+    cipher=encryption,
+    retention_days=float(os.environ.get('MAIL_RETENTION_DAYS', 30))
+)
+
+# Cached order status counts for admin pages (seconds)
+order_stats = OrderStatistics(ttl_seconds=float(os.environ.get('ORDER_STATS_TTL', 30)))
+
+# Set-based sales queries (daily rollups and prices stored on purchases)
+sales_reporting = SalesReporting()
+
+# Daily sales totals per title, maintained alongside checkout and status changes
+sales_rollup = SalesRollup()
+
+# Atomic stock changes; checkout holds last INVENTORY_HOLD_SECONDS (0 disables holds)
+stock = InventoryService(hold_seconds=float(os.environ.get('INVENTORY_HOLD_SECONDS', 600)))
+
+# Storefront book lookups by ISBN; catalog and stock writes call book_cache.bump()
+book_cache = BookCache(max_size=int(os.environ.get('BOOK_CACHE_SIZE', 2048)),
+                       ttl_seconds=float(os.environ.get('BOOK_CACHE_TTL', 30)))
+
+# Server-side session storage (see SESSION_BACKEND)
+session_store = SqlSessionStore()
+if app.config['SESSION_BACKEND'] == 'server':
+    app.session_interface = ServerSessionInterface(session_store, cache_size=app.config['SESSION_CACHE_SIZE'])
+
+# Per-endpoint timing, SQL counts, decryptions and SMTP time (/admin/metrics, /metrics);
+# METRICS_LOG_JSON=1 also prints one JSON line per request
+request_metrics = RequestMetrics(log=print if os.environ.get('METRICS_LOG_JSON') == '1' else None)
+with app.app_context():
+    request_metrics.init_app(app, db)
+request_metrics.instrument(encryption, 'decrypt', 'decrypt')
+# decrypt_many() takes any iterable; a generator is counted as one call rather than consumed
+request_metrics.instrument(encryption, 'decrypt_many', 'decrypt',
+                           amount=lambda values, *args, **kwargs: len(values) if hasattr(values, '__len__') else 1)
+request_metrics.instrument(mail_transport, 'send', 'smtp')
+# Bearer token that lets a Prometheus scraper read /metrics without a manager login
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# In-process pub/sub feeding the admin dashboard's live update stream
+live_events = EventBus()
+LOW_STOCK_THRESHOLD = 5
+
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.init_app(app)
 
+
+class AnonymousUser(AnonymousUserMixin):
+    """Visitor who is not logged in; answers the same type checks as User and Customer."""
+    is_customer = False
+
+
+login_manager.anonymous_user = AnonymousUser
+
 # Define Book model
 class Book(db.Model):
     isbn = db.Column(db.String(20), primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     author = db.Column(db.String(100), nullable=False)
     price = db.Column(db.Float, nullable=False)
-    quantity = db.Column(db.Integer, default=0)
+    quantity = db.Column(db.Integer, default=0, index=True)  # low-stock listings
     in_stock = db.Column(db.Boolean, default=True)
     cover_type = db.Column(db.String(50))
     description = db.Column(db.Text)
-    genre = db.Column(db.String(100), nullable=True)  # New field for notifications
+    genre = db.Column(db.String(100), nullable=True, index=True)  # New field for notifications
 
 
 # Simple User model for manager authentication
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), nullable=True)  # Email for notifications
+    email = db.Column(db.String(120), nullable=True, index=True)  # Email for notifications
     full_name = db.Column(db.String(100), nullable=True)  # Full name for notifications
     # keep both fields for compatibility with older DBs that used `password`
     password_hash = db.Column(db.String(128), nullable=True)
@@ -135,9 +243,12 @@ class User(db.Model, UserMixin):
     two_fa_verified = db.Column(db.Boolean, default=False)  # Whether 2FA was completed for current session
 
     # Password Reset fields
-    reset_token = db.Column(db.String(100), nullable=True)  # Password reset token
+    reset_token = db.Column(db.String(100), nullable=True, index=True)  # Password reset token
     reset_token_expires = db.Column(db.DateTime, nullable=True)  # When the reset token expires
 
+    # Managers share routes' current_user with customers; see Customer.is_customer
+    is_customer = False
+
     def set_password(self, password):
         hashed = generate_password_hash(password)
         self.password_hash = hashed
@@ -213,6 +324,7 @@ class Customer(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email_encrypted = db.Column(db.Text, nullable=False)  # Encrypted email storage
+    email_hash = db.Column(db.String(64), index=True)  # Blind index for email lookups
     password_hash = db.Column(db.String(128), nullable=False)
     full_name = db.Column(db.String(100), nullable=False)
     phone_encrypted = db.Column(db.Text, nullable=True)  # Encrypted phone storage
@@ -232,84 +344,18 @@ class Customer(db.Model, UserMixin):
     receive_marketing = db.Column(db.Boolean, default=False)
     
     # Password Reset fields
-    reset_token = db.Column(db.String(100), nullable=True)  # Password reset token
+    reset_token = db.Column(db.String(100), nullable=True, index=True)  # Password reset token
     reset_token_expires = db.Column(db.DateTime, nullable=True)  # When the reset token expires
     
-    # Properties for transparent encryption/decryption
-    @property
-    def email(self):
-        """Decrypt and return email address."""
-        if self.email_encrypted:
-            return encryption.decrypt(self.email_encrypted)
-        return None
-    
-    @email.setter
-    def email(self, value):
-        """Encrypt and store email address."""
-        if value:
-            self.email_encrypted = encryption.encrypt(value)
-        else:
-            self.email_encrypted = None
-    
-    @property
-    def phone(self):
-        """Decrypt and return phone number."""
-        if self.phone_encrypted:
-            return encryption.decrypt(self.phone_encrypted)
-        return None
-    
-    @phone.setter
-    def phone(self, value):
-        """Encrypt and store phone number."""
-        if value:
-            self.phone_encrypted = encryption.encrypt(value)
-        else:
-            self.phone_encrypted = None
-    
-    @property
-    def address(self):
-        """Decrypt and return address."""
-        if self.address_encrypted:
-            return encryption.decrypt(self.address_encrypted)
-        return None
-    
-    @address.setter
-    def address(self, value):
-        """Encrypt and store address."""
-        if value:
-            self.address_encrypted = encryption.encrypt(value)
-        else:
-            self.address_encrypted = None
+    # Transparent encryption/decryption, decrypted at most once per instance
+    email = EncryptedField(encryption, 'email_encrypted', index_column='email_hash')
+    phone = EncryptedField(encryption, 'phone_encrypted')
+    address = EncryptedField(encryption, 'address_encrypted')
+    address_line1 = EncryptedField(encryption, 'address_line1_encrypted')
+    address_line2 = EncryptedField(encryption, 'address_line2_encrypted')
     
-    @property
-    def address_line1(self):
-        """Decrypt and return address line 1."""
-        if self.address_line1_encrypted:
-            return encryption.decrypt(self.address_line1_encrypted)
-        return None
-    
-    @address_line1.setter
-    def address_line1(self, value):
-        """Encrypt and store address line 1."""
-        if value:
-            self.address_line1_encrypted = encryption.encrypt(value)
-        else:
-            self.address_line1_encrypted = None
-    
-    @property
-    def address_line2(self):
-        """Decrypt and return address line 2."""
-        if self.address_line2_encrypted:
-            return encryption.decrypt(self.address_line2_encrypted)
-        return None
-    
-    @address_line2.setter
-    def address_line2(self, value):
-        """Encrypt and store address line 2."""
-        if value:
-            self.address_line2_encrypted = encryption.encrypt(value)
-        else:
-            self.address_line2_encrypted = None
+    # Lets routes tell customers from managers without touching encrypted fields
+    is_customer = True
     
     def set_password(self, password):
         """Set password hash for customer."""
@@ -370,65 +416,93 @@ class Order(db.Model):
     customer_id = db.Column(db.Integer, default=1)  # required by legacy schema
 
 
-# New safe Purchase model stored in table 'purchases' to avoid touching legacy 'order' table
-class Purchase(db.Model):
-    __tablename__ = 'purchases'
-    id = db.Column(db.Integer, primary_key=True)
-    customer_name = db.Column(db.String(120), nullable=False)
+class EncryptedContactMixin:
+    """Encrypted customer email/phone/address columns with transparent accessors.
+    
+    Getters read `contact_ciphertexts`, which subclasses may point elsewhere
+    (order lines read their order header's).
+    """
     customer_email_encrypted = db.Column(db.Text)  # Encrypted email storage
+    customer_email_hash = db.Column(db.String(64), index=True)  # Blind index for email lookups
     customer_phone_encrypted = db.Column(db.Text)  # Encrypted phone storage
     customer_address_encrypted = db.Column(db.Text)  # Encrypted address storage
-    book_isbn = db.Column(db.String(50))
+    
+    @property
+    def contact_ciphertexts(self):
+        """(email, phone, address) ciphertexts for this record."""
+        return self.customer_email_encrypted, self.customer_phone_encrypted, self.customer_address_encrypted
+    
+    customer_email = EncryptedField(encryption, 'customer_email_encrypted', index_column='customer_email_hash',
+                                    source=lambda record: record.contact_ciphertexts[0])
+    customer_phone = EncryptedField(encryption, 'customer_phone_encrypted',
+                                    source=lambda record: record.contact_ciphertexts[1])
+    customer_address = EncryptedField(encryption, 'customer_address_encrypted',
+                                      source=lambda record: record.contact_ciphertexts[2])
+
+
+# Order header: one row per checkout, holding the customer's contact details once
+class CustomerOrder(EncryptedContactMixin, db.Model):
+    __tablename__ = 'orders'
+    id = db.Column(db.Integer, primary_key=True)
+    customer_name = db.Column(db.String(120), nullable=False)
+    subtotal = db.Column(db.Float, default=0.0)
+    discount_code = db.Column(db.String(50))
+    discount_amount = db.Column(db.Float, default=0.0)
+    total = db.Column(db.Float, default=0.0)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def add_line(self, **fields):
+        """Create a Purchase line for this order, sharing its name, email index and time."""
+        line = Purchase(order=self, customer_name=self.customer_name,
+                        customer_email_hash=self.customer_email_hash,
+                        timestamp=self.timestamp, **fields)
+        db.session.add(line)
+        return line
+    
+    def __repr__(self):
+        return f'<CustomerOrder {self.id} ({len(self.lines)} lines)>'
+
+
+# New safe Purchase model stored in table 'purchases' to avoid touching legacy 'order' table.
+# Each row is one order line; rows from before order headers existed carry their own contact details.
+class Purchase(EncryptedContactMixin, db.Model):
+    __tablename__ = 'purchases'
+    __table_args__ = (
+        # Serves status GROUP BY counts and status-filtered, time-ordered listings
+        db.Index('ix_purchases_status_timestamp', 'status', 'timestamp'),
+        # Date-range sales listings and rollup rebuilds scan purchases by time
+        db.Index('ix_purchases_timestamp', 'timestamp'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), index=True)
+    customer_name = db.Column(db.String(120), nullable=False)
+    book_isbn = db.Column(db.String(50), index=True)
     quantity = db.Column(db.Integer, default=1)
+    # Prices as charged at checkout, so reports never depend on the live catalog
+    unit_price = db.Column(db.Float)
+    line_total = db.Column(db.Float)  # unit_price * quantity, before discount
+    discount_amount = db.Column(db.Float, default=0.0)  # this line's share of the order discount
     status = db.Column(db.String(50), default='Pending')
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     source = db.Column(db.String(20), default='purchase')  # indicate this is from purchases table
     
-    # Properties for transparent encryption/decryption
-    @property
-    def customer_email(self):
-        """Decrypt and return customer email."""
-        if self.customer_email_encrypted:
-            return encryption.decrypt(self.customer_email_encrypted)
-        return None
-    
-    @customer_email.setter
-    def customer_email(self, value):
-        """Encrypt and store customer email."""
-        if value:
-            self.customer_email_encrypted = encryption.encrypt(value)
-        else:
-            self.customer_email_encrypted = None
+    # Many-to-one, so listings fetch the header in the same query
+    order = db.relationship('CustomerOrder', lazy='joined',
+                            backref=db.backref('lines', order_by='Purchase.id'))
     
     @property
-    def customer_phone(self):
-        """Decrypt and return customer phone."""
-        if self.customer_phone_encrypted:
-            return encryption.decrypt(self.customer_phone_encrypted)
-        return None
-    
-    @customer_phone.setter
-    def customer_phone(self, value):
-        """Encrypt and store customer phone."""
-        if value:
-            self.customer_phone_encrypted = encryption.encrypt(value)
-        else:
-            self.customer_phone_encrypted = None
+    def contact_ciphertexts(self):
+        """(email, phone, address) ciphertexts: the order header's, or this row's own for older rows."""
+        if self.order is not None and self.customer_email_encrypted is None:
+            return self.order.contact_ciphertexts
+        return self.customer_email_encrypted, self.customer_phone_encrypted, self.customer_address_encrypted
     
     @property
-    def customer_address(self):
-        """Decrypt and return customer address."""
-        if self.customer_address_encrypted:
-            return encryption.decrypt(self.customer_address_encrypted)
-        return None
-    
-    @customer_address.setter
-    def customer_address(self, value):
-        """Encrypt and store customer address."""
-        if value:
-            self.customer_address_encrypted = encryption.encrypt(value)
-        else:
-            self.customer_address_encrypted = None
+    def net_total(self):
+        """Amount actually charged for this line (line total less its discount share)."""
+        if self.line_total is None:
+            return None
+        return self.line_total - (self.discount_amount or 0.0)
     
     # Status options
     STATUS_OPTIONS = [
@@ -466,9 +540,7 @@ class Purchase(db.Model):
     
     def get_book(self):
         """Return the Book object associated with this purchase."""
-        if self.book_isbn:
-            return Book.query.filter_by(isbn=self.book_isbn).first()
-        return None
+        return book_cache.get(self.book_isbn)
 
 # Sale model for customer shopping cart purchases
 class Sale(db.Model):
@@ -507,21 +579,8 @@ class PaymentMethod(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Property for transparent encryption/decryption of PayPal email
-    @property
-    def paypal_email(self):
-        """Decrypt and return PayPal email."""
-        if self.paypal_email_encrypted:
-            return encryption.decrypt(self.paypal_email_encrypted)
-        return None
-    
-    @paypal_email.setter
-    def paypal_email(self, value):
-        """Encrypt and store PayPal email."""
-        if value:
-            self.paypal_email_encrypted = encryption.encrypt(value)
-        else:
-            self.paypal_email_encrypted = None
+    # Transparent encryption/decryption of PayPal email
+    paypal_email = EncryptedField(encryption, 'paypal_email_encrypted')
     
     def __repr__(self):
         return f'<PaymentMethod {self.method_type}: ${self.amount}>'
@@ -580,6 +639,122 @@ class NotificationLog(db.Model):
         return f'<NotificationLog {self.customer_id}: {self.notification_type}>'
 
 
+class OutboxEmail(db.Model):
+    """Durable queue of outgoing emails, delivered by the mail dispatcher."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)  # encrypted; blanked once sent or given up on
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboxEmail {self.id} to {self.recipient}: {self.status}>'
+
+
+class DailySalesRollup(db.Model):
+    """Units, revenue and orders per day, title and status bucket (see sales_rollup.py)."""
+    __tablename__ = 'daily_sales_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    isbn = db.Column(db.String(50), primary_key=True)
+    status_bucket = db.Column(db.String(20), primary_key=True)  # open, fulfilled, cancelled
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class InventoryReservation(db.Model):
+    """Copies taken from stock while a customer is on the payment page (see inventory.py)."""
+    __tablename__ = 'inventory_reservations'
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False, index=True)
+    isbn = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class ServerSessionRecord(db.Model):
+    """Flask session contents, keyed by the ID in the session cookie (see session_store.py)."""
+    __tablename__ = 'server_sessions'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# Every column holding DataEncryption output, for jobs that rewrite stored ciphertexts
+ENCRYPTED_COLUMNS = [
+    EncryptedColumns('customer', ['email_encrypted', 'phone_encrypted', 'address_encrypted',
+                                  'address_line1_encrypted', 'address_line2_encrypted']),
+    EncryptedColumns('orders', ['customer_email_encrypted', 'customer_phone_encrypted', 'customer_address_encrypted']),
+    EncryptedColumns('purchases', ['customer_email_encrypted', 'customer_phone_encrypted', 'customer_address_encrypted']),
+    EncryptedColumns('payment_methods', ['paypal_email_encrypted']),
+    EncryptedColumns('email_outbox', ['body']),
+]
+
+# Checkpoint name of the re-encryption job for the current key; a new key starts a new job
+KEY_ROTATION_JOB = f"rotate-{encryption.key_id}"
+
+
+mail_dispatcher.init_app(app, db, OutboxEmail)
+order_stats.init_app(db, Purchase)
+sales_reporting.init_app(db, Purchase, Book, DailySalesRollup)
+sales_rollup.init_app(db, DailySalesRollup, Purchase)
+stock.init_app(db, Book, InventoryReservation)
+book_cache.init_app(db, Book)
+session_store.init_app(db, ServerSessionRecord)
+
+
+# =============================
+# LIVE DASHBOARD EVENTS
+# =============================
+
+def order_counts_payload():
+    """Current dashboard counters, sent with every order event."""
+    return {'counts': order_stats.dashboard_counts(), 'total': order_stats.total()}
+
+
+def low_stock_entries(books):
+    """Snapshot books at or below the low-stock threshold.
+    
+    Call before commit; committing expires the loaded books and reading them
+    afterwards would cost one query each.
+    """
+    return [
+        {'isbn': book.isbn, 'title': book.title, 'quantity': book.quantity}
+        for book in books if book.quantity <= LOW_STOCK_THRESHOLD
+    ]
+
+
+def publish_new_orders(count, low_stock=()):
+    """Tell open dashboards that `count` purchases were just committed."""
+    order_stats.invalidate()
+    try:
+        live_events.publish('order_created', {'new_orders': count, **order_counts_payload()})
+        for entry in low_stock:
+            live_events.publish('low_stock', entry)
+    except Exception as e:
+        print(f"Error publishing dashboard events: {e}")
+
+
+def publish_status_change(order_ids, new_status):
+    """Tell open dashboards that orders moved to `new_status`."""
+    order_stats.invalidate()
+    try:
+        live_events.publish('status_changed', {'ids': list(order_ids), 'status': new_status, **order_counts_payload()})
+    except Exception as e:
+        print(f"Error publishing dashboard events: {e}")
+
+
 # =============================
 # ENCRYPTION HELPER FUNCTIONS
 # =============================
@@ -596,6 +771,89 @@ def decrypt_data(encrypted_data):
         return None
     return encryption.decrypt(encrypted_data)
 
+def email_blind_index(email):
+    """Helper function to compute the indexed lookup hash for an email."""
+    return encryption.blind_index(email)
+
+def decrypt_purchase_contacts(purchases, workers=None):
+    """Batch-decrypt email, phone and address for a list of purchases.
+    
+    Returns a list of (email, phone, address) tuples in the same order, so
+    list views and exports decrypt whole columns in one call instead of
+    one property read per field. Lines of the same order share their
+    header's ciphertexts, which are decrypted once.
+    """
+    ciphertexts = [p.contact_ciphertexts for p in purchases]
+    unique = list(dict.fromkeys(value for fields in ciphertexts for value in fields if value))
+    plaintexts = dict(zip(unique, encryption.decrypt_many(unique, workers=workers)))
+    return [tuple(plaintexts.get(value) for value in fields) for fields in ciphertexts]
+
+
+def purchase_rows(purchases):
+    """Flatten purchases into dicts with their contact details decrypted.
+    
+    The admin order list and the orders API both render these, so a page of
+    purchases is decrypted in one batch and no per-row classes are built.
+    """
+    rows = []
+    for p, (email, phone, address) in zip(purchases, decrypt_purchase_contacts(purchases)):
+        rows.append({
+            'id': p.id,
+            'source': 'purchase',
+            'customer_name': p.customer_name,
+            'customer_email': email,
+            'customer_phone': phone,
+            'customer_address': address,
+            'book_isbn': p.book_isbn,
+            'quantity': p.quantity,
+            'status': p.status,
+            'timestamp': p.timestamp,
+            'timestamp_str': p.timestamp.strftime('%Y-%m-%d %H:%M') if p.timestamp else ''
+        })
+    return rows
+
+
+def paginated_orders(model):
+    """Return the keyset page of `model` rows selected by the request's query string.
+    
+    Reads status, start_date, end_date, cursor and limit from request.args.
+    Raises ValueError for a malformed date or cursor.
+    """
+    query = apply_order_filters(model.query, model,
+                                status=request.args.get('status'),
+                                start_date=request.args.get('start_date'),
+                                end_date=request.args.get('end_date'))
+    limit = clamp_page_size(request.args.get('limit'), app.config['ORDERS_PAGE_SIZE'])
+    return paginate_keyset(query, model, cursor=request.args.get('cursor'), limit=limit)
+
+
+def streaming_csv_response(filename, header, row_chunks, quoting=csv.QUOTE_MINIMAL):
+    """Stream CSV row chunks as a download; `?gzip=1` compresses on the fly."""
+    compress = request.args.get('gzip') == '1'
+    if compress:
+        filename += '.gz'
+    return Response(
+        stream_with_context(iter_csv(header, row_chunks, compress=compress, quoting=quoting)),
+        mimetype='application/gzip' if compress else 'text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
+def purchase_export_chunks(query, include_source=False):
+    """Yield CSV rows for a purchases query one chunk at a time.
+    
+    Each chunk's contact fields are decrypted in one batch, so memory stays
+    bounded by EXPORT_CHUNK_SIZE however many purchases match.
+    """
+    workers = app.config['EXPORT_DECRYPT_WORKERS']
+    for chunk in iter_chunks(query, app.config['EXPORT_CHUNK_SIZE']):
+        contacts = decrypt_purchase_contacts(chunk, workers=workers)
+        rows = []
+        for p, (email, phone, address) in zip(chunk, contacts):
+            prefix = [p.id, 'purchase'] if include_source else [p.id]
+            rows.append(prefix + [p.customer_name, email, phone, address, p.book_isbn, p.quantity, p.status, p.timestamp])
+        yield rows
+
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -630,6 +888,34 @@ def unauthorized():
     return redirect(url_for('login'))
 
 
+def regenerate_session():
+    """Move the session to a new ID and delete the old one, on every change of privilege."""
+    regenerate = getattr(app.session_interface, 'regenerate', None)
+    if regenerate is not None:  # SESSION_BACKEND=cookie has no stored ID to replace
+        regenerate(session)
+
+
+# Session keys carried over a logout, as before sessions were regenerated: the shopping cart
+KEPT_ON_LOGOUT = ('cart', 'discount_code')
+
+
+def end_session():
+    """Log out and drop the session and its stored row, keeping only the shopping cart.
+    
+    A checkout hold is returned to stock first; it would otherwise hide the
+    held copies until it expires.
+    """
+    released = release_checkout_hold()
+    db.session.commit()
+    book_cache.invalidate(released)
+    
+    kept = {key: session[key] for key in KEPT_ON_LOGOUT if key in session}
+    session.clear()
+    logout_user()
+    regenerate_session()
+    session.update(kept)
+
+
 def manager_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -641,8 +927,7 @@ def manager_required(func):
         
         # Check for session timeout
         if check_session_timeout():
-            logout_user()
-            session.pop('last_activity', None)
+            end_session()
             flash('Your session has expired due to inactivity. Please login again.', 'warning')
             return redirect(url_for('login'))
         
@@ -673,8 +958,7 @@ def timeout_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         if check_session_timeout():
-            logout_user()
-            session.pop('last_activity', None)
+            end_session()
             flash('Your session has expired due to inactivity. Please login again.', 'warning')
             return redirect(url_for('login'))
         
@@ -717,29 +1001,16 @@ def send_admin_notification(subject, message, order_details=None):
         
         body += f"\n\nView the admin dashboard: http://127.0.0.1:5000/admin\n\nBest regards,\nChapter 6: A Plot Twist Bookstore System"
         
-        # Send email to each admin
+        # Queue one email per admin; the mail workers deliver them
+        recipients = []
         for admin in admin_users:
             if not admin.email:
                 print(f"Skipping {admin.username} - no email address configured")
                 continue
-                
-            try:
-                msg = MIMEText(body)
-                msg['Subject'] = subject
-                msg['From'] = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
-                msg['To'] = admin.email
-                
-                smtp = smtplib.SMTP('smtp.gmail.com', 587)
-                smtp.starttls()
-                smtp.login(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                          os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
-                smtp.sendmail(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                             [admin.email], msg.as_string())
-                smtp.quit()
-                print(f"Notification sent to {admin.full_name or admin.username} ({admin.email})")
-                
-            except Exception as e:
-                print(f"Failed to send notification to {admin.email}: {e}")
+            recipients.append(admin.email)
+        
+        if recipients and mail_dispatcher.enqueue(recipients, subject, body):
+            print(f"Notification queued for {len(recipients)} admin(s)")
                 
     except Exception as e:
         print(f"Error sending admin notifications: {e}")
@@ -801,21 +1072,11 @@ The Chapter 6 Team
 Email: chapter6aplottwist@gmail.com
 """
         
-        # Send email
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
-        msg['To'] = customer_email
-        
-        smtp = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp.starttls()
-        smtp.login(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                  os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
-        smtp.sendmail(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                     [customer_email], msg.as_string())
-        smtp.quit()
-        
-        print(f"Purchase confirmation sent to {customer_name} ({customer_email})")
+        # Queue email
+        if not mail_dispatcher.enqueue(customer_email, subject, body):
+            return False
+        
+        print(f"Purchase confirmation queued for {customer_name} ({customer_email})")
         return True
         
     except Exception as e:
@@ -849,21 +1110,11 @@ If you did not request this code, please contact your system administrator immed
 Best regards,
 Chapter 6: A Plot Twist Security System"""
 
-        # Send email
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
-        msg['To'] = user.email
-        
-        smtp = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp.starttls()
-        smtp.login(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                  os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
-        smtp.sendmail(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                     [user.email], msg.as_string())
-        smtp.quit()
-        
-        print(f"2FA code sent to {user.email}")
+        # Queue email
+        if not mail_dispatcher.enqueue(user.email, subject, body):
+            return False
+        
+        print(f"2FA code queued for {user.email}")
         return True
         
     except Exception as e:
@@ -899,21 +1150,11 @@ If you did not request this password reset, please ignore this email. Your passw
 Best regards,
 Chapter 6: A Plot Twist Security Team"""
 
-        # Send email
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
-        msg['To'] = email
-        
-        smtp = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp.starttls()
-        smtp.login(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                  os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
-        smtp.sendmail(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), 
-                     [email], msg.as_string())
-        smtp.quit()
-        
-        print(f"Password reset email sent to {email}")
+        # Queue email
+        if not mail_dispatcher.enqueue(email, subject, body):
+            return False
+        
+        print(f"Password reset email queued for {email}")
         return True
         
     except Exception as e:
@@ -923,17 +1164,51 @@ Chapter 6: A Plot Twist Security Team"""
 
 def get_order_details_dict(purchase):
     """Convert a Purchase object to a dictionary for notifications."""
+    customer_email, customer_phone = encryption.decrypt_many(list(purchase.contact_ciphertexts[:2]))
     return {
         'id': purchase.id,
         'customer_name': purchase.customer_name,
-        'customer_email': purchase.customer_email,
-        'customer_phone': purchase.customer_phone,
+        'customer_email': customer_email,
+        'customer_phone': customer_phone,
         'book_isbn': purchase.book_isbn,
         'quantity': purchase.quantity,
         'status': purchase.status,
         'timestamp': purchase.timestamp.strftime('%Y-%m-%d %H:%M:%S') if purchase.timestamp else 'N/A'
     }
 
+def apply_book_search(books_query, search, fallback_columns):
+    """Restrict a Book query to full-text matches for the search string.
+
+    Returns the filtered query and the BM25 rank column to order by. When
+    FTS5 is unavailable the query falls back to LIKE filters on
+    `fallback_columns` and the rank column is None. Input that looks like
+    an ISBN also matches ISBNs containing it, hyphens ignored; those books
+    rank after full-text matches.
+    """
+    fragment = isbn_fragment(search)
+    isbn_match = None
+    if fragment:
+        isbn_match = or_(Book.isbn.ilike(f'%{search.strip()}%'),
+                         db.func.replace(Book.isbn, '-', '').ilike(f'%{fragment}%'))
+    
+    if ensure_search_index(db.engine):
+        matches = search_subquery(search)
+        if matches is not None:
+            on_rowid = literal_column('book.rowid') == matches.c.book_rowid
+            if isbn_match is None:
+                return books_query.join(matches, on_rowid), matches.c.rank
+            books_query = books_query.outerjoin(matches, on_rowid).filter(
+                or_(matches.c.book_rowid.isnot(None), isbn_match)
+            )
+            # BM25 ranks are negative, so ISBN-only matches (no rank) sort last
+            return books_query, db.func.coalesce(matches.c.rank, 0.0)
+    
+    filters = [col.ilike(f'%{search}%') for col in fallback_columns]
+    if isbn_match is not None:
+        filters.append(isbn_match)
+    return books_query.filter(or_(*filters)), None
+
+
 # --- CSV Catalog Browser Integration ---
 def load_catalog(file_path):
     """Load catalog data from a CSV file."""
@@ -961,19 +1236,16 @@ def catalog_view():
     # Get search and filter parameters
     search = (request.args.get('search') or '').strip()
     genre = (request.args.get('genre') or '').strip()
-    sort = request.args.get('sort', 'title')
+    sort = request.args.get('sort', 'relevance')  # relevance falls back to title without a search
     
     # Load books from database inventory
     books_query = Book.query.filter(Book.quantity > 0)  # Only show books in stock
     
-    # Apply search filter
+    # Apply full-text search filter
+    search_rank = None
     if search:
-        books_query = books_query.filter(
-            db.or_(
-                Book.title.contains(search),
-                Book.author.contains(search),
-                Book.description.contains(search)
-            )
+        books_query, search_rank = apply_book_search(
+            books_query, search, [Book.title, Book.author, Book.description]
         )
     
     # Apply genre filter
@@ -981,8 +1253,8 @@ def catalog_view():
         books_query = books_query.filter(Book.genre == genre)
     
     # Apply sorting
-    if sort == 'title':
-        books_query = books_query.order_by(Book.title.asc())
+    if sort == 'relevance' and search_rank is not None:
+        books_query = books_query.order_by(search_rank.asc(), Book.title.asc())
     elif sort == 'author':
         books_query = books_query.order_by(Book.author.asc())
     elif sort == 'price':
@@ -996,9 +1268,9 @@ def catalog_view():
     
     # Get available genres from books in stock and predefined genres
     available_genres = set()
-    for book in Book.query.filter(Book.quantity > 0).all():
-        if book.genre:
-            available_genres.add(book.genre)
+    for (book_genre,) in db.session.query(Book.genre).filter(Book.quantity > 0).distinct():
+        if book_genre:
+            available_genres.add(book_genre)
     
     # Add predefined genres that might not be in current inventory
     for predefined_genre in BOOK_GENRES:
@@ -1049,15 +1321,20 @@ def inventory():
                          category=category, 
                          selected_genre=selected_genre,
                          categories=categories,
-                         available_genres=available_genres)
+                         available_genres=available_genres,
+                         import_report=session.get('import_report'))
 
 
 @app.route('/orders')
 @login_required
 @manager_required
 def orders_view():
-    orders = Order.query.order_by(Order.timestamp.desc()).all()
-    return render_template('orders.html', orders=orders)
+    try:
+        page = paginated_orders(Order)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('orders_view'))
+    return render_template('orders.html', orders=page.items, page=page)
 
 
 @app.route('/orders/update/<int:order_id>', methods=['POST'])
@@ -1076,7 +1353,9 @@ def update_order(order_id):
     
     if new_status and old_status != new_status:
         order.status = new_status
+        sales_rollup.record_status_change(order, old_status)
         db.session.commit()
+        publish_status_change([order_id], new_status)
         
         # Send notification for status change
         try:
@@ -1100,8 +1379,12 @@ def update_order(order_id):
 @login_required
 @manager_required
 def purchases_view():
-    purchases = Purchase.query.order_by(Purchase.timestamp.desc()).all()
-    return render_template('purchases.html', purchases=purchases)
+    try:
+        page = paginated_orders(Purchase)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('purchases_view'))
+    return render_template('purchases.html', purchases=purchase_rows(page.items), page=page)
 
 
 @app.route('/purchases/update/<int:purchase_id>', methods=['POST'])
@@ -1118,7 +1401,9 @@ def update_purchase(purchase_id):
     
     if new_status and old_status != new_status:
         p.status = new_status
+        sales_rollup.record_status_change(p, old_status)
         db.session.commit()
+        publish_status_change([purchase_id], new_status)
         
         # Send notification for status change
         try:
@@ -1152,35 +1437,27 @@ def guest_checkout():
         return redirect(url_for('view_cart'))
     
     if request.method == 'GET':
-        # Calculate cart totals
-        cart_items = []
-        subtotal = 0
-        
-        for isbn, qty in cart.items():
-            book = Book.query.filter_by(isbn=isbn).first()
-            if book:
-                # Check inventory
-                if book.quantity < qty:
-                    flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
-                    return redirect(url_for('view_cart'))
-                cart_items.append((book, qty))
-                subtotal += book.price * qty
-        
-        # Calculate discount
-        discount_code = session.get('discount_code')
-        discount_amount = 0
-        if discount_code and discount_code in DISCOUNT_CODES:
-            discount_rate, min_order = DISCOUNT_CODES[discount_code]
-            if subtotal >= min_order:
-                discount_amount = subtotal * discount_rate
+        # Calculate cart totals and check inventory; any earlier hold is returned first
+        released = release_checkout_hold()
+        quote = quote_cart(cart, fresh=True)
+        if quote.first_shortfall:
+            db.session.commit()
+            book_cache.invalidate(released)
+            book, _ = quote.first_shortfall
+            flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
+            return redirect(url_for('view_cart'))
         
-        total = subtotal - discount_amount
+        try:
+            hold_checkout_stock(quote, released)
+        except InsufficientStock as e:
+            flash(stock_error_message(e), "danger")
+            return redirect(url_for('view_cart'))
         
         return render_template('guest_checkout.html', 
-                             cart_items=cart_items,
-                             subtotal=subtotal,
-                             discount_amount=discount_amount,
-                             total=total)
+                             cart_items=quote.items,
+                             subtotal=quote.subtotal,
+                             discount_amount=quote.discount_amount,
+                             total=quote.total)
     
     # Process guest checkout form
     first_name = request.form.get('first_name', '').strip()
@@ -1227,11 +1504,8 @@ def guest_checkout():
     payment_success = False
     payment_error = None
     
-    print(f"DEBUG: Processing payment method: {payment_method}")
-    
     try:
         if payment_method == 'credit_card':
-            print("DEBUG: Processing credit card payment")
             card_number = request.form.get('card_number', '').strip()
             expiry_date = request.form.get('expiry_date', '').strip()
             cvv = request.form.get('cvv', '').strip()
@@ -1246,12 +1520,9 @@ def guest_checkout():
                 return redirect(url_for('guest_checkout'))
             
             payment_success = True
-            print("DEBUG: Credit card payment validated successfully")
             
         elif payment_method == 'paypal':
-            print("DEBUG: Processing PayPal payment")
             paypal_email = request.form.get('paypal_email', '').strip()
-            print(f"DEBUG: PayPal email received: {paypal_email}")
             
             if not paypal_email:
                 flash("PayPal email is required.", "danger")
@@ -1262,10 +1533,8 @@ def guest_checkout():
                 return redirect(url_for('guest_checkout'))
             
             payment_success = True
-            print("DEBUG: PayPal payment validated successfully")
             
         elif payment_method == 'bank_transfer':
-            print("DEBUG: Processing bank transfer payment")
             bank_account = request.form.get('bank_account', '').strip()
             
             if not bank_account:
@@ -1273,31 +1542,26 @@ def guest_checkout():
                 return redirect(url_for('guest_checkout'))
             
             payment_success = True
-            print("DEBUG: Bank transfer payment validated successfully")
-        
-        print(f"DEBUG: Payment validation complete. Success: {payment_success}")
         
         if payment_success:
-            print("DEBUG: Starting purchase creation process")
             # Calculate totals
-            subtotal = 0
-            cart_items = []
-            
-            for isbn, qty in cart.items():
-                book = Book.query.filter_by(isbn=isbn).first()
-                if book:
-                    cart_items.append((book, qty))
-                    subtotal += book.price * qty
+            quote = quote_cart(cart, fresh=True)
+            cart_items = quote.items
+            if not cart_items:
+                flash("None of the books in your cart are available any more.", "warning")
+                return redirect(url_for('view_cart'))
             
-            # Calculate discount
+            # Take the stock in one conditional UPDATE (claiming the checkout page's hold)
+            try:
+                take_checkout_stock(quote)
+            except InsufficientStock as e:
+                db.session.rollback()
+                flash(stock_error_message(e), "danger")
+                return redirect(url_for('view_cart'))
+            subtotal = quote.subtotal
             discount_code = session.get('discount_code')
-            discount_amount = 0
-            if discount_code and discount_code in DISCOUNT_CODES:
-                discount_rate, min_order = DISCOUNT_CODES[discount_code]
-                if subtotal >= min_order:
-                    discount_amount = subtotal * discount_rate
-            
-            total = subtotal - discount_amount
+            discount_amount = quote.discount_amount
+            total = quote.total
             
             # Create purchase record
             from datetime import datetime
@@ -1305,59 +1569,54 @@ def guest_checkout():
             # Combine first and last name for customer_name field
             customer_full_name = f"{first_name} {last_name}"
             
-            purchase = Purchase(
+            # Order header: contact details are encrypted once for the whole order
+            order = CustomerOrder(
                 customer_name=customer_full_name,
-                customer_email_encrypted=encrypt_data(email),
-                customer_phone_encrypted=encrypt_data(phone),
-                customer_address_encrypted=encrypt_data(complete_address),
-                timestamp=datetime.utcnow(),
-                status='Pending'
+                customer_email=email,
+                customer_phone=phone,
+                customer_address=complete_address,
+                subtotal=subtotal,
+                discount_code=quote.discount_code,
+                discount_amount=discount_amount,
+                total=total,
+                timestamp=datetime.utcnow()
             )
+            db.session.add(order)
             
-            db.session.add(purchase)
-            db.session.flush()  # Get the purchase ID
-            
-            print(f"DEBUG: Purchase created with ID: {purchase.id}")
-            
-            # Create individual order records for each book and update inventory
-            for book, qty in cart_items:
-                print(f"DEBUG: Creating order for book {book.title}, qty: {qty}")
-                
-                # Create separate purchase record for each book (matching legacy structure)
-                book_purchase = Purchase(
-                    customer_name=customer_full_name,
-                    customer_email_encrypted=encrypt_data(email),
-                    customer_phone_encrypted=encrypt_data(phone),
-                    customer_address_encrypted=encrypt_data(complete_address),
+            # Create an order line for each book and update inventory
+            lines = []
+            for book, qty, unit_price, line_total, line_discount in quote.priced_lines():
+                book_purchase = order.add_line(
                     book_isbn=book.isbn,
                     quantity=qty,
-                    timestamp=datetime.utcnow(),
+                    unit_price=unit_price,
+                    line_total=line_total,
+                    discount_amount=line_discount,
                     status='Pending'
                 )
-                db.session.add(book_purchase)
-                
-                # Update book inventory
-                book.quantity -= qty
-                print(f"DEBUG: Updated inventory for {book.title}, new quantity: {book.quantity}")
+                lines.append(book_purchase)
+                sales_rollup.record_sale(book_purchase)
             
-            db.session.commit()
+            # Prepare purchase details for emails before commit expires the loaded books
+            purchase_details = []
+            for book, qty in cart_items:
+                purchase_details.append({
+                    'title': book.title,
+                    'author': book.author,
+                    'isbn': book.isbn,
+                    'quantity': qty,
+                    'price': book.price,
+                    'genre': book.genre
+                })
+            low_stock = low_stock_entries(book for book, _ in cart_items)
             
-            print(f"DEBUG: Purchase records created successfully")
+            db.session.commit()
+            book_cache.invalidate(book.isbn for book, _ in cart_items)
+            session.pop('inventory_hold', None)
+            publish_new_orders(len(cart_items), low_stock)
             
             # Send email notifications
             try:
-                # Prepare purchase details for emails
-                purchase_details = []
-                for book, qty in cart_items:
-                    purchase_details.append({
-                        'title': book.title,
-                        'author': book.author,
-                        'isbn': book.isbn,
-                        'quantity': qty,
-                        'price': book.price,
-                        'genre': book.genre
-                    })
-                
                 # Calculate discount info for email
                 discount_info = None
                 if discount_amount > 0:
@@ -1368,24 +1627,20 @@ def guest_checkout():
                     }
                 
                 # Send customer confirmation email
-                print(f"DEBUG: Sending customer confirmation email to {email}")
                 customer_email_sent = send_customer_purchase_notification(
                     customer_email=email,
                     customer_name=customer_full_name,
                     purchase_details=purchase_details,
-                    transaction_id=f"GUEST-{purchase.id}",
+                    transaction_id=f"GUEST-{order.id}",
                     discount_info=discount_info
                 )
                 
-                if customer_email_sent:
-                    print(f"DEBUG: Customer confirmation email sent successfully")
-                else:
-                    print(f"DEBUG: Failed to send customer confirmation email")
+                if not customer_email_sent:
+                    app.logger.warning(f"Confirmation email for guest order {order.id} could not be queued")
                 
                 # Send admin notification
-                print(f"DEBUG: Sending admin notification for guest order")
                 admin_order_details = {
-                    'id': f"GUEST-{purchase.id}",
+                    'id': f"GUEST-{order.id}",
                     'customer_name': customer_full_name,
                     'customer_email': email,
                     'customer_phone': phone,
@@ -1398,8 +1653,8 @@ def guest_checkout():
                 
                 # Create summary of items for admin email
                 items_summary = ""
-                for book, qty in cart_items:
-                    items_summary += f"• {book.title} by {book.author} (ISBN: {book.isbn}) - Qty: {qty} @ ${book.price:.2f} each\n"
+                for item in purchase_details:
+                    items_summary += f"• {item['title']} by {item['author']} (ISBN: {item['isbn']}) - Qty: {item['quantity']} @ ${item['price']:.2f} each\n"
                 
                 admin_message = f"""A new guest order has been placed!
 
@@ -1421,38 +1676,31 @@ Discount ({discount_code}): -${discount_amount:.2f}"""
                 admin_message += f"""
 Total: ${total:.2f}
 
-Transaction ID: GUEST-{purchase.id}
+Transaction ID: GUEST-{order.id}
 Order Date: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
 
 Please process this order promptly."""
                 
                 send_admin_notification(
-                    subject=f"New Guest Order - #{purchase.id} - ${total:.2f}",
+                    subject=f"New Guest Order - #{order.id} - ${total:.2f}",
                     message=admin_message,
                     order_details=admin_order_details
                 )
                 
-                print(f"DEBUG: Admin notification sent for guest order")
-                
             except Exception as email_error:
-                print(f"DEBUG: Email notification error: {email_error}")
                 # Don't fail the order if email fails - log and continue
-                app.logger.error(f"Email notification failed for guest order {purchase.id}: {email_error}")
+                app.logger.error(f"Email notification failed for guest order {order.id}: {email_error}")
             
             # Clear cart and discount
             session.pop('cart', None)
             session.pop('discount_code', None)
             
-            flash(f"Thank you for your purchase! Your order #{purchase.id} has been confirmed.", "success")
-            return redirect(url_for('guest_purchase_confirmation', purchase_id=purchase.id))
+            flash(f"Thank you for your purchase! Your order #{order.id} has been confirmed.", "success")
+            return redirect(url_for('guest_purchase_confirmation', purchase_id=lines[0].id))
     
     except Exception as e:
         db.session.rollback()
-        print(f"DEBUG: Guest checkout error occurred: {str(e)}")
-        print(f"DEBUG: Error type: {type(e)}")
-        import traceback
-        print(f"DEBUG: Full traceback: {traceback.format_exc()}")
-        app.logger.error(f"Guest checkout error: {str(e)}")
+        app.logger.exception(f"Guest checkout error: {str(e)}")
         flash(f"An error occurred processing your order: {str(e)}", "danger")
         return redirect(url_for('guest_checkout'))
     
@@ -1465,19 +1713,23 @@ def guest_purchase_confirmation(purchase_id):
     """Guest purchase confirmation page."""
     purchase = Purchase.query.get_or_404(purchase_id)
     
-    # Get all purchases for this guest (with same customer info)
-    all_purchases = Purchase.query.filter_by(
-        customer_email_encrypted=purchase.customer_email_encrypted,
-        timestamp=purchase.timestamp
-    ).all()
+    # Get all purchases for this guest: the order's lines, or (older rows) same customer info
+    if purchase.order is not None:
+        all_purchases = purchase.order.lines
+    else:
+        all_purchases = Purchase.query.filter_by(
+            customer_email_hash=purchase.customer_email_hash,
+            timestamp=purchase.timestamp
+        ).all()
     
     # Decrypt customer information for display
+    email, phone, address = decrypt_purchase_contacts([purchase])[0]
     customer_info = {
         'first_name': purchase.customer_name.split()[0] if purchase.customer_name else '',
         'last_name': ' '.join(purchase.customer_name.split()[1:]) if purchase.customer_name and len(purchase.customer_name.split()) > 1 else '',
-        'email': decrypt_data(purchase.customer_email_encrypted),
-        'phone': decrypt_data(purchase.customer_phone_encrypted),
-        'address': decrypt_data(purchase.customer_address_encrypted)
+        'email': email,
+        'phone': phone,
+        'address': address
     }
     
     return render_template('guest_purchase_confirmation.html', 
@@ -1490,25 +1742,16 @@ def guest_purchase_confirmation(purchase_id):
 @login_required
 @manager_required
 def export_purchases_csv():
-    import csv
-    from io import StringIO
-    si = StringIO()
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     status = request.args.get('status')
 
-    query = Purchase.query.order_by(Purchase.id)
-    if start_date:
-        query = query.filter(Purchase.timestamp >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Purchase.timestamp <= datetime.strptime(end_date, '%Y-%m-%d'))
-    if status:
-        query = query.filter(Purchase.status == status)
-
-    writer = csv.writer(si)
-    writer.writerow(['id','source','customer_name','customer_email','customer_phone','customer_address','book_isbn','quantity','status','timestamp'])
-    for p in query.all():
-        writer.writerow([p.id,'purchase',p.customer_name,p.customer_email,p.customer_phone,p.customer_address,p.book_isbn,p.quantity,p.status,p.timestamp])
+    try:
+        query = apply_order_filters(Purchase.query, Purchase, status=status,
+                                    start_date=start_date, end_date=end_date).order_by(Purchase.id)
+    except ValueError as e:
+        flash(f'Invalid date filter: {e}', 'danger')
+        return redirect(url_for('all_orders'))
 
     # Format the filename to include any filters
     filename = 'purchases'
@@ -1518,8 +1761,8 @@ def export_purchases_csv():
         filename += f'_{status}'
     filename += '.csv'
 
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition':f'attachment;filename={filename}'})
+    header = ['id','source','customer_name','customer_email','customer_phone','customer_address','book_isbn','quantity','status','timestamp']
+    return streaming_csv_response(filename, header, purchase_export_chunks(query, include_source=True))
 
 
 # Public route to create a purchase (simulate customer action)
@@ -1572,13 +1815,19 @@ def create_purchase():
             total = 0
             book_lines = []
             created_purchases = []
+            order = CustomerOrder(customer_name=name, customer_email=email, customer_phone=phone, customer_address=address,
+                                  timestamp=datetime.utcnow())
+            db.session.add(order)
             for item in cart:
-                p = Purchase(customer_name=name, customer_email=email, customer_phone=phone, customer_address=address, book_isbn=item['isbn'], quantity=item['quantity'])
-                db.session.add(p)
+                p = order.add_line(book_isbn=item['isbn'], quantity=item['quantity'],
+                                   unit_price=item['price'], line_total=item['price'] * item['quantity'], discount_amount=0.0)
+                sales_rollup.record_sale(p)
                 created_purchases.append(p)
                 total += item['price'] * item['quantity']
                 book_lines.append(f"- {item['title']} by {item['author']} (x{item['quantity']}) - ${item['price'] * item['quantity']:.2f}")
+            order.subtotal = order.total = total
             db.session.commit()
+            publish_new_orders(len(created_purchases))
             
             # Send admin notifications for new orders
             try:
@@ -1596,15 +1845,7 @@ def create_purchase():
             try:
                 if email:
                     body = f"----- ORDER SUMMARY -----\nCustomer: {name}\nEmail: {email}\nAddress: {address}\n\nBooks Purchased:\n" + '\n'.join(book_lines) + f"\n\nTotal: ${total:.2f}\n\nThank you for your purchase!\n\nBest regards,\nChapter 6: A Plot Twist Bookstore"
-                    msg = MIMEText(body)
-                    msg['Subject'] = 'Your Order Confirmation - Chapter 6: A Plot Twist'
-                    msg['From'] = os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com')
-                    msg['To'] = email
-                    smtp = smtplib.SMTP('smtp.gmail.com', 587)
-                    smtp.starttls()
-                    smtp.login(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), os.environ.get('GMAIL_APP_PASSWORD', 'giuw lmir sdmo fgej'))
-                    smtp.sendmail(os.environ.get('GMAIL_EMAIL', 'chapter6aplottwist@gmail.com'), [email], msg.as_string())
-                    smtp.quit()
+                    mail_dispatcher.enqueue(email, 'Your Order Confirmation - Chapter 6: A Plot Twist', body)
             except Exception as e:
                 print(f"Error sending confirmation email: {e}")
             session['cart'] = []
@@ -1635,21 +1876,108 @@ def index():
 @login_required
 @manager_required
 def admin_dashboard():
-    books = Book.query.all()
-    orders = Purchase.query.order_by(Purchase.timestamp.desc()).all()
-    # counts for badge and status breakdown
-    pending_count = Purchase.query.filter_by(status='Pending').count()
-    # status counts dict
-    status_counts = {}
-    for s in ['Pending', 'Processing', 'Shipped', 'Completed', 'Cancelled']:
-        status_counts[s] = Purchase.query.filter_by(status=s).count()
+    # The dashboard only shows a preview of each list; counts come from COUNT(*)
+    books = Book.query.limit(10).all()
+    book_count = Book.query.count()
+    orders = Purchase.query.order_by(Purchase.timestamp.desc(), Purchase.id.desc()).limit(10).all()
+    total_order_count = order_stats.total()
+    # counts for badge and status breakdown, from one cached GROUP BY
+    status_counts = order_stats.dashboard_counts()
+    pending_count = status_counts['Pending']
+    
+    # Last 30 days of sales, summed from the daily rollup
+    today = datetime.utcnow()
+    recent_start = today - timedelta(days=29)
+    recent_sales = {
+        'totals': sales_reporting.totals(recent_start, today),
+        'start_date': recent_start.strftime('%Y-%m-%d'),
+        'end_date': today.strftime('%Y-%m-%d'),
+    }
     
     # Get recent admin users for dashboard display
     recent_admin_users = User.query.filter_by(is_manager=True).order_by(User.id.desc()).limit(5).all()
     
     return render_template('admin_dashboard.html', inventory=books, orders=orders, 
+                         book_count=book_count, total_order_count=total_order_count,
                          pending_count=pending_count, status_counts=status_counts, 
-                         recent_admin_users=recent_admin_users)
+                         recent_admin_users=recent_admin_users, recent_sales=recent_sales,
+                         live_event_id=live_events.last_id)
+
+
+@app.route('/admin/events')
+@login_required
+def admin_events():
+    """Server-Sent Events stream of dashboard updates.
+    
+    Deliberately not @manager_required: a long-lived stream must not count
+    as admin activity, or open dashboards would never time out. The stream
+    closes every few minutes and the browser reconnects, re-running this check.
+    """
+    if not getattr(current_user, 'is_manager', False):
+        return jsonify({'error': 'Manager access required'}), 403
+    if check_session_timeout():
+        return jsonify({'error': 'Session expired'}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    return Response(
+        stream_events(live_events, last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/admin/encryption/rotation')
+@login_required
+@manager_required
+def admin_key_rotation_status():
+    """Progress of re-encrypting stored data under the current encryption key"""
+    rewriter = CiphertextRewriter(db.engine, KEY_ROTATION_JOB, encryption.rotate)
+    tables = rewriter.progress(ENCRYPTED_COLUMNS)
+    return jsonify({
+        'job': KEY_ROTATION_JOB,
+        'key_id': encryption.key_id,
+        'keys_in_ring': len(encryption.keys),
+        'done': all(table['done'] for table in tables),
+        'tables': tables,
+    })
+
+
+@app.route('/admin/metrics')
+@login_required
+@manager_required
+def admin_metrics():
+    """Per-endpoint latency percentiles, SQL counts and instrumented call costs"""
+    endpoints = request_metrics.snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify({'since': datetime.utcfromtimestamp(request_metrics.started_at).isoformat(),
+                        'endpoints': endpoints})
+    return render_template('admin_metrics.html', endpoints=endpoints,
+                           since=datetime.utcfromtimestamp(request_metrics.started_at),
+                           repeat_threshold=request_metrics.repeat_threshold)
+
+
+@app.route('/admin/metrics/reset', methods=['POST'])
+@login_required
+@manager_required
+def admin_metrics_reset():
+    request_metrics.reset()
+    flash('Request metrics reset.', 'success')
+    return redirect(url_for('admin_metrics'))
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request metrics in Prometheus text format, for managers or a scraper holding METRICS_TOKEN"""
+    authorization = request.headers.get('Authorization', '')
+    scraper = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f'Bearer {METRICS_TOKEN}')
+    if not scraper and not getattr(current_user, 'is_manager', False):
+        abort(403)
+    return Response(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
 
 
 # Manual low stock check route
@@ -1698,13 +2026,17 @@ def orders_bulk_update():
             if o and o.status != new_status:
                 old_status = o.status
                 o.status = new_status
+                sales_rollup.record_status_change(o, old_status)
                 updated_orders.append({
                     'order': o,
                     'old_status': old_status,
                     'new_status': new_status
                 })
         
+        updated_ids = [info['order'].id for info in updated_orders]
         db.session.commit()
+        if updated_ids:
+            publish_status_change(updated_ids, new_status)
         
         # Send notification for bulk status changes
         if updated_orders:
@@ -1732,16 +2064,9 @@ def orders_bulk_update():
 @login_required
 @manager_required
 def export_orders_csv():
-    import csv
-    from io import StringIO
-    si = StringIO()
-    writer = csv.writer(si)
-    writer.writerow(['id','customer_name','customer_email','customer_phone','customer_address','book_isbn','quantity','status','timestamp'])
+    header = ['id','customer_name','customer_email','customer_phone','customer_address','book_isbn','quantity','status','timestamp']
     query = Purchase.query.order_by(Purchase.id)
-    for o in query.all():
-        writer.writerow([o.id, o.customer_name, o.customer_email, o.customer_phone, o.customer_address, o.book_isbn, o.quantity, o.status, o.timestamp])
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition':'attachment;filename=orders.csv'})
+    return streaming_csv_response('orders.csv', header, purchase_export_chunks(query))
 
 # Add book manually
 @app.route('/add_book', methods=['GET', 'POST'])
@@ -1775,6 +2100,7 @@ def add_book():
         )
         db.session.add(new_book)
         db.session.commit()
+        book_cache.bump()
         flash(f"Book '{title}' added successfully!", 'success')
         return redirect(url_for('inventory'))
     except Exception as e:
@@ -1795,13 +2121,18 @@ def edit_book(isbn):
             book.title = request.form['title']
             book.author = request.form['author']
             book.price = float(request.form['price'])
-            book.quantity = int(request.form.get('quantity', 0))
+            quantity = int(request.form.get('quantity', 0))
+            if quantity != book.quantity:
+                # A new absolute count already includes any copies held at checkout
+                stock.void([isbn])
+            book.quantity = quantity
             book.cover_type = request.form.get('cover_type', '').strip()
             book.description = request.form.get('description', '').strip()
             book.genre = request.form.get('genre', '').strip()
             book.in_stock = book.quantity > 0
             
             db.session.commit()
+            book_cache.bump()
             flash(f"Book '{book.title}' updated successfully!", 'success')
             return redirect(url_for('inventory'))
         except Exception as e:
@@ -1847,13 +2178,16 @@ def delete_book(isbn):
             db.session.delete(book)
             flash(f"Book '{book_title}' has been completely removed from inventory.", 'success')
         else:
-            # Reduce quantity
-            book.quantity -= quantity_to_delete
-            book.in_stock = book.quantity > 0
-            flash(f"Removed {quantity_to_delete} copies of '{book_title}'. {book.quantity} copies remaining.", 'success')
+            # Reduce quantity in one conditional UPDATE, so a concurrent sale cannot drive it negative
+            remaining = stock.take({isbn: quantity_to_delete})[isbn]
+            flash(f"Removed {quantity_to_delete} copies of '{book_title}'. {remaining} copies remaining.", 'success')
         
         db.session.commit()
+        book_cache.bump()
         
+    except InsufficientStock as e:
+        db.session.rollback()
+        flash(f"Cannot delete {quantity_to_delete} copies - only {e.available} available.", 'danger')
     except Exception as e:
         flash(f"Error processing deletion: {e}", 'danger')
         db.session.rollback()
@@ -1867,9 +2201,11 @@ def delete_book(isbn):
 def mark_out_of_stock(isbn):
     book = Book.query.filter_by(isbn=isbn).first()
     if book:
+        stock.void([isbn])  # Nothing left to hold
         book.in_stock = False
         book.quantity = 0
         db.session.commit()
+        book_cache.bump()
         flash(f"Book '{book.title}' marked out of stock.", 'warning')
     return redirect(url_for('browse'))
 
@@ -1904,195 +2240,115 @@ def debug_isbns():
 @login_required
 @manager_required
 def upload_csv():
-    file = request.files.get('file')
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        file.save(filepath)
-
-        try:
-            with open(filepath, newline='', encoding='utf-8') as csvfile:
-                # Read and process headers
-                reader = csv.DictReader(csvfile)
-                
-                # Handle BOM in first column name if present
-                fieldnames = reader.fieldnames
-                if fieldnames and fieldnames[0].startswith('\ufeff'):
-                    fieldnames[0] = fieldnames[0].lstrip('\ufeff')
-                
-                # Normalize header names to lowercase
-                normalized_fieldnames = [h.strip().lower() for h in fieldnames]
-                
-                # Reset file pointer and create new DictReader with normalized headers
-                csvfile.seek(0)
-                next(csvfile)  # Skip header line
-                reader = csv.DictReader(csvfile, fieldnames=normalized_fieldnames)
-
-                # Counters for feedback
-                added_count = 0
-                updated_count = 0
-                skipped_count = 0
-
-                for row in reader:
-                    # Clean and process ISBN - handle scientific notation
-                    isbn_raw = row.get('isbn', '').strip()
-                    if isbn_raw:
-                        try:
-                            # Convert scientific notation to regular number if needed
-                            if 'E' in isbn_raw.upper():
-                                isbn = str(int(float(isbn_raw)))
-                            else:
-                                isbn = isbn_raw
-                        except (ValueError, OverflowError):
-                            isbn = isbn_raw  # Use as-is if conversion fails
-                    else:
-                        isbn = ''
-                    
-                    title = row.get('title', '').strip()
-                    author = row.get('author', '').strip()
-
-                    # Better handling of price and quantity with detailed error messages
-                    try:
-                        price_raw = row.get('price', '0').strip()
-                        if not price_raw or price_raw == '':
-                            price = 0.0
-                        else:
-                            price = float(price_raw.replace('$', '').replace(',', ''))
-                    except (ValueError, AttributeError) as e:
-                        flash(f"Skipping row - invalid price '{row.get('price')}' for book '{title}': {str(e)}", 'warning')
-                        skipped_count += 1
-                        continue
-
-                    try:
-                        quantity_raw = row.get('quantity', '0').strip()
-                        if not quantity_raw or quantity_raw == '':
-                            quantity = 0
-                        else:
-                            quantity = int(float(quantity_raw))  # Handle decimal quantities
-                    except (ValueError, AttributeError) as e:
-                        flash(f"Skipping row - invalid quantity '{row.get('quantity')}' for book '{title}': {str(e)}", 'warning')
-                        skipped_count += 1
-                        continue
-
-                    # Validate required fields with better error messages
-                    missing_fields = []
-                    if not isbn:
-                        missing_fields.append('ISBN')
-                    if not title:
-                        missing_fields.append('title')
-                    if not author:
-                        missing_fields.append('author')
-                    
-                    if missing_fields:
-                        flash(f"Skipping row - missing required fields: {', '.join(missing_fields)}. Book: '{title or 'Unknown'}'", 'warning')
-                        skipped_count += 1
-                        continue
-
-                    # Handle genre field - validate against predefined genres
-                    genre = row.get('genre', '').strip()
-                    if genre and genre not in BOOK_GENRES:
-                        # If genre is not in our list, set to default
-                        flash(f"Warning: Unknown genre '{genre}' for book '{title}'. Setting to 'Fiction'.", 'warning')
-                        genre = 'Fiction'
-                    elif not genre:
-                        genre = 'Fiction'  # Default genre
-                    
-                    cover_type = row.get('cover_type', '').strip()
-                    description = row.get('description', '').strip()
-
-                    book = Book.query.get(isbn)
-                    if book:
-                        # Update existing book
-                        book.title = title
-                        book.author = author
-                        book.price = price
-                        book.quantity = quantity
-                        book.in_stock = quantity > 0
-                        book.genre = genre
-                        book.cover_type = cover_type
-                        book.description = description
-                        updated_count += 1
-                    else:
-                        # Add new book
-                        book = Book(
-                            isbn=isbn,
-                            title=title,
-                            author=author,
-                            price=price,
-                            quantity=quantity,
-                            in_stock=quantity > 0,
-                            genre=genre,
-                            cover_type=cover_type,
-                            description=description
-                        )
-                        db.session.add(book)
-                        added_count += 1
+    """Import books from an uploaded CSV feed.
+    
+    The upload is parsed straight from the request stream in chunks, with one
+    ISBN lookup and one bulk insert/update per chunk. Skipped and corrected
+    rows go to a downloadable report rather than one flash message each.
+    """
+    # Catalog feeds are much larger than any other form post
+    request.max_content_length = app.config['CSV_IMPORT_MAX_CONTENT_LENGTH']
+    try:
+        file = request.files.get('file')
+    except RequestEntityTooLarge:
+        limit_mb = app.config['CSV_IMPORT_MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        flash(f"CSV file is too large. The limit is {limit_mb} MB.", 'danger')
+        return redirect(url_for('inventory'))
 
-                db.session.commit()
-            
-            # Provide detailed feedback about the upload results
-            if added_count > 0 or updated_count > 0:
-                message_parts = []
-                if added_count > 0:
-                    message_parts.append(f"{added_count} book(s) added")
-                if updated_count > 0:
-                    message_parts.append(f"{updated_count} book(s) updated")
-                if skipped_count > 0:
-                    message_parts.append(f"{skipped_count} row(s) skipped")
-                
-                success_message = "CSV processed successfully: " + ", ".join(message_parts)
-                flash(success_message, 'success')
-            else:
-                flash("No books were processed from the CSV file.", 'warning')
-        except Exception as e:
-            flash(f"Error processing CSV: {e}", 'danger')
-    else:
+    if not (file and allowed_file(file.filename)):
         flash("Invalid file type. Please upload a CSV file.", 'danger')
+        return redirect(url_for('inventory'))
+
+    os.makedirs(IMPORT_REPORT_FOLDER, exist_ok=True)
+    remove_old_import_reports()
+    report_token = uuid.uuid4().hex
+    report = ImportReport(os.path.join(IMPORT_REPORT_FOLDER, f'{report_token}.csv'))
 
+    try:
+        # Imported quantities are absolute counts, so holds on updated books are dropped
+        result = import_books(file.stream, db.session, Book.__table__, BOOK_GENRES, report=report,
+                              on_update=stock.void)
+        db.session.commit()
+        book_cache.bump()
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Error processing CSV: {e}", 'danger')
+        return redirect(url_for('inventory'))
+    finally:
+        report.close()
+
+    session.pop('import_report', None)
+    if report.has_entries:
+        session['import_report'] = {'token': report_token, 'errors': report.errors, 'warnings': report.warnings}
+
+    # Provide detailed feedback about the upload results
+    if result.added > 0 or result.updated > 0:
+        message_parts = []
+        if result.added > 0:
+            message_parts.append(f"{result.added} book(s) added")
+        if result.updated > 0:
+            message_parts.append(f"{result.updated} book(s) updated")
+        if result.skipped > 0:
+            message_parts.append(f"{result.skipped} row(s) skipped")
+        
+        flash("CSV processed successfully: " + ", ".join(message_parts), 'success')
+    else:
+        flash("No books were processed from the CSV file.", 'warning')
     return redirect(url_for('inventory'))
 
 
+@app.route('/upload_csv/report/<token>')
+@login_required
+@manager_required
+def download_import_report(token):
+    """Download the skipped/corrected rows report from a CSV import."""
+    if not re.fullmatch(r'[0-9a-f]{32}', token):
+        abort(404)
+    return send_from_directory(IMPORT_REPORT_FOLDER, f'{token}.csv', as_attachment=True,
+                               download_name='inventory_import_report.csv', mimetype='text/csv')
+
+
+def remove_old_import_reports(max_age=timedelta(days=1)):
+    """Delete import reports older than `max_age`."""
+    cutoff = time.time() - max_age.total_seconds()
+    for entry in os.scandir(IMPORT_REPORT_FOLDER):
+        try:
+            if entry.name.endswith('.csv') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError as e:
+            print(f"Could not remove old import report {entry.name}: {e}")
+
+
 @app.route('/export_inventory')
 @login_required
 @manager_required
 def export_inventory():
     """Export current inventory to CSV file."""
     try:
-        # Get all books from inventory
-        books = Book.query.order_by(Book.isbn).all()
-        
-        # Create CSV content
-        output = []
-        output.append(['isbn', 'title', 'author', 'price', 'quantity', 'genre', 'cover_type', 'description', 'in_stock'])
-        
-        for book in books:
-            output.append([
-                book.isbn,
-                book.title,
-                book.author,
-                book.price,
-                book.quantity,
-                book.genre or 'Fiction',  # Include genre with default
-                book.cover_type or '',
-                book.description or '',
-                'Yes' if book.in_stock else 'No'
-            ])
-        
-        # Generate CSV response
-        def generate():
-            for row in output:
-                yield ','.join([f'"{str(field)}"' for field in row]) + '\n'
+        query = Book.query.order_by(Book.isbn)
+        book_count = query.count()
+        
+        def row_chunks():
+            for books in iter_chunks(query, app.config['EXPORT_CHUNK_SIZE']):
+                yield [[
+                    book.isbn,
+                    book.title,
+                    book.author,
+                    book.price,
+                    book.quantity,
+                    book.genre or 'Fiction',  # Include genre with default
+                    book.cover_type or '',
+                    book.description or '',
+                    'Yes' if book.in_stock else 'No'
+                ] for book in books]
         
         # Create filename with current date
         filename = f"inventory_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        header = ['isbn', 'title', 'author', 'price', 'quantity', 'genre', 'cover_type', 'description', 'in_stock']
         
-        response = make_response(generate())
-        response.headers['Content-Type'] = 'text/csv'
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        
-        flash(f'Inventory exported successfully! {len(books)} books exported.', 'success')
-        return response
+        flash(f'Inventory exported successfully! {book_count} books exported.', 'success')
+        # Every field quoted so spreadsheets keep ISBNs as text
+        return streaming_csv_response(filename, header, row_chunks(), quoting=csv.QUOTE_ALL)
         
     except Exception as e:
         flash(f"Error exporting inventory: {e}", 'danger')
@@ -2106,45 +2362,29 @@ def login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        print(f"Login attempt: username={username}")
-        
         user = User.query.filter_by(username=username).first()
         
         if user:
-            print(f"User found: {user.username}")
-            print(f"Email: {user.email}")
-            print(f"Is Manager: {user.is_manager}")
-            print(f"Has password_hash: {bool(user.password_hash)}")
-            print(f"Has legacy password: {bool(user.password)}")
-            
             if user.check_password(password):
-                print("Password check passed")
-                
                 # Check if user has email for 2FA
                 if not user.email:
-                    print("No email configured for user")
                     flash('Admin account requires email for security verification. Please contact system administrator.', 'danger')
                     return render_template('login.html')
                 
-                print(f"Attempting to send 2FA code to {user.email}")
-                
                 # Send 2FA code
                 if send_2fa_code(user):
-                    print("2FA code sent successfully")
-                    # Store user ID in session for 2FA verification
+                    # Store user ID in session for 2FA verification, under a fresh session ID
+                    regenerate_session()
                     session['pending_2fa_user_id'] = user.id
                     session['2fa_expires'] = (datetime.now() + timedelta(minutes=10)).isoformat()
                     flash('Security code sent to your email. Please check your inbox.', 'info')
                     return redirect(url_for('verify_2fa'))
                 else:
-                    print("Failed to send 2FA code")
                     flash('Failed to send security code. Please try again.', 'danger')
                     return render_template('login.html')
             else:
-                print("Password check failed")
                 flash('Invalid username or password.', 'danger')
         else:
-            print("User not found")
             flash('Invalid username or password.', 'danger')
         
         # Invalid login - redirect back to login page
@@ -2172,6 +2412,7 @@ def verify_2fa():
         if user and user.verify_2fa_code(code):
             # 2FA successful - complete login
             db.session.commit()
+            regenerate_session()
             login_user(user, remember=False)  # Don't remember user - session expires when browser closes
             
             # Clear 2FA session data
@@ -2265,8 +2506,7 @@ def check_timeout():
         return jsonify({'error': 'Not authorized'}), 403
         
     if check_session_timeout():
-        logout_user()
-        session.pop('last_activity', None)
+        end_session()
         return jsonify({
             'expired': True,
             'message': 'Session expired due to inactivity'
@@ -2278,11 +2518,6 @@ def check_timeout():
 @app.route('/logout')
 @login_required
 def logout():
-    # Clear any pending 2FA session data
-    session.pop('pending_2fa_user_id', None)
-    session.pop('2fa_expires', None)
-    session.pop('last_activity', None)  # Clear session timeout tracking
-    
     # Clear 2FA verification status for the user
     if current_user.is_authenticated:
         current_user.two_fa_verified = False
@@ -2292,7 +2527,8 @@ def logout():
         except:
             db.session.rollback()
     
-    logout_user()
+    # Drops pending 2FA data, timeout tracking and the stored session itself
+    end_session()
     return redirect(url_for('login'))
 
 
@@ -2300,10 +2536,6 @@ def logout():
 def logout_ajax():
     """AJAX endpoint for automatic logout when browser closes"""
     try:
-        # Clear any pending 2FA session data
-        session.pop('pending_2fa_user_id', None)
-        session.pop('2fa_expires', None)
-        
         # Clear 2FA verification status for the user
         if current_user.is_authenticated:
             current_user.two_fa_verified = False
@@ -2313,7 +2545,7 @@ def logout_ajax():
             except:
                 db.session.rollback()
         
-        logout_user()
+        end_session()
         return jsonify({'status': 'success', 'message': 'Logged out successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
@@ -2403,7 +2635,7 @@ def customer_forgot_password():
             return render_template('customer_forgot_password.html')
         
         # Find customer by email
-        customer = Customer.query.filter_by(email=email).first()
+        customer = Customer.query.filter_by(email_hash=email_blind_index(email)).first()
         
         if customer:
             # Generate reset token
@@ -2467,69 +2699,59 @@ def customer_reset_password(token):
 @login_required
 @manager_required
 def all_orders():
-    """Show both legacy orders and new purchases in a unified view."""
+    """Show purchases newest first, one keyset page at a time.
+    
+    Further pages are loaded by the infinite-scroll script through /api/orders
+    with the same filters, so each request only decrypts one page of rows.
+    """
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     status = request.args.get('status')
 
-    # Get orders from Purchase table (since Order table is empty)
-    purchases_query = Purchase.query
-    
-    # Apply filters if provided
-    if start_date:
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-        purchases_query = purchases_query.filter(Purchase.timestamp >= start_dt)
-    if end_date:
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-        purchases_query = purchases_query.filter(Purchase.timestamp <= end_dt)
-    if status:
-        purchases_query = purchases_query.filter(Purchase.status == status)
-
-    # Get all matching purchases and convert to a format the template expects
-    all_purchases = purchases_query.order_by(Purchase.timestamp.desc()).all()
-    
-    # Convert purchases to the format expected by the template
-    all_items = []
-    for p in all_purchases:
-        # Create an object with the attributes the template expects
-        item = type('obj', (object,), {
-            'id': p.id,
-            'source': 'purchase',
-            'customer_name': p.customer_name,
-            'customer_email': p.customer_email,
-            'customer_phone': p.customer_phone,
-            'customer_address': p.customer_address,
-            'book_isbn': p.book_isbn,
-            'quantity': p.quantity,
-            'status': p.status,
-            'timestamp': p.timestamp,
-            'timestamp_str': p.timestamp.strftime('%Y-%m-%d %H:%M') if p.timestamp else ''
-        })()
-        all_items.append(item)
+    try:
+        page = paginated_orders(Purchase)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('all_orders'))
 
     # Get unique statuses for the filter dropdown
-    unique_statuses = set()
-    for item in all_items:
-        if item.status:
-            unique_statuses.add(item.status)
-    unique_statuses = sorted(list(unique_statuses))
+    unique_statuses = order_stats.statuses()
 
     return render_template('all_orders.html', 
-                         orders=all_items,
+                         orders=purchase_rows(page.items),
+                         next_cursor=page.next_cursor,
                          current_status=status,
                          current_start_date=start_date,
                          current_end_date=end_date,
                          statuses=unique_statuses)
 
 
+@app.route('/api/orders')
+@login_required
+@manager_required
+def api_orders():
+    """JSON page of purchases for infinite scroll.
+    
+    Accepts the same status/start_date/end_date filters as /all_orders plus
+    `cursor` (from the previous response) and `limit`.
+    """
+    try:
+        page = paginated_orders(Purchase)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    orders = purchase_rows(page.items)
+    for order in orders:
+        order['timestamp'] = order['timestamp'].isoformat() if order['timestamp'] else None
+    return jsonify({'orders': orders, 'next_cursor': page.next_cursor, 'has_more': page.has_more})
+
+
 @app.route('/api/update_order/<source>/<int:order_id>', methods=['POST'])
 @login_required
 @manager_required
 def api_update_order(source, order_id):
     """API endpoint to update order/purchase status from the combined view."""
     try:
-        print(f"API update called: source={source}, order_id={order_id}")
-        
         # Ensure we return JSON even for auth failures
         if not current_user.is_authenticated:
             return jsonify({'error': 'Authentication required', 'redirect': url_for('login')}), 401
@@ -2542,21 +2764,19 @@ def api_update_order(source, order_id):
         else:
             item = Purchase.query.get(order_id)
         
-        print(f"Item found: {item}")
         if not item:
-            print("Item not found!")
             return jsonify({'error': 'Order not found'}), 404
         
         status = request.form.get('status')
-        print(f"Status to set: {status}")
-        
         if not status:
-            print("No status provided!")
             return jsonify({'error': 'Status not provided'}), 400
         
         old_status = item.status
         item.status = status
+        if source != 'legacy':
+            sales_rollup.record_status_change(item, old_status)
         db.session.commit()
+        publish_status_change([order_id], status)
         
         # Send admin notification for status change
         if hasattr(item, 'customer_name'):  # It's a Purchase object
@@ -2569,7 +2789,6 @@ def api_update_order(source, order_id):
             except Exception as e:
                 print(f"Failed to send admin notification: {e}")
         
-        print(f"Status updated successfully.")
         return jsonify({
             'status': 'success', 
             'message': f'{source.title()} order {order_id} updated to {status}',
@@ -2651,7 +2870,7 @@ def customer_register():
         if Customer.query.filter_by(username=username).first():
             errors.append('Username already exists. Please choose a different one.')
         
-        if Customer.query.filter_by(email=email).first():
+        if Customer.query.filter_by(email_hash=email_blind_index(email)).first():
             errors.append('Email already registered. Please use a different email or login.')
         
         if errors:
@@ -2725,10 +2944,11 @@ def customer_login():
         # Try to find customer by username or email
         customer = Customer.query.filter(
             (Customer.username == username_or_email) | 
-            (Customer.email == username_or_email)
+            (Customer.email_hash == email_blind_index(username_or_email))
         ).first()
         
         if customer and customer.check_password(password) and customer.is_active:
+            regenerate_session()
             login_user(customer, remember=remember_me)
             flash(f'Welcome back, {customer.full_name}!', 'success')
             
@@ -2747,7 +2967,7 @@ def customer_login():
 def customer_logout():
     """Customer logout."""
     if current_user.is_authenticated and hasattr(current_user, 'username'):
-        logout_user()
+        end_session()
         flash('You have been logged out successfully.', 'info')
     return redirect(url_for('browse'))
 
@@ -2755,7 +2975,7 @@ def customer_logout():
 @app.route('/customer/dashboard')
 def customer_dashboard():
     """Customer dashboard - main landing page after login."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to access your account.', 'warning')
         return redirect(url_for('customer_login'))
     
@@ -2765,7 +2985,7 @@ def customer_dashboard():
 @app.route('/customer/account')
 def customer_account():
     """Customer account management page."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to access your account.', 'warning')
         return redirect(url_for('customer_login'))
     
@@ -2775,7 +2995,7 @@ def customer_account():
 @app.route('/customer/account/edit', methods=['GET', 'POST'])
 def edit_customer_account():
     """Edit customer account information."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to access your account.', 'warning')
         return redirect(url_for('customer_login'))
     
@@ -2816,7 +3036,7 @@ def edit_customer_account():
         
         # Check if email is taken by another customer
         existing_customer = Customer.query.filter(
-            Customer.email == email,
+            Customer.email_hash == email_blind_index(email),
             Customer.id != current_user.id
         ).first()
         
@@ -2856,22 +3076,23 @@ def edit_customer_account():
 @app.route('/customer/orders')
 def customer_orders():
     """Customer order history."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to view your orders.', 'warning')
         return redirect(url_for('customer_login'))
     
     # Get customer's purchase history
-    purchases = Purchase.query.filter_by(customer_email=current_user.email).order_by(Purchase.timestamp.desc()).all()
+    purchases = Purchase.query.filter_by(customer_email_hash=email_blind_index(current_user.email)).order_by(Purchase.timestamp.desc()).all()
     
     # Group purchases by date for better display
     purchase_groups = {}
+    # Book information for every line, cached or in one IN (...) query
+    books = book_cache.get_many(purchase.book_isbn for purchase in purchases if purchase.book_isbn)
     for purchase in purchases:
         date_key = purchase.timestamp.date()
         if date_key not in purchase_groups:
             purchase_groups[date_key] = []
         
-        # Get book information
-        book = Book.query.filter_by(isbn=purchase.book_isbn).first()
+        book = books.get(purchase.book_isbn)
         purchase_groups[date_key].append({
             'purchase': purchase,
             'book': book
@@ -2885,14 +3106,14 @@ def customer_orders():
 @app.route('/customer/orders/<int:purchase_id>')
 def customer_order_detail(purchase_id):
     """View details of a specific customer order."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to view order details.', 'warning')
         return redirect(url_for('customer_login'))
     
     # Get the purchase and verify it belongs to the current customer
     purchase = Purchase.query.filter_by(
         id=purchase_id, 
-        customer_email=current_user.email
+        customer_email_hash=email_blind_index(current_user.email)
     ).first()
     
     if not purchase:
@@ -2900,7 +3121,7 @@ def customer_order_detail(purchase_id):
         return redirect(url_for('customer_orders'))
     
     # Get book information
-    book = Book.query.filter_by(isbn=purchase.book_isbn).first()
+    book = book_cache.get(purchase.book_isbn)
     
     return render_template('customer_order_detail.html', 
                          purchase=purchase,
@@ -2911,7 +3132,7 @@ def customer_order_detail(purchase_id):
 @app.route('/customer/notifications', methods=['GET', 'POST'])
 def customer_notifications():
     """Customer notification management page."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to manage your notifications.', 'warning')
         return redirect(url_for('customer_login'))
     
@@ -2994,7 +3215,7 @@ def customer_notifications():
 @app.route('/customer/notifications/remove', methods=['POST'])
 def remove_notification():
     """Remove a book or genre notification."""
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to manage your notifications.', 'warning')
         return redirect(url_for('customer_login'))
     
@@ -3053,18 +3274,19 @@ def browse():
     # Build query with filters
     query = Book.query
     
+    search_rank = None
     if search_query:
-        query = query.filter(
-            or_(
-                Book.title.ilike(f'%{search_query}%'),
-                Book.author.ilike(f'%{search_query}%'),
-                Book.isbn.ilike(f'%{search_query}%')
-            )
+        query, search_rank = apply_book_search(
+            query, search_query, [Book.title, Book.author, Book.isbn]
         )
     
     if genre_filter:
         query = query.filter(Book.genre == genre_filter)
     
+    # Best matches first when searching
+    if search_rank is not None:
+        query = query.order_by(search_rank.asc(), Book.title.asc())
+    
     books = query.all()
     
     # Get all available genres for the filter dropdown
@@ -3272,11 +3494,96 @@ def delete_admin_user(user_id):
 # CUSTOMER SHOPPING CART ROUTES
 # =============================================================================
 
+def load_books_by_isbn(isbns, fresh=False):
+    """Fetch many books keyed by ISBN: from the book cache, or with one IN (...) query if `fresh`."""
+    isbns = list(isbns)
+    if not isbns:
+        return {}
+    if not fresh:
+        return book_cache.get_many(isbns)
+    # populate_existing: books the cache already merged into this session are overwritten,
+    # otherwise the identity map would hand back their cached (stale) stock
+    query = Book.query.filter(Book.isbn.in_(isbns)).execution_options(populate_existing=True)
+    return {book.isbn: book for book in query.all()}
+
+
+def quote_cart(cart, held=None, fresh=False):
+    """Price the session cart (subtotal, discount, stock) with one batched Book lookup.
+    
+    `held` is stock already held for this cart, which counts as available.
+    Checkout passes `fresh` so stock comes from the database, not the cache.
+    """
+    books = load_books_by_isbn(cart.keys(), fresh=fresh)
+    return price_cart(cart, books, session.get('discount_code'), DISCOUNT_CODES, held)
+
+
+def release_checkout_hold():
+    """Return this session's checkout hold to stock (not committed); returns the ISBNs it
+    changed, for book_cache.invalidate() after committing."""
+    return set(stock.release(session.pop('inventory_hold', None)))
+
+
+# Storefront views that list or sell stock; expired checkout holds are returned before they read it
+STOCK_READ_ENDPOINTS = {'catalog_view', 'view_cart', 'add_to_cart', 'create_purchase',
+                        'checkout_page', 'guest_checkout'}
+
+
+@app.before_request
+def sweep_expired_holds():
+    """Return abandoned checkout holds to stock about once a minute, so they don't hide books."""
+    if request.endpoint not in STOCK_READ_ENDPOINTS:
+        return
+    released = stock.sweep_if_due()
+    if released is not None:
+        db.session.commit()
+        if released:
+            book_cache.bump()
+
+
+def hold_checkout_stock(quote, released=()):
+    """Hold the quoted books while the customer pays, if holds are enabled; commits.
+    
+    `released` are the ISBNs release_checkout_hold() returned; only those and
+    the held books are dropped from the book cache. Raises InsufficientStock
+    if a book sold out since it was quoted (nothing is held then).
+    """
+    changed = set(released)
+    try:
+        if stock.hold_seconds:
+            items = {book.isbn: qty for book, qty in quote.items}
+            session['inventory_hold'] = stock.hold(items)
+            changed.update(items)
+    finally:
+        db.session.commit()
+        book_cache.invalidate(changed)
+
+
+def take_checkout_stock(quote):
+    """Take the quoted books from stock for a purchase, claiming this session's hold.
+    
+    Runs in the caller's transaction: commit to keep the stock change, roll
+    back to undo it (the hold then stays in place). The loaded books get the
+    new quantities. Raises InsufficientStock.
+    """
+    quantities = stock.claim(session.get('inventory_hold'), {book.isbn: qty for book, qty in quote.items})
+    for book, _ in quote.items:
+        set_committed_value(book, 'quantity', quantities[book.isbn])
+        set_committed_value(book, 'in_stock', quantities[book.isbn] > 0)
+    return quantities
+
+
+def stock_error_message(error):
+    """User-facing message for an InsufficientStock error."""
+    book = book_cache.get(error.isbn)
+    title = book.title if book else error.isbn
+    return f"Not enough inventory for {title}. Only {error.available} available."
+
+
 @app.route('/add_to_cart/<isbn>', methods=['POST'])
 def add_to_cart(isbn):
     """Add a book to the shopping cart."""
     quantity = int(request.form.get('quantity', 1))
-    book = Book.query.filter_by(isbn=isbn).first()
+    book = book_cache.get(isbn)
     
     if not book:
         flash("Book not found.", 'danger')
@@ -3304,33 +3611,14 @@ def add_to_cart(isbn):
 def view_cart():
     """Display the shopping cart with discount calculations."""
     cart = session.get('cart', {})
-    cart_items = []
-    subtotal = 0
-    
-    for isbn, qty in cart.items():
-        book = Book.query.filter_by(isbn=isbn).first()
-        if book:
-            cart_items.append((book, qty))
-            subtotal += book.price * qty
-    
-    # Calculate discount
-    discount_code = session.get('discount_code')
-    discount_rate = 0
-    discount_amount = 0
-    
-    if discount_code and discount_code in DISCOUNT_CODES:
-        discount_rate, min_order = DISCOUNT_CODES[discount_code]
-        if subtotal >= min_order:
-            discount_amount = subtotal * discount_rate
-    
-    total = subtotal - discount_amount
+    quote = quote_cart(cart)
     
     return render_template('cart.html', 
-                         cart_items=cart_items, 
-                         subtotal=subtotal,
-                         total=total,
-                         discount_code=discount_code,
-                         discount_amount=discount_amount)
+                         cart_items=quote.items, 
+                         subtotal=quote.subtotal,
+                         total=quote.total,
+                         discount_code=session.get('discount_code'),
+                         discount_amount=quote.discount_amount)
 
 
 @app.route('/update_cart/<isbn>', methods=['POST'])
@@ -3383,37 +3671,29 @@ def checkout_page():
         return redirect(url_for('view_cart'))
     
     # Allow both logged in users and guests
-    if current_user.is_authenticated and hasattr(current_user, 'email'):
+    if current_user.is_authenticated and current_user.is_customer:
         # Existing logged-in user flow
-        # Calculate cart totals
-        cart_items = []
-        subtotal = 0
-        
-        for isbn, qty in cart.items():
-            book = Book.query.filter_by(isbn=isbn).first()
-            if book:
-                # Check inventory
-                if book.quantity < qty:
-                    flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
-                    return redirect(url_for('view_cart'))
-                cart_items.append((book, qty))
-                subtotal += book.price * qty
-        
-        # Calculate discount
-        discount_code = session.get('discount_code')
-        discount_amount = 0
-        if discount_code and discount_code in DISCOUNT_CODES:
-            discount_rate, min_order = DISCOUNT_CODES[discount_code]
-            if subtotal >= min_order:
-                discount_amount = subtotal * discount_rate
+        # Calculate cart totals and check inventory; any earlier hold is returned first
+        released = release_checkout_hold()
+        quote = quote_cart(cart, fresh=True)
+        if quote.first_shortfall:
+            db.session.commit()
+            book_cache.invalidate(released)
+            book, _ = quote.first_shortfall
+            flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
+            return redirect(url_for('view_cart'))
         
-        total = subtotal - discount_amount
+        try:
+            hold_checkout_stock(quote, released)
+        except InsufficientStock as e:
+            flash(stock_error_message(e), "danger")
+            return redirect(url_for('view_cart'))
         
         return render_template('payment.html', 
-                             cart_items=cart_items,
-                             subtotal=subtotal,
-                             discount_amount=discount_amount,
-                             total=total,
+                             cart_items=quote.items,
+                             subtotal=quote.subtotal,
+                             discount_amount=quote.discount_amount,
+                             total=quote.total,
                              customer=current_user)
     else:
         # Guest checkout flow
@@ -3429,62 +3709,39 @@ def checkout():
         return redirect(url_for('view_cart'))
 
     # Check if user is logged in
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to complete checkout.', 'warning')
         return redirect(url_for('customer_login'))
 
-    # Calculate cart totals
-    subtotal = 0
-    cart_items = []
-    
-    for isbn, qty in cart.items():
-        book = Book.query.filter_by(isbn=isbn).first()
-        if book:
-            # Check if enough inventory
-            if book.quantity < qty:
-                flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
-                return redirect(url_for('view_cart'))
-            subtotal += book.price * qty
-            cart_items.append((book, qty))
-
-    # Apply discount if applicable
-    discount_code = session.get('discount_code')
-    discount_amount = 0
-    if discount_code and discount_code in DISCOUNT_CODES:
-        discount_rate, min_order = DISCOUNT_CODES[discount_code]
-        if subtotal >= min_order:
-            discount_amount = subtotal * discount_rate
-
-    total = subtotal - discount_amount
+    # Calculate cart totals and check inventory
+    quote = quote_cart(cart, fresh=True)
+    if quote.first_shortfall:
+        book, _ = quote.first_shortfall
+        flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
+        return redirect(url_for('view_cart'))
 
     return render_template('payment.html', 
-                         cart_items=cart_items,
-                         subtotal=subtotal,
-                         discount_amount=discount_amount,
-                         total=total)
+                         cart_items=quote.items,
+                         subtotal=quote.subtotal,
+                         discount_amount=quote.discount_amount,
+                         total=quote.total)
 
 
 @app.route('/process_checkout', methods=['POST'])
 def process_checkout():
     """Complete the purchase and create sales records with payment validation."""
-    print("=== PROCESS_CHECKOUT DEBUG ===")
-    print(f"Form data: {dict(request.form)}")
-    print(f"Cart: {session.get('cart', {})}")
-    print(f"User authenticated: {current_user.is_authenticated}")
-    
     cart = session.get('cart', {})
     if not cart:
         flash("Cart is empty!", "warning")
         return redirect(url_for('view_cart'))
 
     # Check if user is logged in
-    if not current_user.is_authenticated or not hasattr(current_user, 'email'):
+    if not current_user.is_authenticated or not current_user.is_customer:
         flash('Please login to complete checkout.', 'warning')
         return redirect(url_for('customer_login'))
 
     # Get payment method information from form
     payment_method = request.form.get('payment_method')
-    print(f"Payment method: {payment_method}")
     
     # Validate payment method and collect details
     payment_details = {}
@@ -3496,7 +3753,6 @@ def process_checkout():
                 'cvv': request.form.get('cvv', ''),
                 'name': request.form.get('cardholder_name', '')
             }
-            print(f"Credit card details: {payment_details}")
         elif payment_method == 'paypal':
             payment_details = {
                 'email': request.form.get('paypal_email', '')
@@ -3508,14 +3764,11 @@ def process_checkout():
                 'bank_name': request.form.get('bank_name', '')
             }
         else:
-            print(f"Invalid payment method: {payment_method}")
             flash("Invalid payment method selected.", "danger")
             return redirect(url_for('checkout'))
 
         # Validate payment method
-        print(f"Validating payment method: {payment_method} with details: {payment_details}")
         is_valid, validation_message = validate_payment_method(payment_method, payment_details)
-        print(f"Validation result: {is_valid}, message: {validation_message}")
         if not is_valid:
             flash(f"Payment validation failed: {validation_message}", "danger")
             return redirect(url_for('checkout'))
@@ -3527,32 +3780,32 @@ def process_checkout():
 
     # Continue with the full checkout process
     try:
-        # Calculate subtotal first
-        subtotal = 0
-        for isbn, qty in cart.items():
-            book = Book.query.filter_by(isbn=isbn).first()
-            if book:
-                # Check if enough inventory
-                if book.quantity < qty:
-                    flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
-                    return redirect(url_for('checkout'))
-                subtotal += book.price * qty
+        # Price the whole cart with one batched lookup and check inventory
+        quote = quote_cart(cart, held=stock.held(session.get('inventory_hold')), fresh=True)
+        if quote.first_shortfall:
+            book, _ = quote.first_shortfall
+            flash(f"Not enough inventory for {book.title}. Only {book.quantity} available.", "danger")
+            return redirect(url_for('checkout'))
+        
+        # Take the stock before charging, in one conditional UPDATE (claiming the checkout page's hold)
+        try:
+            take_checkout_stock(quote)
+        except InsufficientStock as e:
+            db.session.rollback()
+            flash(stock_error_message(e), "danger")
+            return redirect(url_for('checkout'))
         
         # Apply discount if applicable
         discount_code = session.get('discount_code')
-        discount_amount = 0
-        if discount_code and discount_code in DISCOUNT_CODES:
-            discount_rate, min_order = DISCOUNT_CODES[discount_code]
-            if subtotal >= min_order:
-                discount_amount = subtotal * discount_rate
-        
-        total = subtotal - discount_amount
+        discount_amount = quote.discount_amount
+        total = quote.total
         
         # Process payment simulation
         try:
             payment_result = process_payment(total, payment_method, payment_details)
-            print(f"Payment simulation result: {payment_result}")
         except PaymentError as e:
+            # Return the stock taken above; the checkout hold stays in place
+            db.session.rollback()
             error_type, user_message, suggested_action = handle_payment_error(e)
             flash(f"{user_message} {suggested_action}", error_type)
             return redirect(url_for('checkout'))
@@ -3580,47 +3833,58 @@ def process_checkout():
         
         db.session.add(payment_record)
         
+        # Customer contact details are the same for every line; decrypt them once
+        # and store them (encrypted once) on the order header
+        customer_email = current_user.email
+        customer_phone = current_user.phone
+        customer_address = current_user.address_line1 or current_user.address
+        order = CustomerOrder(
+            customer_name=current_user.full_name,
+            customer_email=customer_email,
+            customer_phone=customer_phone,
+            customer_address=customer_address,
+            subtotal=quote.subtotal,
+            discount_code=quote.discount_code,
+            discount_amount=discount_amount,
+            total=total,
+            timestamp=datetime.utcnow()
+        )
+        db.session.add(order)
+        
         # Process each item in cart
-        for isbn, qty in cart.items():
-            book = Book.query.filter_by(isbn=isbn).first()
-            if book:
-                # Calculate total price for this item (without discount - discount is applied to overall total)
-                total_price = book.price * qty
-                
-                # Create sale record
-                sale = Sale(book_id=isbn, quantity=qty, total_price=total_price)
-                db.session.add(sale)
-                
-                # Create purchase record for logged-in customers
-                purchase = Purchase(
-                    customer_name=current_user.full_name,
-                    customer_email=current_user.email,
-                    customer_phone=current_user.phone,
-                    customer_address=current_user.address_line1 or current_user.address,
-                    book_isbn=isbn,
-                    quantity=qty,
-                    status='Confirmed'  # Set initial status
-                )
-                db.session.add(purchase)
-                
-                # Update book inventory
-                book.quantity -= qty
-                if book.quantity == 0:
-                    book.in_stock = False
+        purchase_details = []
+        for book, qty, unit_price, line_total, line_discount in quote.priced_lines():
+            # Calculate total price for this item (without discount - discount is applied to overall total)
+            total_price = line_total
+            
+            # Create sale record
+            sale = Sale(book_id=book.isbn, quantity=qty, total_price=total_price)
+            db.session.add(sale)
+            
+            # Create order line for logged-in customers
+            purchase = order.add_line(
+                book_isbn=book.isbn,
+                quantity=qty,
+                unit_price=unit_price,
+                line_total=line_total,
+                discount_amount=line_discount,
+                status='Confirmed'  # Set initial status
+            )
+            sales_rollup.record_sale(purchase)
+            
+            # Prepare purchase details for customer notification
+            purchase_details.append({
+                'title': book.title,
+                'quantity': qty,
+                'price': book.price
+            })
+        low_stock = low_stock_entries(book for book, _ in quote.items)
 
         # Commit all changes
         db.session.commit()
-        
-        # Prepare purchase details for customer notification
-        purchase_details = []
-        for isbn, qty in cart.items():
-            book = Book.query.filter_by(isbn=isbn).first()
-            if book:
-                purchase_details.append({
-                    'title': book.title,
-                    'quantity': qty,
-                    'price': book.price
-                })
+        book_cache.invalidate(book.isbn for book, _ in quote.items)
+        session.pop('inventory_hold', None)
+        publish_new_orders(len(quote.items), low_stock)
         
         # Send purchase confirmation email to customer
         try:
@@ -3634,7 +3898,7 @@ def process_checkout():
                 }
             
             send_customer_purchase_notification(
-                customer_email=current_user.email,
+                customer_email=customer_email,
                 customer_name=current_user.full_name,
                 purchase_details=purchase_details,
                 transaction_id=payment_record.transaction_id,
@@ -3655,8 +3919,8 @@ def process_checkout():
             admin_order_details = {
                 'id': payment_record.transaction_id,
                 'customer_name': current_user.full_name,
-                'customer_email': current_user.email,
-                'customer_phone': current_user.phone or 'N/A',
+                'customer_email': customer_email,
+                'customer_phone': customer_phone or 'N/A',
                 'book_isbn': ', '.join(book_isbn_list) if book_isbn_list else 'N/A',
                 'quantity': quantity_total,
                 'status': 'Confirmed',
@@ -3675,8 +3939,8 @@ def process_checkout():
 
 CUSTOMER INFORMATION:
 Name: {current_user.full_name}
-Email: {current_user.email}
-Phone: {current_user.phone or 'N/A'}
+Email: {customer_email}
+Phone: {customer_phone or 'N/A'}
 
 TRANSACTION DETAILS:
 Transaction ID: {payment_record.transaction_id}
@@ -3865,13 +4129,9 @@ def apply_discount():
     """Apply a discount code to the cart."""
     code = request.form.get('discount_code', '').strip().upper()
     cart = session.get('cart', {})
-    subtotal = 0
 
     # Calculate subtotal to check minimum requirement
-    for isbn, qty in cart.items():
-        book = Book.query.filter_by(isbn=isbn).first()
-        if book:
-            subtotal += book.price * qty
+    subtotal = price_cart(cart, load_books_by_isbn(cart.keys())).subtotal
 
     if code not in DISCOUNT_CODES:
         flash("Invalid discount code. Please check the spelling and try again.", 'danger')
@@ -3913,102 +4173,116 @@ def remove_discount():
 @login_required
 @manager_required
 def sales_report():
-    """Display sales report with date filtering."""
-    sales = []
+    """Display sales totals, a grouped breakdown and paginated sale lines for a date range.
     
+    Totals, the year-earlier comparison and the breakdown are summed from the
+    daily sales rollup; the detail table pages through purchases with their
+    stored prices. Filters travel in the query string so the detail table can be paged.
+    """
     if request.method == 'POST':
-        start_date = request.form.get('start_date')
-        end_date = request.form.get('end_date')
-        
-        if start_date and end_date:
-            # Convert to datetime objects for filtering
+        # Older bookmarks/forms posted the dates; keep them working
+        return redirect(url_for('sales_report', start_date=request.form.get('start_date'),
+                                end_date=request.form.get('end_date')))
+
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    group_by = request.args.get('group_by', 'day')
+    if group_by not in GROUPINGS:
+        group_by = 'day'
+
+    report = None
+    if start_date and end_date:
+        try:
             start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)  # Include end day
-            
-            # Get purchases from the Purchase table and create sale-like objects
-            purchases = Purchase.query.filter(
-                Purchase.timestamp >= start_datetime,
-                Purchase.timestamp < end_datetime
-            ).order_by(Purchase.timestamp.desc()).all()
-            
-            # Convert purchases to sale-like objects with calculated totals
-            sales = []
-            for purchase in purchases:
-                # Find the book to get the price
-                book = Book.query.filter_by(isbn=purchase.book_isbn).first()
-                if book:
-                    # Create a sale-like object
-                    sale_obj = type('Sale', (), {})()
-                    sale_obj.id = purchase.id
-                    sale_obj.book_id = purchase.book_isbn
-                    sale_obj.quantity = purchase.quantity
-                    sale_obj.total_price = book.price * purchase.quantity
-                    sale_obj.timestamp = purchase.timestamp
-                    sales.append(sale_obj)
+            end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
+            limit = clamp_page_size(request.args.get('limit'), app.config['ORDERS_PAGE_SIZE'])
+            page = paginate_keyset(sales_reporting.lines_query(start_datetime, end_datetime), Purchase,
+                                   cursor=request.args.get('cursor'), limit=limit)
+        except ValueError as e:
+            flash(f'Invalid report parameters: {e}', 'danger')
+            return redirect(url_for('sales_report'))
+
+        report = {
+            'totals': sales_reporting.totals(start_datetime, end_datetime),
+            'previous_year': sales_reporting.totals(year_earlier(start_datetime), year_earlier(end_datetime)),
+            'breakdown': sales_reporting.breakdown(group_by, start_datetime, end_datetime),
+            'page': page,
+        }
     
-    return render_template('sales_report.html', sales=sales)
+    today = datetime.utcnow()
+    quick_ranges = [
+        ('Last 30 days', today - timedelta(days=29)),
+        ('Last 90 days', today - timedelta(days=89)),
+        ('Year to date', today.replace(month=1, day=1)),
+    ]
+    quick_ranges = [
+        {'label': label, 'start_date': start.strftime('%Y-%m-%d'), 'end_date': today.strftime('%Y-%m-%d')}
+        for label, start in quick_ranges
+    ]
+    
+    return render_template('sales_report.html', report=report, start_date=start_date, end_date=end_date,
+                           group_by=group_by, groupings=GROUPINGS, quick_ranges=quick_ranges)
 
 
 @app.route('/sales/export.csv')
 @login_required
 @manager_required
 def export_sales_csv():
-    """Export sales data to CSV file."""
+    """Export sales data to CSV file.
+    
+    `view=daily` exports per-day, per-title totals from the rollup; the
+    default is one line per sale.
+    """
     try:
         # Get date range from query parameters (optional)
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Build query for purchases (which represent our sales)
-        query = Purchase.query
-        
+        start_datetime = end_datetime = None
         if start_date and end_date:
             start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(
-                Purchase.timestamp >= start_datetime,
-                Purchase.timestamp < end_datetime
-            )
-        
-        purchases = query.order_by(Purchase.timestamp.desc()).all()
-        
-        # Create CSV content
-        csv_content = StringIO()
-        writer = csv.writer(csv_content)
+            end_datetime = datetime.strptime(end_date, '%Y-%m-%d')
         
-        # Write CSV header
-        writer.writerow(['Sale ID', 'Book ISBN', 'Book Title', 'Author', 'Quantity', 'Unit Price', 'Total Price', 'Sale Date'])
-        
-        # Write sales data
-        for purchase in purchases:
-            book = Book.query.filter_by(isbn=purchase.book_isbn).first()
-            if book:
-                unit_price = book.price
-                total_price = unit_price * purchase.quantity
-                writer.writerow([
-                    purchase.id,
-                    purchase.book_isbn,
-                    book.title,
-                    book.author,
-                    purchase.quantity,
-                    f'{unit_price:.2f}',
-                    f'{total_price:.2f}',
-                    purchase.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-                ])
-        
-        # Create response
-        csv_content.seek(0)
+        if request.args.get('view') == 'daily':
+            query = sales_reporting.daily_query(start_datetime, end_datetime)
+            
+            def daily_chunks():
+                for chunk in iter_chunks(query, app.config['EXPORT_CHUNK_SIZE']):
+                    yield [[
+                        row.day.strftime('%Y-%m-%d'),
+                        row.isbn,
+                        row.title,
+                        row.author,
+                        row.units,
+                        f'{row.revenue:.2f}',
+                        row.orders
+                    ] for row in chunk]
+            
+            filename = f"daily_sales_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            header = ['Date', 'Book ISBN', 'Book Title', 'Author', 'Units', 'Revenue', 'Orders']
+            return streaming_csv_response(filename, header, daily_chunks())
+        
+        query = sales_reporting.lines_query(start_datetime, end_datetime).order_by(Purchase.timestamp.desc())
+        
+        def row_chunks():
+            for chunk in iter_chunks(query, app.config['EXPORT_CHUNK_SIZE']):
+                yield [[
+                    line.id,
+                    line.isbn,
+                    line.title,
+                    line.author,
+                    line.quantity,
+                    f'{line.unit_price:.2f}' if line.unit_price is not None else '',
+                    f'{line.discount:.2f}',
+                    f'{line.total_price:.2f}',
+                    line.timestamp.strftime('%Y-%m-%d %H:%M:%S') if line.timestamp else ''
+                ] for line in chunk]
         
         # Generate filename with current timestamp
         filename = f"sales_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        header = ['Sale ID', 'Book ISBN', 'Book Title', 'Author', 'Quantity', 'Unit Price', 'Discount', 'Total Price', 'Sale Date']
         
-        response = Response(
-            csv_content.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
-        )
-        
-        return response
+        return streaming_csv_response(filename, header, row_chunks())
         
     except Exception as e:
         flash(f'Error exporting sales data: {str(e)}', 'danger')
@@ -4021,4 +4295,12 @@ if __name__ == '__main__':
         # ensure uploads dir exists inside instance
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
         db.create_all()
+        migrate_schema(db.engine, log=print)
+        ensure_search_index(db.engine)
+        for warning in full_scan_warnings(db.engine):
+            print(f"WARNING: {warning}")
+        settings, problems = check_settings(db.engine, SQLITE_PRAGMAS)
+        print("SQLite settings: " + ", ".join(f"{name}={value}" for name, value in settings.items()))
+        for problem in problems:
+            print(f"WARNING: {problem}")
     app.run(debug=True)
@@ -0,0 +1,132 @@
+"""
+Book Cache Module
+
+This module serves storefront point lookups of books by ISBN from memory:
+- A bounded, process-local LRU of book column values keyed by ISBN
+- A catalog version counter; every catalog write (add, edit, delete, mark
+  out of stock, CSV import, purchases) bumps it, which drops every cached
+  entry at once
+- invalidate() for writes that know which titles they touched (checkout
+  holds and their release), dropping only those entries
+- Missing ISBNs are cached too, so templates asking for deleted books do
+  not query on every render
+- A TTL bound, so changes made by other processes show up within seconds
+
+Cached books come back attached to the current session through
+merge(load=False), without a SELECT, and behave like queried ones. They
+can be up to one write stale: anything that decides on stock (checkout,
+holds) must read the database instead, with populate_existing so cached
+books already in the session are refreshed rather than returned as they
+are, and the conditional stock UPDATEs in inventory.py remain the final
+check. The book model is defined in
+app.py and handed to the cache through init_app().
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+# Cached "no such book" marker, distinct from a cache miss
+_MISSING = object()
+
+
+class BookCache:
+    """Read-through cache of books by ISBN, invalidated by a catalog version."""
+
+    def __init__(self, max_size: int = 2048, ttl_seconds: float = 30.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db = None
+        self.model = None
+        self.version = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, db, book_model) -> None:
+        self.db = db
+        self.model = book_model
+
+    def bump(self) -> None:
+        """Record a catalog change; every cached book is dropped."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def invalidate(self, isbns: Iterable[str]) -> None:
+        """Record a change to these books only; other cached books stay."""
+        isbns = list(isbns)
+        if not isbns:
+            return
+        with self._lock:
+            # Also keeps rows read before this call from being stored afterwards
+            self.version += 1
+            for isbn in isbns:
+                self._entries.pop(isbn, None)
+
+    # -- internals ------------------------------------------------------------
+
+    def _lookup(self, isbn: str):
+        with self._lock:
+            entry = self._entries.get(isbn)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[isbn]
+                return None
+            self._entries.move_to_end(isbn)
+            return values
+
+    def _store(self, version: int, loaded: Dict[str, object]) -> None:
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            # Don't cache rows read before a concurrent bump()
+            if version != self.version:
+                return
+            for isbn, values in loaded.items():
+                self._entries[isbn] = (values, expires_at)
+                self._entries.move_to_end(isbn)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _values(self, book) -> dict:
+        return {attr.key: getattr(book, attr.key) for attr in inspect(self.model).column_attrs}
+
+    def _attach(self, values: dict):
+        book = self.model(**values)
+        make_transient_to_detached(book)
+        return self.db.session.merge(book, load=False)
+
+    # -- lookups --------------------------------------------------------------
+
+    def get_many(self, isbns: Iterable[str]) -> Dict[str, object]:
+        """Books for `isbns` keyed by ISBN (missing ones left out), one IN (...) query for misses."""
+        found, misses = {}, []
+        for isbn in dict.fromkeys(isbns):
+            values = self._lookup(isbn)
+            if values is None:
+                misses.append(isbn)
+            elif values is not _MISSING:
+                found[isbn] = self._attach(values)
+
+        if misses:
+            version = self.version
+            books = self.model.query.filter(self.model.isbn.in_(misses)).all()
+            loaded = {isbn: _MISSING for isbn in misses}
+            for book in books:
+                loaded[book.isbn] = self._values(book)
+                found[book.isbn] = book
+            self._store(version, loaded)
+        return found
+
+    def get(self, isbn: Optional[str]):
+        """The book with this ISBN, or None."""
+        if not isbn:
+            return None
+        return self.get_many([isbn]).get(isbn)
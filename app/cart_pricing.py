@@ -0,0 +1,104 @@
+"""
+Cart Pricing Module
+
+This module prices a shopping cart in a single pass:
+- Line items for every cart ISBN that exists in the catalog
+- Subtotal, discount (if the code's minimum order is met) and total
+- Stock shortfalls where the cart asks for more copies than are on hand
+- Per-line unit price, line total and share of the order discount, so the
+  amounts can be stored on each purchase record
+
+It does no database access itself. Callers load every book in the cart with
+one batched query and pass the results in, so checkout costs one round trip
+instead of one lookup per cart line.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class CartQuote:
+    """Priced view of a cart."""
+
+    def __init__(self):
+        self.items: List[Tuple[Any, int]] = []        # (book, quantity) in cart order
+        self.missing_isbns: List[str] = []            # cart ISBNs not in the catalog
+        self.shortfalls: List[Tuple[Any, int]] = []   # (book, requested quantity)
+        self.subtotal = 0
+        self.discount_code: Optional[str] = None      # code that was actually applied
+        self.discount_rate = 0
+        self.discount_amount = 0
+        self.total = 0
+
+    @property
+    def first_shortfall(self):
+        """The first (book, requested quantity) that cannot be filled, or None."""
+        return self.shortfalls[0] if self.shortfalls else None
+
+    @property
+    def isbns(self) -> List[str]:
+        return [book.isbn for book, _ in self.items]
+
+    def priced_lines(self) -> List[Tuple[Any, int, float, float, float]]:
+        """
+        (book, quantity, unit price, line total, discount share) per item.
+
+        The discount is split across lines in proportion to their totals and
+        rounded to cents; the last line absorbs the rounding so the shares add
+        up to the order's discount.
+        """
+        lines = []
+        allocated = 0.0
+        discount = round(self.discount_amount, 2)
+        for index, (book, qty) in enumerate(self.items):
+            line_total = round(book.price * qty, 2)
+            if not discount or not self.subtotal:
+                share = 0.0
+            elif index == len(self.items) - 1:
+                share = round(discount - allocated, 2)
+            else:
+                share = round(discount * book.price * qty / self.subtotal, 2)
+            allocated += share
+            lines.append((book, qty, book.price, line_total, share))
+        return lines
+
+
+def price_cart(cart: Dict[str, int], books_by_isbn: Dict[str, Any],
+               discount_code: Optional[str] = None,
+               discount_codes: Optional[Dict[str, list]] = None,
+               held: Optional[Dict[str, int]] = None) -> CartQuote:
+    """
+    Price a cart of {isbn: quantity} against pre-loaded books.
+
+    Args:
+        cart: Session cart mapping ISBN to requested quantity.
+        books_by_isbn: Books for (at least) every ISBN in the cart.
+        discount_code: Code stored in the session, if any.
+        discount_codes: Mapping of code to [rate, minimum order amount].
+        held: Copies already held for this cart ({isbn: quantity}); they are
+            out of `book.quantity` but still available to this cart.
+
+    Returns:
+        A CartQuote with line items, totals and stock shortfalls.
+    """
+    quote = CartQuote()
+    held = held or {}
+
+    for isbn, qty in cart.items():
+        book = books_by_isbn.get(isbn)
+        if book is None:
+            quote.missing_isbns.append(isbn)
+            continue
+        quote.items.append((book, qty))
+        quote.subtotal += book.price * qty
+        if book.quantity + held.get(isbn, 0) < qty:
+            quote.shortfalls.append((book, qty))
+
+    if discount_code and discount_codes and discount_code in discount_codes:
+        discount_rate, min_order = discount_codes[discount_code]
+        if quote.subtotal >= min_order:
+            quote.discount_code = discount_code
+            quote.discount_rate = discount_rate
+            quote.discount_amount = quote.subtotal * discount_rate
+
+    quote.total = quote.subtotal - quote.discount_amount
+    return quote
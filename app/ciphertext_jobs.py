@@ -0,0 +1,202 @@
+"""
+Encrypted Column Rewrite Module
+
+This module rewrites stored ciphertexts in place while the application keeps
+running:
+- Rows are walked in primary-key order in small batches, each committed in
+  its own short transaction
+- A pause between batches throttles the job so checkout writes are not
+  starved of SQLite's write lock, and a duty cycle caps the share of wall
+  time the job spends working (decrypting is CPU-bound)
+- Progress is checkpointed per job and table in `ciphertext_job_progress`,
+  so a stopped job resumes after the last committed batch
+- A value is only replaced if it is still the one that was read, so a
+  concurrent write from the application always wins
+- progress() reports how far each table has got, for status pages and
+  scripts
+
+What a rewrite does is up to the `transform` callback: converting legacy
+values to the compact storage format (encryption_utils.reencode) or
+re-encrypting under a new key. It returns the new stored value, or None to
+leave a value as it is.
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+PROGRESS_TABLE = 'ciphertext_job_progress'
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class EncryptedColumns:
+    """The ciphertext columns of one table and the integer key to walk it by."""
+
+    def __init__(self, table: str, columns: Iterable[str], key: str = 'id'):
+        self.table = table
+        self.columns = list(columns)
+        self.key = key
+
+
+class RewriteResult:
+    """Counts for one job run."""
+
+    def __init__(self):
+        self.rows = 0
+        self.rewritten = 0
+        self.failed = 0
+        self.finished = True
+
+
+class CiphertextRewriter:
+    """Resumable, throttled rewrite of encrypted columns under a job name."""
+
+    def __init__(self, engine, job: str, transform: Callable[[str], Optional[str]],
+                 batch_size: int = DEFAULT_BATCH_SIZE, pause: float = 0.0, duty_cycle: float = 1.0):
+        if not 0 < duty_cycle <= 1:
+            raise ValueError("duty_cycle must be in (0, 1]")
+        self.engine = engine
+        self.job = job
+        self.transform = transform
+        self.batch_size = batch_size
+        self.pause = pause
+        self.duty_cycle = duty_cycle
+
+    # -- checkpoints ----------------------------------------------------------
+
+    def _ensure_progress_table(self, conn) -> None:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} ("
+            "job VARCHAR(100) NOT NULL, table_name VARCHAR(100) NOT NULL, "
+            "last_key INTEGER NOT NULL DEFAULT 0, done BOOLEAN NOT NULL DEFAULT 0, "
+            "updated_at DATETIME, PRIMARY KEY (job, table_name))"
+        ))
+
+    def _checkpoint_row(self, conn, table: str):
+        return conn.execute(
+            text(f"SELECT last_key, done, updated_at FROM {PROGRESS_TABLE} WHERE job = :job AND table_name = :table"),
+            {'job': self.job, 'table': table}
+        ).first()
+
+    def _checkpoint(self, conn, table: str):
+        row = self._checkpoint_row(conn, table)
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def _save_checkpoint(self, conn, table: str, last_key: int, done: bool) -> None:
+        conn.execute(text(
+            f"INSERT INTO {PROGRESS_TABLE} (job, table_name, last_key, done, updated_at) "
+            "VALUES (:job, :table, :last_key, :done, :now) "
+            "ON CONFLICT (job, table_name) DO UPDATE SET "
+            "last_key = excluded.last_key, done = excluded.done, updated_at = excluded.updated_at"
+        ), {'job': self.job, 'table': table, 'last_key': last_key, 'done': done, 'now': datetime.utcnow()})
+
+    def reset(self) -> None:
+        """Forget this job's progress so the next run starts from the beginning."""
+        with self.engine.begin() as conn:
+            self._ensure_progress_table(conn)
+            conn.execute(text(f"DELETE FROM {PROGRESS_TABLE} WHERE job = :job"), {'job': self.job})
+
+    # -- rewriting ------------------------------------------------------------
+
+    def _throttle(self, busy: float) -> None:
+        # Idle long enough that work takes at most duty_cycle of the wall time
+        delay = self.pause + busy * (1 - self.duty_cycle) / self.duty_cycle
+        if delay > 0:
+            time.sleep(delay)
+
+    def _rewrite_batch(self, conn, spec: EncryptedColumns, rows, result: RewriteResult) -> None:
+        for row in rows:
+            key = row[0]
+            for column, value in zip(spec.columns, row[1:]):
+                if not value:
+                    continue
+                try:
+                    new_value = self.transform(value)
+                except Exception:
+                    result.failed += 1
+                    continue
+                if new_value is None or new_value == value:
+                    continue
+                # Leave the value alone if the application changed it since it was read
+                changed = conn.execute(text(
+                    f'UPDATE "{spec.table}" SET {column} = :new WHERE {spec.key} = :key AND {column} = :old'
+                ), {'new': new_value, 'key': key, 'old': value}).rowcount
+                result.rewritten += changed
+
+    def run_table(self, spec: EncryptedColumns, result: RewriteResult,
+                  should_stop: Optional[Callable[[], bool]] = None,
+                  log: Optional[Callable[[str], None]] = None) -> None:
+        with self.engine.begin() as conn:
+            self._ensure_progress_table(conn)
+            last_key, done = self._checkpoint(conn, spec.table)
+        if done:
+            return
+
+        select_batch = text(
+            f'SELECT {spec.key}, {", ".join(spec.columns)} FROM "{spec.table}" '
+            f'WHERE {spec.key} > :last_key ORDER BY {spec.key} LIMIT :limit'
+        )
+        while True:
+            if should_stop and should_stop():
+                result.finished = False
+                return
+            started = time.monotonic()
+            with self.engine.begin() as conn:
+                rows = conn.execute(select_batch, {'last_key': last_key, 'limit': self.batch_size}).all()
+                if rows:
+                    self._rewrite_batch(conn, spec, rows, result)
+                    last_key = rows[-1][0]
+                    result.rows += len(rows)
+                done = len(rows) < self.batch_size
+                self._save_checkpoint(conn, spec.table, last_key, done)
+            if done:
+                if log:
+                    log(f"{spec.table}: done (up to {spec.key} {last_key}).")
+                return
+            if log:
+                log(f"{spec.table}: up to {spec.key} {last_key}, {result.rewritten} values rewritten so far.")
+            self._throttle(time.monotonic() - started)
+
+    def run(self, specs: Iterable[EncryptedColumns], should_stop: Optional[Callable[[], bool]] = None,
+            log: Optional[Callable[[str], None]] = None) -> RewriteResult:
+        """
+        Rewrite every listed table, resuming from this job's checkpoints.
+
+        `should_stop` is polled between batches; when it returns True the run
+        ends early with result.finished False, and the next run carries on.
+        """
+        result = RewriteResult()
+        for spec in specs:
+            self.run_table(spec, result, should_stop, log)
+            if not result.finished:
+                break
+        return result
+
+    def pending_tables(self, specs: Iterable[EncryptedColumns]) -> List[str]:
+        """Tables this job has not finished yet."""
+        with self.engine.begin() as conn:
+            self._ensure_progress_table(conn)
+            return [spec.table for spec in specs if not self._checkpoint(conn, spec.table)[1]]
+
+    def progress(self, specs: Iterable[EncryptedColumns]) -> List[Dict[str, object]]:
+        """
+        Where this job stands on each table: the last key rewritten, the
+        table's highest key, whether it is done and when it last moved.
+        """
+        status = []
+        with self.engine.begin() as conn:
+            self._ensure_progress_table(conn)
+            for spec in specs:
+                row = self._checkpoint_row(conn, spec.table)
+                max_key = conn.execute(text(f'SELECT MAX({spec.key}) FROM "{spec.table}"')).scalar()
+                status.append({
+                    'table': spec.table,
+                    'last_key': row[0] if row else 0,
+                    'max_key': max_key or 0,
+                    'done': bool(row[1]) if row else False,
+                    'updated_at': row[2] if row else None,
+                })
+        return status
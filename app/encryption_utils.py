@@ -9,42 +9,266 @@ This module provides encryption/decryption functions for customer data such as:
 - Payment information
 
 Uses Fernet symmetric encryption from the cryptography library for security.
+
+Large decrypt_many() batches can be spread over a process pool, which is
+started on first use, reused by later batches and shut down at exit.
+
+Key derivation (PBKDF2, 100,000 iterations) is expensive, so derived keys are
+cached per process by password and salt. A pre-derived key can also be supplied
+through the ENCRYPTION_KEY environment variable or a file named by
+ENCRYPTION_KEY_FILE, which skips key derivation entirely. Print the key for the
+current ENCRYPTION_PASSWORD with: python encryption_utils.py --print-key
+
+Stored values carry a format prefix: "v2:" followed by the Fernet token,
+which is already URL-safe base64. Values written before the prefix existed
+are the token base64-encoded a second time (a third larger); they are still
+read, and reencode() converts them without decrypting.
+
+Keys can be rotated while the app runs. Put the new key in ENCRYPTION_KEY
+(or ENCRYPTION_PASSWORD) and list the previous ones in ENCRYPTION_OLD_KEYS
+or ENCRYPTION_OLD_PASSWORDS (comma-separated, newest first): new values are
+encrypted with the new key, values under any listed key still decrypt, and
+rotate() re-encrypts a stored value under the new key. Blind indexes must
+not change when the key does, so before rotating, save the current index key
+(python encryption_utils.py --print-index-key) in BLIND_INDEX_KEY. A key
+ring with old keys but no BLIND_INDEX_KEY is refused at startup.
 """
 
 import os
 import base64
-from cryptography.fernet import Fernet
+import atexit
+import hashlib
+import hmac
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+# Fixed salt for consistency (in production, consider using random salt per user)
+DEFAULT_SALT = b'chapter6_bookstore_salt_2025'
+KDF_ITERATIONS = 100000  # Recommended minimum iterations
+
+# Process-wide cache of derived keys: sha256(salt + password) -> Fernet key
+_derived_key_cache = {}
+_derived_key_lock = threading.Lock()
+
+
+def derive_key(password, salt=DEFAULT_SALT):
+    """Derive a Fernet key from a password with PBKDF2, cached per process."""
+    cache_key = hashlib.sha256(salt + b'\0' + password.encode()).digest()
+    
+    key = _derived_key_cache.get(cache_key)
+    if key is not None:
+        return key
+    
+    with _derived_key_lock:
+        # Another thread may have finished the derivation while we waited
+        key = _derived_key_cache.get(cache_key)
+        if key is None:
+            kdf = PBKDF2HMAC(
+                algorithm=hashes.SHA256(),
+                length=32,
+                salt=salt,
+                iterations=KDF_ITERATIONS,
+            )
+            key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
+            _derived_key_cache[cache_key] = key
+    return key
+
+
+def load_configured_key():
+    """Return a pre-derived Fernet key from ENCRYPTION_KEY or ENCRYPTION_KEY_FILE, if set."""
+    key = os.environ.get('ENCRYPTION_KEY')
+    if not key:
+        key_file = os.environ.get('ENCRYPTION_KEY_FILE')
+        if key_file:
+            with open(key_file, 'r', encoding='utf-8') as f:
+                key = f.read()
+    
+    if not key:
+        return None
+    
+    key = key.strip().encode('utf-8')
+    Fernet(key)  # Fail fast on a malformed key instead of on first decrypt
+    return key
+
+
+def load_retired_keys():
+    """Return the previous Fernet keys from ENCRYPTION_OLD_KEYS and ENCRYPTION_OLD_PASSWORDS."""
+    keys = [key.strip().encode('utf-8') for key in os.environ.get('ENCRYPTION_OLD_KEYS', '').split(',') if key.strip()]
+    passwords = os.environ.get('ENCRYPTION_OLD_PASSWORDS', '')
+    keys += [derive_key(password.strip()) for password in passwords.split(',') if password.strip()]
+    for key in keys:
+        Fernet(key)  # Fail fast on a malformed key
+    return keys
+
+
+def derive_index_key(key):
+    """Return the blind-index key derived from a Fernet key, used when BLIND_INDEX_KEY is unset."""
+    return hmac.new(key, b'blind-index-v1', hashlib.sha256).digest()
+
+
+def load_index_key():
+    """Return the blind-index key from BLIND_INDEX_KEY ("hex:..." for raw bytes), if set."""
+    index_key = os.environ.get('BLIND_INDEX_KEY')
+    if not index_key:
+        return None
+    if index_key.startswith('hex:'):
+        return bytes.fromhex(index_key[4:])
+    return index_key.encode('utf-8')
+
+
+# Prefix of the current storage format: "v2:" + Fernet token
+STORAGE_PREFIX = 'v2:'
+
+
+def stored_to_token(stored):
+    """Return the Fernet token inside a stored value (current or legacy format)."""
+    if stored.startswith(STORAGE_PREFIX):
+        return stored[len(STORAGE_PREFIX):].encode('ascii')
+    # Legacy format: the token base64-encoded once more
+    return base64.urlsafe_b64decode(stored.encode('ascii'))
+
+
+def token_to_stored(token):
+    """Return the stored form of a Fernet token."""
+    return STORAGE_PREFIX + token.decode('ascii')
+
+
+def reencode(stored):
+    """Convert a legacy stored value to the current format without decrypting it.
+    
+    Returns None when there is nothing to do (empty or already current).
+    Raises ValueError for values that are not valid legacy ciphertext.
+    """
+    if not stored or stored.startswith(STORAGE_PREFIX):
+        return None
+    try:
+        token = base64.urlsafe_b64decode(stored.encode('ascii'))
+    except Exception as e:
+        raise ValueError(f"not a stored ciphertext: {e}") from e
+    if not token.startswith(b'gAAAAA'):
+        raise ValueError("not a stored ciphertext: no Fernet token inside")
+    return token_to_stored(token)
+
+
+# Batches smaller than this are always decrypted in-process; a pool is not worth its startup cost
+PARALLEL_THRESHOLD = 5000
+PARALLEL_CHUNK_SIZE = 1000
+
+
+def _decrypt_values(cipher_suite, values):
+    """Decrypt stored values in order. Returns (plaintexts, error_count)."""
+    results = []
+    seen = {}
+    errors = 0
+    decrypt = cipher_suite.decrypt
+    
+    for value in values:
+        if not value:
+            results.append(None)
+            continue
+        
+        plaintext = seen.get(value)
+        if plaintext is None and value not in seen:
+            try:
+                plaintext = decrypt(stored_to_token(value)).decode('utf-8')
+            except Exception:
+                plaintext = None
+                errors += 1
+            seen[value] = plaintext
+        results.append(plaintext)
+    
+    return results, errors
+
+
+def _encrypt_values(cipher_suite, values):
+    """Encrypt plaintext values in order. Returns (ciphertexts, error_count)."""
+    results = []
+    errors = 0
+    encrypt = cipher_suite.encrypt
+    
+    for value in values:
+        if value is None or value == '':
+            results.append(None)
+            continue
+        
+        try:
+            data_bytes = value.encode('utf-8') if isinstance(value, str) else value
+            results.append(token_to_stored(encrypt(data_bytes)))
+        except Exception:
+            results.append(None)
+            errors += 1
+    
+    return results, errors
+
+
+# Per-process cipher used by pool workers (set by _init_pool_worker)
+_pool_cipher = None
+
+
+def _init_pool_worker(keys):
+    global _pool_cipher
+    _pool_cipher = MultiFernet([Fernet(key) for key in keys])
+
+
+def _pool_decrypt_chunk(values):
+    return _decrypt_values(_pool_cipher, values)
+
+
 class DataEncryption:
     """Handles encryption and decryption of sensitive customer data."""
     
-    def __init__(self, password=None):
-        """Initialize encryption with a password or environment variable."""
+    def __init__(self, password=None, old_keys=None, index_key=None):
+        """Initialize encryption with a password, a pre-derived key or environment variable.
+        
+        `old_keys` are previous Fernet keys, newest first, that can still decrypt;
+        without a password they come from the environment (load_retired_keys).
+        `index_key` (or BLIND_INDEX_KEY) keys the blind indexes and is required
+        once there are old keys.
+        """
+        key = None
         if password is None:
+            key = load_configured_key()
+            if old_keys is None:
+                old_keys = load_retired_keys()
             # Try to get from environment variable, fallback to default for development
             password = os.environ.get('ENCRYPTION_PASSWORD', 'chapter6_bookstore_dev_key_2025')
         
-        # Generate a key from the password
-        self.key = self._generate_key_from_password(password)
-        self.cipher_suite = Fernet(self.key)
+        # Generate a key from the password unless a pre-derived key was configured
+        self.key = key or self._generate_key_from_password(password)
+        
+        # Key ring: encrypt with the newest key, decrypt with any of them
+        self.keys = [self.key] + [old for old in (old_keys or []) if old != self.key]
+        self.primary = Fernet(self.key)
+        self.cipher_suite = MultiFernet([self.primary] + [Fernet(old) for old in self.keys[1:]])
+        
+        # Process pool for large decrypt_many() batches, started on first use and reused
+        self._pool = None
+        self._pool_key = None  # (worker count, pid) the pool was started for
+        self._pool_lock = threading.Lock()
+        
+        # Separate key for blind indexes so lookups never reuse the cipher key.
+        # Deriving it from the current key would silently break every lookup once
+        # that key is rotated out, so a key ring needs it configured explicitly.
+        self.index_key = index_key or load_index_key()
+        if self.index_key is None:
+            if len(self.keys) > 1:
+                raise ValueError(
+                    "Old encryption keys are configured but BLIND_INDEX_KEY is not set. Set it to "
+                    "the index key printed by 'encryption_utils.py --print-index-key' before the "
+                    "rotation started, or email lookups will stop matching."
+                )
+            self.index_key = derive_index_key(self.key)
     
     def _generate_key_from_password(self, password):
         """Generate a Fernet key from a password using PBKDF2."""
-        # Use a fixed salt for consistency (in production, consider using random salt per user)
-        salt = b'chapter6_bookstore_salt_2025'
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,  # Recommended minimum iterations
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        return key
+        return derive_key(password)
     
     def encrypt(self, data):
-        """Encrypt a string and return base64 encoded result."""
+        """Encrypt a string and return its stored form ("v2:" + Fernet token)."""
         if data is None or data == '':
             return None
         
@@ -55,27 +279,21 @@ class DataEncryption:
             else:
                 data_bytes = data
             
-            # Encrypt the data
-            encrypted_data = self.cipher_suite.encrypt(data_bytes)
-            
-            # Return base64 encoded string for database storage
-            return base64.urlsafe_b64encode(encrypted_data).decode('utf-8')
+            # Encrypt the data with the newest key and prefix the token with the storage format version
+            return token_to_stored(self.primary.encrypt(data_bytes))
             
         except Exception as e:
             print(f"Encryption error: {e}")
             return None
     
     def decrypt(self, encrypted_data):
-        """Decrypt base64 encoded data and return original string."""
+        """Decrypt a stored value (either storage format) and return the original string."""
         if encrypted_data is None or encrypted_data == '':
             return None
         
         try:
-            # Decode from base64
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
-            
-            # Decrypt the data
-            decrypted_bytes = self.cipher_suite.decrypt(encrypted_bytes)
+            # Decrypt the token inside the stored value
+            decrypted_bytes = self.cipher_suite.decrypt(stored_to_token(encrypted_data))
             
             # Return as string
             return decrypted_bytes.decode('utf-8')
@@ -84,6 +302,113 @@ class DataEncryption:
             print(f"Decryption error: {e}")
             return None
     
+    def decrypt_many(self, encrypted_values, workers=None):
+        """Decrypt a whole column of stored values at once, preserving order.
+        
+        Empty values and values that fail to decrypt come back as None; failures
+        are reported once per batch instead of once per field. When `workers`
+        is given and the batch is large, chunks are decrypted across a process
+        pool, which is started once and kept for later batches.
+        """
+        values = list(encrypted_values)
+        
+        if workers and workers > 1 and len(values) >= PARALLEL_THRESHOLD:
+            chunks = [values[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(values), PARALLEL_CHUNK_SIZE)]
+            results = []
+            errors = 0
+            for chunk_results, chunk_errors in self._get_pool(workers).map(_pool_decrypt_chunk, chunks):
+                results.extend(chunk_results)
+                errors += chunk_errors
+        else:
+            results, errors = _decrypt_values(self.cipher_suite, values)
+        
+        if errors:
+            print(f"Decryption error: {errors} of {len(values)} value(s) could not be decrypted")
+        return results
+    
+    def _get_pool(self, workers):
+        """The process pool for `workers` workers, started on first use.
+        
+        The key ring is sent to the workers once, when they start. A pool
+        inherited across fork() belongs to the parent and is not reused.
+        """
+        pool_key = (workers, os.getpid())
+        with self._pool_lock:
+            if self._pool is None or self._pool_key != pool_key:
+                if self._pool is not None and self._pool_key[1] == pool_key[1]:
+                    atexit.unregister(self._pool.shutdown)
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_pool_worker,
+                                                 initargs=(self.keys,))
+                self._pool_key = pool_key
+                atexit.register(self._pool.shutdown)
+            return self._pool
+    
+    def close(self):
+        """Shut down the decryption process pool, if one was started."""
+        with self._pool_lock:
+            if self._pool is not None:
+                atexit.unregister(self._pool.shutdown)
+                self._pool.shutdown()
+                self._pool = None
+                self._pool_key = None
+    
+    def encrypt_many(self, values):
+        """Encrypt a whole column of plaintext values at once, preserving order."""
+        values = list(values)
+        results, errors = _encrypt_values(self.primary, values)
+        if errors:
+            print(f"Encryption error: {errors} of {len(values)} value(s) could not be encrypted")
+        return results
+    
+    @property
+    def key_id(self):
+        """Short, non-secret fingerprint of the newest key."""
+        return hashlib.sha256(self.key).hexdigest()[:12]
+    
+    def rotate(self, stored):
+        """Re-encrypt a stored value under the newest key, in the current storage format.
+        
+        Returns None when there is nothing to do (empty, or already under the
+        newest key in the current format). Raises ValueError when no key in
+        the ring can decrypt the value.
+        """
+        if not stored:
+            return None
+        try:
+            token = stored_to_token(stored)
+        except Exception as e:
+            raise ValueError(f"not a stored ciphertext: {e}") from e
+        
+        try:
+            # Checks the signature against the newest key without decrypting
+            self.primary.extract_timestamp(token)
+            return None if stored.startswith(STORAGE_PREFIX) else token_to_stored(token)
+        except InvalidToken:
+            pass
+        
+        try:
+            return token_to_stored(self.cipher_suite.rotate(token))
+        except InvalidToken as e:
+            raise ValueError("no key in the key ring can decrypt this value") from e
+    
+    def blind_index(self, data):
+        """Return a keyed HMAC of a value for equality lookups on encrypted columns.
+        
+        Fernet output is randomized, so ciphertext cannot be indexed or compared.
+        The blind index is deterministic: the same (normalized) value always
+        produces the same 64-character hex digest, which can be stored in an
+        indexed column next to the ciphertext.
+        """
+        if data is None:
+            return None
+        
+        normalized = str(data).strip().lower()
+        if not normalized:
+            return None
+        
+        return hmac.new(self.index_key, normalized.encode('utf-8'), hashlib.sha256).hexdigest()
+    
     def encrypt_email(self, email):
         """Encrypt an email address."""
         return self.encrypt(email)
@@ -135,6 +460,67 @@ class DataEncryption:
         return decrypted_dict
 
 
+class EncryptedField:
+    """Model attribute backed by an encrypted column, decrypted at most once per instance.
+
+    Reading the attribute decrypts the column's ciphertext and remembers the
+    plaintext on the instance, so a page that shows `customer.email` several
+    times pays for one decrypt. The memo is keyed by the ciphertext it came
+    from: if the column changes underneath (refresh, re-encryption) the next
+    read decrypts again. Assigning through the attribute encrypts the value,
+    updates the optional blind-index column and memoizes the plaintext.
+
+    `source` may return the ciphertext from somewhere other than `column`
+    (order lines read their order header's contact details).
+    """
+
+    def __init__(self, encryption, column, index_column=None, source=None):
+        self.encryption = encryption
+        self.column = column
+        self.index_column = index_column
+        self.source = source
+        self.name = column
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    @staticmethod
+    def _memo(instance):
+        memo = instance.__dict__.get('_decrypted_fields')
+        if memo is None:
+            memo = instance.__dict__['_decrypted_fields'] = {}
+        return memo
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        ciphertext = self.source(instance) if self.source else getattr(instance, self.column)
+        if not ciphertext:
+            return None
+
+        memo = self._memo(instance)
+        cached = memo.get(self.name)
+        if cached is not None and cached[0] == ciphertext:
+            return cached[1]
+
+        plaintext = self.encryption.decrypt(ciphertext)
+        memo[self.name] = (ciphertext, plaintext)
+        return plaintext
+
+    def __set__(self, instance, value):
+        ciphertext = self.encryption.encrypt(value) if value else None
+        setattr(instance, self.column, ciphertext)
+        if self.index_column:
+            setattr(instance, self.index_column, self.encryption.blind_index(value) if value else None)
+
+        memo = self._memo(instance)
+        if ciphertext:
+            memo[self.name] = (ciphertext, value)
+        else:
+            memo.pop(self.name, None)
+
+
 # Global encryption instance
 encryption = DataEncryption()
 
@@ -179,4 +565,9 @@ def test_encryption():
 
 
 if __name__ == "__main__":
-    test_encryption()
\ No newline at end of file
+    if '--print-key' in sys.argv[1:]:
+        print(encryption.key.decode('utf-8'))
+    elif '--print-index-key' in sys.argv[1:]:
+        print('hex:' + encryption.index_key.hex())
+    else:
+        test_encryption()
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Inventory Reservation Module
+
+This module changes book stock with conditional, set-based UPDATEs so that
+concurrent checkouts cannot oversell:
+- take(): one `UPDATE book SET quantity = quantity - q ... WHERE quantity >= q`
+  for the whole cart; if any title is short, nothing is taken
+- restock(): the inverse, for released holds and returned stock
+- Optional short-lived holds: stock is taken when the checkout page is shown,
+  recorded in `inventory_reservations` under a token, and either claimed by
+  the purchase or returned once it expires
+- `in_stock` is derived from the new quantity in the same statement
+- void(): drops holds on titles whose quantity is overwritten with an
+  absolute count (stock-take edits, mark out of stock, CSV imports); the
+  held copies are part of that count, so releasing the hold later would
+  add them twice
+- sweep_if_due(): returns expired holds to stock at most every
+  `sweep_interval` seconds, so abandoned holds do not keep titles hidden
+  until the next checkout
+
+Read-check-write through the ORM (`if book.quantity >= qty: book.quantity -=
+qty`) lets two requests both pass the check; here the check and the write
+are one statement, so the database arbitrates. The caller owns the
+transaction. The book and reservation models are defined in app.py and
+handed to the service through init_app().
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, select, update
+
+# Expired holds returned to stock per sweep
+SWEEP_BATCH_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    """A cart line asked for more copies than are on hand."""
+
+    def __init__(self, isbn: str, requested: int, available: int):
+        super().__init__(f"Not enough inventory for {isbn}: requested {requested}, {available} available")
+        self.isbn = isbn
+        self.requested = requested
+        self.available = available
+
+
+class InventoryService:
+    """Atomic stock changes and checkout holds."""
+
+    def __init__(self, hold_seconds: float = 0, sweep_interval: float = 60):
+        self.hold_seconds = hold_seconds
+        self.sweep_interval = sweep_interval
+        self.db = None
+        self.book = None
+        self.reservation = None
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, db, book_model, reservation_model) -> None:
+        self.db = db
+        self.book = book_model
+        self.reservation = reservation_model
+
+    # -- stock --------------------------------------------------------------
+
+    def _change(self, items: Dict[str, int], sign: int):
+        book = self.book.__table__
+        amount = case(items, value=book.c.isbn, else_=0)
+        new_quantity = book.c.quantity + sign * amount
+        stmt = update(book).where(book.c.isbn.in_(list(items)))
+        if sign < 0:
+            stmt = stmt.where(book.c.quantity >= amount)
+        stmt = stmt.values(quantity=new_quantity, in_stock=new_quantity > 0)
+        return dict(self.db.session.execute(stmt.returning(book.c.isbn, book.c.quantity)).all())
+
+    def quantities(self, isbns) -> Dict[str, int]:
+        book = self.book.__table__
+        rows = self.db.session.execute(select(book.c.isbn, book.c.quantity).where(book.c.isbn.in_(list(isbns))))
+        return dict(rows.all())
+
+    def take(self, items: Dict[str, int]) -> Dict[str, int]:
+        """
+        Remove `items` ({isbn: quantity}) from stock, all or nothing.
+
+        Returns:
+            The new quantity of each title.
+
+        Raises:
+            InsufficientStock: For the first title that is short (or missing);
+                no stock is taken.
+        """
+        items = {isbn: qty for isbn, qty in items.items() if qty > 0}
+        if not items:
+            return {}
+        taken = self._change(items, -1)
+        if len(taken) == len(items):
+            return taken
+
+        # Some line was short: put back what this statement took
+        if taken:
+            self._change({isbn: items[isbn] for isbn in taken}, 1)
+        short = next(isbn for isbn in items if isbn not in taken)
+        available = self.quantities([short]).get(short, 0)
+        raise InsufficientStock(short, items[short], available)
+
+    def restock(self, items: Dict[str, int]) -> Dict[str, int]:
+        """Return `items` to stock; returns the new quantities."""
+        items = {isbn: qty for isbn, qty in items.items() if qty > 0}
+        return self._change(items, 1) if items else {}
+
+    # -- holds --------------------------------------------------------------
+
+    def _claim_rows(self, condition) -> Dict[str, int]:
+        """Delete matching reservations and return what they held, per ISBN."""
+        table = self.reservation.__table__
+        rows = self.db.session.execute(
+            delete(table).where(condition).returning(table.c.isbn, table.c.quantity)
+        ).all()
+        held: Counter = Counter()
+        for isbn, quantity in rows:
+            held[isbn] += quantity
+        return dict(held)
+
+    def hold(self, items: Dict[str, int], now: Optional[datetime] = None) -> str:
+        """
+        Take `items` from stock and record them as held; returns the hold token.
+
+        Raises:
+            InsufficientStock: If any title is short; nothing is held.
+        """
+        self.take(items)
+        token = uuid.uuid4().hex
+        expires_at = (now or datetime.utcnow()) + timedelta(seconds=self.hold_seconds)
+        rows = [
+            {'token': token, 'isbn': isbn, 'quantity': qty, 'expires_at': expires_at}
+            for isbn, qty in items.items() if qty > 0
+        ]
+        if rows:
+            self.db.session.execute(self.reservation.__table__.insert(), rows)
+        return token
+
+    def held(self, token: Optional[str]) -> Dict[str, int]:
+        """What a hold currently covers ({} once released, claimed or swept)."""
+        if not token:
+            return {}
+        table = self.reservation.__table__
+        held: Counter = Counter()
+        for isbn, quantity in self.db.session.execute(
+            select(table.c.isbn, table.c.quantity).where(table.c.token == token)
+        ):
+            held[isbn] += quantity
+        return dict(held)
+
+    def release(self, token: Optional[str]) -> Dict[str, int]:
+        """Cancel a hold and return its stock. Unknown tokens are ignored."""
+        if not token:
+            return {}
+        return self.restock(self._claim_rows(self.reservation.__table__.c.token == token))
+
+    def claim(self, token: Optional[str], items: Dict[str, int]) -> Dict[str, int]:
+        """
+        Take `items` for a purchase, using the hold `token` where it still exists.
+
+        A hold that covers exactly `items` is consumed as is; anything else
+        (cart changed, hold expired) is returned and `items` taken afresh.
+
+        Returns:
+            The new quantity of each title.
+
+        Raises:
+            InsufficientStock: As take(); the hold is returned either way.
+        """
+        items = {isbn: qty for isbn, qty in items.items() if qty > 0}
+        held = self._claim_rows(self.reservation.__table__.c.token == token) if token else {}
+        if held and held == items:
+            return self.quantities(items)
+        if held:
+            self.restock(held)
+        return self.take(items)
+
+    def release_expired(self, now: Optional[datetime] = None, limit: int = SWEEP_BATCH_SIZE) -> int:
+        """Return up to `limit` expired hold lines to stock; returns the copies released."""
+        table = self.reservation.__table__
+        expired = (
+            select(table.c.id)
+            .where(table.c.expires_at <= (now or datetime.utcnow()))
+            .limit(limit)
+        )
+        held = self._claim_rows(table.c.id.in_(expired))
+        self.restock(held)
+        return sum(held.values())
+
+    def sweep_if_due(self, now: Optional[datetime] = None) -> Optional[int]:
+        """
+        release_expired(), at most once per `sweep_interval` per process.
+
+        Returns the copies released, or None when no sweep was due (nothing
+        to commit).
+        """
+        clock = time.monotonic()
+        with self._lock:
+            if clock < self._next_sweep:
+                return None
+            self._next_sweep = clock + self.sweep_interval
+        return self.release_expired(now)
+
+    def void(self, isbns: Iterable[str]) -> int:
+        """
+        Drop every hold on `isbns` without returning its stock.
+
+        Call this in the transaction that overwrites those titles' quantity
+        with an absolute count. Holders take their copies afresh at checkout.
+        Returns the hold lines removed.
+        """
+        isbns = list(dict.fromkeys(isbns))
+        table = self.reservation.__table__
+        removed = 0
+        for start in range(0, len(isbns), SWEEP_BATCH_SIZE):
+            batch = isbns[start:start + SWEEP_BATCH_SIZE]
+            removed += self.db.session.execute(delete(table).where(table.c.isbn.in_(batch))).rowcount
+        return removed
@@ -0,0 +1,246 @@
+"""
+Inventory CSV Import Module
+
+This module loads catalog feeds into the `book` table in a single streaming
+pass:
+- The upload is read straight from the request stream; nothing is saved or
+  read twice
+- Rows are validated and grouped into chunks; each chunk costs one
+  `SELECT ... WHERE isbn IN (...)` to find existing books, then one
+  executemany INSERT and one executemany UPDATE
+- Rows that cannot be imported (and rows imported with a corrected genre)
+  are written to a CSV report, one line per problem, instead of being
+  flashed individually
+
+The caller owns the transaction: run import_books() on a session or
+connection and commit afterwards.
+"""
+
+import csv
+import io
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_GENRE = 'Fiction'
+
+# Columns written to the book table, in report order
+BOOK_COLUMNS = ['isbn', 'title', 'author', 'price', 'quantity', 'genre', 'cover_type', 'description']
+
+# =============================================================================
+# ROW PARSING
+# =============================================================================
+
+class RowError(ValueError):
+    """A row that cannot be imported; the message goes into the report."""
+
+
+def parse_isbn(raw: Optional[str]) -> str:
+    """Clean an ISBN, undoing spreadsheet scientific notation (9.78E+12)."""
+    isbn = (raw or '').strip()
+    if isbn and 'E' in isbn.upper():
+        try:
+            return str(int(float(isbn)))
+        except (ValueError, OverflowError):
+            return isbn
+    return isbn
+
+
+def parse_row(row: Dict[str, Any], genres: Iterable[str]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    Validate one CSV row and convert it to book column values.
+
+    Returns:
+        (values, warning) where warning describes a corrected field, or None.
+
+    Raises:
+        RowError: If the row has to be skipped.
+    """
+    isbn = parse_isbn(row.get('isbn'))
+    title = (row.get('title') or '').strip()
+    author = (row.get('author') or '').strip()
+
+    price_raw = (row.get('price') or '').strip()
+    try:
+        price = float(price_raw.replace('$', '').replace(',', '')) if price_raw else 0.0
+    except ValueError:
+        raise RowError(f"invalid price '{price_raw}'")
+
+    quantity_raw = (row.get('quantity') or '').strip()
+    try:
+        quantity = int(float(quantity_raw)) if quantity_raw else 0  # Handle decimal quantities
+    except (ValueError, OverflowError):
+        raise RowError(f"invalid quantity '{quantity_raw}'")
+
+    missing_fields = [name for name, value in (('ISBN', isbn), ('title', title), ('author', author)) if not value]
+    if missing_fields:
+        raise RowError(f"missing required fields: {', '.join(missing_fields)}")
+
+    warning = None
+    genre = (row.get('genre') or '').strip()
+    if not genre:
+        genre = DEFAULT_GENRE
+    elif genre not in genres:
+        warning = f"unknown genre '{genre}', set to '{DEFAULT_GENRE}'"
+        genre = DEFAULT_GENRE
+
+    values = {
+        'isbn': isbn,
+        'title': title,
+        'author': author,
+        'price': price,
+        'quantity': quantity,
+        'in_stock': quantity > 0,
+        'genre': genre,
+        'cover_type': (row.get('cover_type') or '').strip(),
+        'description': (row.get('description') or '').strip(),
+    }
+    return values, warning
+
+
+def read_csv_rows(stream: IO[bytes]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Yield (line number, row) from a binary CSV stream.
+
+    Header names are stripped and lower-cased, and a UTF-8 BOM is ignored.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            return
+        fieldnames = [name.strip().lower() for name in header]
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            yield reader.line_num, dict(zip(fieldnames, row))
+    finally:
+        # Leave the underlying upload stream open for its owner
+        text.detach()
+
+# =============================================================================
+# ERROR REPORT
+# =============================================================================
+
+class ImportReport:
+    """CSV of rows that were skipped or corrected, written as the import runs."""
+
+    HEADER = ['line', 'level', 'message'] + BOOK_COLUMNS
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.errors = 0
+        self.warnings = 0
+        self._file = None
+        self._writer = None
+
+    def add(self, line: int, level: str, message: str, row: Dict[str, Any]) -> None:
+        if level == 'error':
+            self.errors += 1
+        else:
+            self.warnings += 1
+        if self.path is None:
+            return
+        if self._writer is None:
+            # Only create the file once there is something to report
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.HEADER)
+        self._writer.writerow([line, level, message] + [row.get(column, '') for column in BOOK_COLUMNS])
+
+    @property
+    def has_entries(self) -> bool:
+        return bool(self.errors or self.warnings)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+# =============================================================================
+# IMPORT
+# =============================================================================
+
+class ImportResult:
+    """Counts for one import run."""
+
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.skipped = 0
+        self.warnings = 0
+
+
+def _write_chunk(executor, book_table, chunk: Dict[str, Dict[str, Any]], result: ImportResult,
+                 on_update: Optional[Callable[[List[str]], None]] = None) -> None:
+    isbns = list(chunk)
+    existing = {row[0] for row in executor.execute(
+        select(book_table.c.isbn).where(book_table.c.isbn.in_(isbns))
+    )}
+
+    inserts = [values for isbn, values in chunk.items() if isbn not in existing]
+    # The SET clause is built from the parameter keys; the key column is bound separately
+    updates = [
+        dict({k: v for k, v in values.items() if k != 'isbn'}, b_isbn=isbn)
+        for isbn, values in chunk.items() if isbn in existing
+    ]
+
+    if inserts:
+        executor.execute(book_table.insert(), inserts)
+    if updates and on_update:
+        on_update([values['b_isbn'] for values in updates])
+    if updates:
+        executor.execute(book_table.update().where(book_table.c.isbn == bindparam('b_isbn')), updates)
+    result.added += len(inserts)
+    result.updated += len(updates)
+
+
+def import_books(stream: IO[bytes], executor, book_table, genres: Iterable[str],
+                 report: Optional[ImportReport] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 on_update: Optional[Callable[[List[str]], None]] = None) -> ImportResult:
+    """
+    Insert or update books from a CSV stream.
+
+    Args:
+        stream: Binary file-like object with a header row.
+        executor: SQLAlchemy session or connection; the caller commits.
+        book_table: The `book` Table.
+        genres: Accepted genre names; others are replaced with the default.
+        report: Optional report that receives skipped and corrected rows.
+        chunk_size: Rows per lookup/write round trip.
+        on_update: Called with the ISBNs of existing books in each chunk
+            before their rows (quantity included) are overwritten.
+
+    Returns:
+        An ImportResult with added, updated, skipped and warning counts.
+    """
+    genres = set(genres)
+    report = report or ImportReport()
+    result = ImportResult()
+    chunk: Dict[str, Dict[str, Any]] = {}
+
+    for line, row in read_csv_rows(stream):
+        try:
+            values, warning = parse_row(row, genres)
+        except RowError as e:
+            result.skipped += 1
+            report.add(line, 'error', str(e), row)
+            continue
+        if warning:
+            result.warnings += 1
+            report.add(line, 'warning', warning, row)
+
+        if values['isbn'] in chunk:
+            # Same ISBN twice in one chunk: the later row wins, as an update
+            result.updated += 1
+        chunk[values['isbn']] = values
+        if len(chunk) >= chunk_size:
+            _write_chunk(executor, book_table, chunk, result, on_update)
+            chunk = {}
+
+    if chunk:
+        _write_chunk(executor, book_table, chunk, result, on_update)
+    return result
@@ -0,0 +1,145 @@
+"""
+Live Dashboard Events Module
+
+This module pushes small updates to open admin dashboards instead of having
+every tab reload the whole page on a timer:
+- An in-process publish/subscribe bus that request handlers publish to
+  after they commit (new orders, status changes, low-stock books)
+- One bounded queue per connected dashboard, so a stalled browser can never
+  hold up the request that published
+- A short replay buffer so a reconnecting client resumes from Last-Event-ID
+- Server-Sent Events framing with keepalive comments
+
+The bus lives in process memory: it reaches dashboards served by the same
+process, which is how the app is run today (one threaded Flask server).
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# =============================================================================
+# EVENT BUS
+# =============================================================================
+
+class Subscription:
+    """One connected client's queue of (event id, event name, payload)."""
+
+    def __init__(self, maxsize: int):
+        self.queue: "queue.Queue[Tuple[int, str, Dict[str, Any]]]" = queue.Queue(maxsize)
+        self.overflowed = False
+
+
+class EventBus:
+    """Thread-safe fan-out of events to every current subscriber."""
+
+    def __init__(self, queue_size: int = 100, replay_size: int = 200):
+        self.queue_size = queue_size
+        self._subscribers: List[Subscription] = []
+        self._recent: deque = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, payload: Dict[str, Any]) -> int:
+        """Send an event to every subscriber and return its id. Never blocks."""
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+            item = (event_id, event, payload)
+            self._recent.append(item)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(item)
+            except queue.Full:
+                # The client has fallen behind; it will be told to resync
+                subscription.overflowed = True
+        return event_id
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Tuple[Subscription, bool]:
+        """
+        Register a new subscriber.
+
+        If `last_event_id` is given, events published after it are queued
+        first. Returns (subscription, complete) where `complete` is False when
+        the replay buffer no longer reaches back that far.
+        """
+        subscription = Subscription(self.queue_size)
+        complete = True
+        with self._lock:
+            if last_event_id is not None and last_event_id != self._last_id:
+                missed = [item for item in self._recent if item[0] > last_event_id]
+                # An id from before a restart, or older than the buffer, cannot be replayed
+                complete = (last_event_id < self._last_id
+                            and bool(missed) and missed[0][0] == last_event_id + 1
+                            and len(missed) <= self.queue_size)
+                if complete:
+                    for item in missed:
+                        subscription.queue.put_nowait(item)
+            self._subscribers.append(subscription)
+        return subscription, complete
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    @property
+    def last_id(self) -> int:
+        """Id of the most recent event; pages embed it so their stream resumes there."""
+        with self._lock:
+            return self._last_id
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+# =============================================================================
+# SERVER-SENT EVENTS
+# =============================================================================
+
+def format_sse(event: str, payload: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Frame one event in text/event-stream format."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(payload, separators=(',', ':'), default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream_events(bus: EventBus, last_event_id: Optional[int] = None,
+                  heartbeat_seconds: float = 15.0, max_age_seconds: float = 300.0,
+                  retry_ms: int = 3000) -> Iterator[str]:
+    """
+    Yield SSE frames for one client until it disconnects or max_age expires.
+
+    Closing the stream after max_age makes the browser reconnect, which
+    re-runs the route's login check; Last-Event-ID carries it over the gap.
+    A 'resync' event tells the client it missed events and should refresh.
+    """
+    subscription, complete = bus.subscribe(last_event_id)
+    deadline = time.monotonic() + max_age_seconds
+    try:
+        yield f'retry: {retry_ms}\n\n'
+        if not complete:
+            yield format_sse('resync', {})
+
+        while time.monotonic() < deadline:
+            if subscription.overflowed:
+                yield format_sse('resync', {})
+                return
+            try:
+                event_id, event, payload = subscription.queue.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield format_sse(event, payload, event_id)
+    finally:
+        bus.unsubscribe(subscription)
@@ -0,0 +1,347 @@
+"""
+Outbound Email Queue Module
+
+This module moves email delivery out of the request thread:
+- Request handlers only write messages to a durable outbox table, through
+  the dispatcher's own connection so the caller's session is left alone
+- A small pool of background worker threads claims and sends them
+- Each worker keeps one authenticated SMTP connection open and reuses it
+- Failed sends are retried with exponential backoff, then marked failed
+- Transports are pluggable: SMTP for production, file or in-memory for
+  development and tests so nothing needs network access
+- Bodies (2FA codes, reset links, order contact details) are encrypted at
+  rest when a cipher is given, blanked once a message is sent or given up
+  on, and finished rows are purged after `retention_days`
+
+The outbox model is defined with the other models in app.py and handed to the
+dispatcher through init_app().
+"""
+
+import os
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, or_, update
+
+# =============================================================================
+# TRANSPORTS
+# =============================================================================
+
+class SMTPTransport:
+    """Sends mail over SMTP, keeping one authenticated connection per thread."""
+
+    def __init__(self, host: str, port: int, username: str, password: str,
+                 use_tls: bool = True, idle_check_seconds: int = 60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.idle_check_seconds = idle_check_seconds
+        self._local = threading.local()
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self._local.smtp = smtp
+        self._local.last_used = time.monotonic()
+        return smtp
+
+    def _connection(self):
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is None:
+            return self._connect()
+
+        # Servers drop idle connections; probe before reusing an old one
+        if time.monotonic() - self._local.last_used > self.idle_check_seconds:
+            try:
+                if smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected('NOOP failed')
+            except smtplib.SMTPException:
+                self.close()
+                return self._connect()
+        return smtp
+
+    def send(self, sender: str, recipients: List[str], message: str) -> None:
+        try:
+            self._connection().sendmail(sender, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            # Connection went away between the probe and the send; retry once
+            self.close()
+            self._connect().sendmail(sender, recipients, message)
+        self._local.last_used = time.monotonic()
+
+    def close(self) -> None:
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except smtplib.SMTPException:
+                pass
+
+
+class FileTransport:
+    """Writes each message to a .eml file instead of sending it."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def send(self, sender: str, recipients: List[str], message: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        filename = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.eml"
+        with open(os.path.join(self.directory, filename), 'w', encoding='utf-8') as f:
+            f.write(message)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryTransport:
+    """Keeps sent messages in a list; intended for tests."""
+
+    def __init__(self):
+        self.messages: List[Dict[str, object]] = []
+        self._lock = threading.Lock()
+
+    def send(self, sender: str, recipients: List[str], message: str) -> None:
+        with self._lock:
+            self.messages.append({'sender': sender, 'recipients': list(recipients), 'message': message})
+
+    def close(self) -> None:
+        pass
+
+# =============================================================================
+# DISPATCHER
+# =============================================================================
+
+class MailDispatcher:
+    """Durable outbox plus background worker pool for outgoing email."""
+
+    def __init__(self, transport=None, sender: Optional[str] = None, workers: int = 2,
+                 max_attempts: int = 5, backoff_seconds: int = 30, batch_size: int = 20,
+                 poll_seconds: float = 5.0, stale_claim_seconds: int = 600,
+                 cipher=None, retention_days: float = 30, purge_interval: float = 3600):
+        self.transport = transport
+        self.sender = sender
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.stale_claim_seconds = stale_claim_seconds
+        # Any object with encrypt(str) -> str and decrypt(str) -> Optional[str]
+        self.cipher = cipher
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+
+        self.app = None
+        self.db = None
+        self.model = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app, db, outbox_model) -> None:
+        self.app = app
+        self.db = db
+        self.model = outbox_model
+
+    # -- enqueueing ---------------------------------------------------------
+
+    def enqueue(self, recipients, subject: str, body: str) -> bool:
+        """Store one message per recipient in the outbox and wake a worker.
+
+        The rows are written and committed on the dispatcher's own connection;
+        the caller's session is neither flushed, committed nor rolled back.
+        On SQLite, commit your own writes first or the insert waits for them.
+        Returns False if the outbox write failed.
+        """
+        if isinstance(recipients, str):
+            recipients = [recipients]
+        recipients = [r for r in recipients if r]
+        if not recipients:
+            return False
+
+        try:
+            now = datetime.utcnow()
+            stored_body = self.cipher.encrypt(body) if self.cipher else body
+            rows = [
+                {'recipient': recipient, 'subject': subject, 'body': stored_body, 'status': 'pending',
+                 'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+                for recipient in recipients
+            ]
+            with self.db.engine.begin() as conn:
+                conn.execute(self.model.__table__.insert(), rows)
+        except Exception as e:
+            print(f"Failed to queue email '{subject}': {e}")
+            return False
+
+        if self.workers > 0:
+            self.start()
+            self._wakeup.set()
+        return True
+
+    # -- worker pool --------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the worker threads if they are not already running."""
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'mail-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.process_batch()
+            except Exception as e:
+                print(f"Mail worker error: {e}")
+                processed = 0
+
+            if not processed:
+                # Idle: release the SMTP connection rather than holding it open
+                self.transport.close()
+                try:
+                    with self.app.app_context():
+                        self.purge_if_due()
+                except Exception as e:
+                    print(f"Mail outbox purge error: {e}")
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+    # -- delivery -----------------------------------------------------------
+
+    def _claim_batch(self):
+        """Atomically claim due messages so no two workers send the same one."""
+        Outbox = self.model
+        session = self.db.session
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+
+        due_ids = session.query(Outbox.id).filter(
+            or_(
+                (Outbox.status == 'pending') & (Outbox.next_attempt_at <= now),
+                (Outbox.status == 'sending') & (Outbox.claimed_at < now - timedelta(seconds=self.stale_claim_seconds))
+            )
+        ).order_by(Outbox.id).limit(self.batch_size).subquery()
+
+        claimed = Outbox.query.filter(
+            Outbox.id.in_(session.query(due_ids.c.id)),
+            Outbox.status.in_(['pending', 'sending'])
+        ).update({
+            Outbox.status: 'sending',
+            Outbox.claim_token: token,
+            Outbox.claimed_at: now,
+            Outbox.attempts: Outbox.attempts + 1
+        }, synchronize_session=False)
+        session.commit()
+
+        if not claimed:
+            return []
+        return Outbox.query.filter_by(claim_token=token, status='sending').order_by(Outbox.id).all()
+
+    def process_batch(self) -> int:
+        """Claim and send one batch of due messages. Returns how many were claimed."""
+        messages = self._claim_batch()
+        for outbox in messages:
+            try:
+                msg = MIMEText(self._plain_body(outbox))
+                msg['Subject'] = outbox.subject
+                msg['From'] = self.sender
+                msg['To'] = outbox.recipient
+
+                self.transport.send(self.sender, [outbox.recipient], msg.as_string())
+                outbox.status = 'sent'
+                outbox.sent_at = datetime.utcnow()
+                outbox.last_error = None
+                outbox.body = ''
+                print(f"Email '{outbox.subject}' sent to {outbox.recipient}")
+            except Exception as e:
+                outbox.last_error = str(e)[:500]
+                if outbox.attempts >= self.max_attempts:
+                    outbox.status = 'failed'
+                    outbox.body = ''
+                    print(f"Giving up on email to {outbox.recipient} after {outbox.attempts} attempts: {e}")
+                else:
+                    delay = min(self.backoff_seconds * (2 ** (outbox.attempts - 1)), 3600)
+                    outbox.status = 'pending'
+                    outbox.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    print(f"Email to {outbox.recipient} failed, retrying in {delay}s: {e}")
+            self.db.session.commit()
+
+        return len(messages)
+
+    def _plain_body(self, outbox) -> str:
+        if self.cipher is None:
+            return outbox.body
+        body = self.cipher.decrypt(outbox.body)
+        if body is None:
+            raise ValueError('message body cannot be decrypted')
+        return body
+
+    # -- retention ----------------------------------------------------------
+
+    def purge(self, now: Optional[datetime] = None) -> int:
+        """
+        Blank the bodies of finished messages and delete those older than
+        `retention_days`. Returns the rows deleted.
+        """
+        Outbox = self.model
+        table = Outbox.__table__
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        finished = table.c.status.in_(['sent', 'failed'])
+        with self.db.engine.begin() as conn:
+            # Rows finished before bodies were blanked on completion
+            conn.execute(update(table).where(finished, table.c.body != '').values(body=''))
+            return conn.execute(delete(table).where(finished, table.c.created_at < cutoff)).rowcount
+
+    def purge_if_due(self) -> Optional[int]:
+        """purge() at most once per `purge_interval` seconds; None when not due."""
+        clock = time.monotonic()
+        with self._start_lock:
+            if clock < self._next_purge:
+                return None
+            self._next_purge = clock + self.purge_interval
+        return self.purge()
+
+    def flush(self) -> int:
+        """Send everything that is currently due in the calling thread.
+
+        Useful for scripts and tests; returns the number of messages processed.
+        """
+        total = 0
+        try:
+            while True:
+                processed = self.process_batch()
+                if not processed:
+                    break
+                total += processed
+        finally:
+            self.transport.close()
+        self.purge_if_due()
+        return total
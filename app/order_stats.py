@@ -0,0 +1,82 @@
+"""
+Order Statistics Module
+
+This module serves the aggregate order figures shown on admin pages:
+- Per-status counts from a single `GROUP BY status` query
+- The distinct statuses in use, for filter dropdowns
+- A short-lived in-process cache so dashboard refreshes do not re-aggregate
+- Explicit invalidation, called whenever an order's status changes
+
+New orders are not invalidated explicitly; they show up once the TTL expires.
+The purchases model is defined with the other models in app.py and handed to
+the service through init_app().
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+# Statuses the dashboard always shows, even when no order has them yet
+DASHBOARD_STATUSES = ['Pending', 'Processing', 'Shipped', 'Completed', 'Cancelled']
+
+
+class OrderStatistics:
+    """Cached status aggregates over the purchases table."""
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self.db = None
+        self.model = None
+        self._counts: Optional[Dict[Optional[str], int]] = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, db, purchase_model) -> None:
+        self.db = db
+        self.model = purchase_model
+
+    def invalidate(self) -> None:
+        """Drop cached figures; the next read re-aggregates."""
+        with self._lock:
+            self._counts = None
+            self._expires_at = 0.0
+            self._generation += 1
+
+    def _load_counts(self) -> Dict[Optional[str], int]:
+        Purchase = self.model
+        rows = self.db.session.query(Purchase.status, func.count(Purchase.id)).group_by(Purchase.status).all()
+        return {status: count for status, count in rows}
+
+    def _cached_counts(self) -> Dict[Optional[str], int]:
+        with self._lock:
+            if self._counts is not None and time.monotonic() < self._expires_at:
+                return self._counts
+            generation = self._generation
+
+        counts = self._load_counts()
+        with self._lock:
+            # Don't cache figures read before a concurrent invalidate()
+            if generation == self._generation:
+                self._counts = counts
+                self._expires_at = time.monotonic() + self.ttl_seconds
+        return counts
+
+    def counts(self) -> Dict[str, int]:
+        """Return {status: number of orders} for every status in use."""
+        return {status: count for status, count in self._cached_counts().items() if status}
+
+    def dashboard_counts(self) -> Dict[str, int]:
+        """Counts for the standard dashboard statuses, zero-filled."""
+        counts = self.counts()
+        return {status: counts.get(status, 0) for status in DASHBOARD_STATUSES}
+
+    def statuses(self) -> List[str]:
+        """Distinct statuses currently in use, sorted."""
+        return sorted(self.counts())
+
+    def total(self) -> int:
+        """Number of orders, including any without a status."""
+        return sum(self._cached_counts().values())
@@ -0,0 +1,136 @@
+"""
+Keyset Pagination Module
+
+This module pages through time-ordered tables without OFFSET:
+- Rows are ordered newest first on (timestamp, id)
+- Each page carries an opaque cursor holding the last row's (timestamp, id)
+- The next page is fetched with a WHERE clause on that cursor, so every page
+  costs one indexed range scan bounded by the page size, however deep the
+  caller has scrolled
+- Status and date-range filters shared by the admin order views and exports
+
+Rows with a NULL timestamp sort after all dated rows, which matches SQLite's
+ordering for DESC columns.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# =============================================================================
+# CURSORS
+# =============================================================================
+
+def encode_cursor(timestamp: Optional[datetime], row_id: int) -> str:
+    """Encode the position of a row as an opaque, URL-safe token."""
+    payload = json.dumps([timestamp.isoformat() if timestamp else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> Tuple[Optional[datetime], int]:
+    """
+    Decode a token produced by encode_cursor().
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(row_id, int):
+            raise ValueError('cursor id must be an integer')
+        return (datetime.fromisoformat(timestamp) if timestamp else None), row_id
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+# =============================================================================
+# FILTERS
+# =============================================================================
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Parse a YYYY-MM-DD query argument; empty values mean no filter."""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def apply_order_filters(query, model, status: Optional[str] = None,
+                        start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    Filter a query on `model.status` and an inclusive `model.timestamp` date range.
+
+    Raises:
+        ValueError: If a date is not in YYYY-MM-DD format.
+    """
+    start = parse_date(start_date)
+    end = parse_date(end_date)
+    if start:
+        query = query.filter(model.timestamp >= start)
+    if end:
+        # Include the whole end day
+        query = query.filter(model.timestamp < end + timedelta(days=1))
+    if status:
+        query = query.filter(model.status == status)
+    return query
+
+# =============================================================================
+# PAGING
+# =============================================================================
+
+class KeysetPage:
+    """One page of rows plus the cursor for the page after it."""
+
+    def __init__(self, items: List[Any], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_cursor is not None
+
+
+def clamp_page_size(limit: Any, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Coerce a user-supplied page size into 1..MAX_PAGE_SIZE."""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginate_keyset(query, model, cursor: Optional[str] = None,
+                    limit: int = DEFAULT_PAGE_SIZE) -> KeysetPage:
+    """
+    Return the page of `query` that follows `cursor`, newest first.
+
+    `model` must have `timestamp` and `id` columns. One extra row is fetched
+    to tell whether another page exists.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        if timestamp is None:
+            query = query.filter(model.timestamp.is_(None), model.id < row_id)
+        else:
+            query = query.filter(or_(
+                model.timestamp < timestamp,
+                and_(model.timestamp == timestamp, model.id < row_id),
+                model.timestamp.is_(None)
+            ))
+
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+    return KeysetPage(rows, next_cursor)
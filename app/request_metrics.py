@@ -0,0 +1,320 @@
+"""
+Request Metrics Module
+
+This module records what each request costs, per endpoint:
+- Wall time, SQL statement count and SQL time, the SQL side counted with
+  cursor events on the application's engine
+- Repeated statements: the same SQL run again in one request with other
+  parameters, the signature of an N+1 loop
+- Counts and time of instrumented calls, such as field decryptions and
+  SMTP sends (see instrument())
+- Fixed-bucket histograms per endpoint, from which p50/p95/p99 are
+  estimated the way Prometheus' histogram_quantile() does, and a
+  Prometheus text rendering of the same data
+- An optional one-line JSON record per request
+
+Everything is kept in process memory and starts empty on every restart.
+Instrumented calls made outside a request (mail worker threads) are
+recorded under the 'background' endpoint.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence
+
+from flask import g, request
+from sqlalchemy import event
+
+# Upper bounds of the histogram buckets
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+# Endpoint label for work done outside a request
+BACKGROUND = 'background'
+
+_current: ContextVar[Optional['RequestStats']] = ContextVar('request_stats', default=None)
+
+# =============================================================================
+# HISTOGRAM
+# =============================================================================
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum and maximum."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate the q-quantile by interpolating inside the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+# =============================================================================
+# PER-REQUEST AND PER-ENDPOINT STATS
+# =============================================================================
+
+class RequestStats:
+    """Costs collected while one request runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements: Counter = Counter()
+        self.calls: Dict[str, List[float]] = {}  # name -> [count, seconds]
+
+    @property
+    def repeated(self) -> int:
+        """Statements that re-ran SQL already run in this request."""
+        return self.queries - len(self.statements)
+
+    def add_call(self, name: str, count: int, seconds: float) -> None:
+        totals = self.calls.setdefault(name, [0, 0.0])
+        totals[0] += count
+        totals[1] += seconds
+
+
+class EndpointMetrics:
+    """Aggregated costs of every request served by one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.wall = Histogram(TIME_BUCKETS)
+        self.sql = Histogram(TIME_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.max_repeated = 0
+        self.calls: Dict[str, List[float]] = {}
+
+    def add_calls(self, calls: Dict[str, List[float]]) -> None:
+        for name, (count, seconds) in calls.items():
+            totals = self.calls.setdefault(name, [0, 0.0])
+            totals[0] += count
+            totals[1] += seconds
+
+# =============================================================================
+# COLLECTOR
+# =============================================================================
+
+class RequestMetrics:
+    """Per-endpoint request costs, collected through Flask and SQLAlchemy hooks."""
+
+    def __init__(self, log: Optional[Callable[[str], None]] = None, repeat_threshold: int = 5):
+        self.log = log
+        self.repeat_threshold = repeat_threshold
+        self.started_at = time.time()
+        self._endpoints: Dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db) -> None:
+        """Hook request start/end into `app`; call inside an app context for db.engine."""
+        app.before_request(self._start_request)
+        app.teardown_request(self._end_request)
+
+        @app.after_request
+        def remember_status(response):
+            g.metrics_status = response.status_code
+            return response
+
+        event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = time.time()
+
+    # -- hooks ----------------------------------------------------------------
+
+    def _start_request(self):
+        g.metrics_token = _current.set(RequestStats())
+
+    def _end_request(self, exc):
+        stats = _current.get()
+        token = g.pop('metrics_token', None)
+        if stats is None or token is None:
+            return
+        _current.reset(token)
+        status = 500 if exc is not None else g.pop('metrics_status', 200)
+        self.record(request.endpoint or 'unmatched', request.method, status, stats)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        starts = conn.info.get('metrics_query_start')
+        if stats is None or not starts:
+            return
+        stats.sql_seconds += time.perf_counter() - starts.pop()
+        stats.queries += 1
+        stats.statements[statement] += 1
+
+    # -- recording ------------------------------------------------------------
+
+    def _endpoint(self, name: str) -> EndpointMetrics:
+        metrics = self._endpoints.get(name)
+        if metrics is None:
+            metrics = self._endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def record(self, endpoint: str, method: str, status: int, stats: RequestStats) -> None:
+        """Add one finished request to its endpoint's totals."""
+        wall = time.perf_counter() - stats.started
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.requests += 1
+            metrics.errors += status >= 500
+            metrics.wall.observe(wall)
+            metrics.sql.observe(stats.sql_seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.max_repeated = max(metrics.max_repeated, stats.repeated)
+            metrics.add_calls(stats.calls)
+
+        if self.log:
+            record = {
+                'endpoint': endpoint, 'method': method, 'status': status,
+                'wall_ms': round(wall * 1000, 2), 'queries': stats.queries,
+                'sql_ms': round(stats.sql_seconds * 1000, 2), 'repeated_queries': stats.repeated,
+            }
+            for name, (count, seconds) in stats.calls.items():
+                record[f'{name}_count'] = count
+                record[f'{name}_ms'] = round(seconds * 1000, 2)
+            self.log(json.dumps(record, sort_keys=True))
+
+    def instrument(self, obj, method: str, name: str,
+                   amount: Optional[Callable[..., int]] = None) -> None:
+        """
+        Count calls of `obj.method` and the time they take under `name`.
+
+        `amount` maps the call's arguments to how many operations it does
+        (e.g. the length of a batch); by default, or when `amount` raises,
+        each call counts as one. The wrapped call's result or exception is
+        passed through untouched.
+        """
+        original = getattr(obj, method)
+
+        @wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - started
+                count = 1
+                if amount:
+                    try:
+                        count = amount(*args, **kwargs)
+                    except Exception:
+                        pass
+                stats = _current.get()
+                if stats is not None:
+                    stats.add_call(name, count, seconds)
+                else:
+                    with self._lock:
+                        self._endpoint(BACKGROUND).add_calls({name: [count, seconds]})
+
+        setattr(obj, method, timed)
+
+    # -- reports --------------------------------------------------------------
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        """One summary per endpoint, slowest p95 first."""
+        rows = []
+        with self._lock:
+            for endpoint, metrics in self._endpoints.items():
+                requests = metrics.requests or 1
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': metrics.requests,
+                    'errors': metrics.errors,
+                    'p50_ms': round(metrics.wall.quantile(0.50) * 1000, 1),
+                    'p95_ms': round(metrics.wall.quantile(0.95) * 1000, 1),
+                    'p99_ms': round(metrics.wall.quantile(0.99) * 1000, 1),
+                    'max_ms': round(metrics.wall.max * 1000, 1),
+                    'avg_queries': round(metrics.queries.sum / requests, 1),
+                    'p95_queries': round(metrics.queries.quantile(0.95), 1),
+                    'max_queries': int(metrics.queries.max),
+                    'avg_sql_ms': round(metrics.sql.sum * 1000 / requests, 1),
+                    'max_repeated': metrics.max_repeated,
+                    'suspect_n_plus_one': metrics.max_repeated >= self.repeat_threshold,
+                    'calls': {name: {'count': int(count), 'ms': round(seconds * 1000, 1)}
+                              for name, (count, seconds) in sorted(metrics.calls.items())},
+                })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+    def prometheus(self) -> str:
+        """The collected metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def histogram(metric: str, help_text: str, attr: str):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for endpoint, metrics in sorted(self._endpoints.items()):
+                hist = getattr(metrics, attr)
+                if not hist.count:
+                    continue
+                for bound, total in hist.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{metric}_bucket{{endpoint="{endpoint}",le="{le}"}} {total}')
+                lines.append(f'{metric}_sum{{endpoint="{endpoint}"}} {hist.sum}')
+                lines.append(f'{metric}_count{{endpoint="{endpoint}"}} {hist.count}')
+
+        def counter(metric: str, help_text: str, values):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for labels, value in values:
+                label_text = ','.join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f'{metric}{{{label_text}}} {value}')
+
+        with self._lock:
+            histogram('http_request_duration_seconds', 'Wall time of requests.', 'wall')
+            histogram('http_request_sql_queries', 'SQL statements run per request.', 'queries')
+            histogram('http_request_sql_duration_seconds', 'Time spent in SQL per request.', 'sql')
+            endpoints = sorted(self._endpoints.items())
+            counter('http_request_errors_total', 'Requests that ended in a 5xx response.',
+                    [((('endpoint', name),), metrics.errors) for name, metrics in endpoints if metrics.requests])
+            counter('app_instrumented_calls_total', 'Instrumented operations (decryptions, SMTP sends).',
+                    [((('endpoint', name), ('operation', op)), int(count))
+                     for name, metrics in endpoints for op, (count, _) in sorted(metrics.calls.items())])
+            counter('app_instrumented_seconds_total', 'Time spent in instrumented operations.',
+                    [((('endpoint', name), ('operation', op)), seconds)
+                     for name, metrics in endpoints for op, (_, seconds) in sorted(metrics.calls.items())])
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,161 @@
+"""
+Sales Reporting Module
+
+This module answers sales questions with set-based SQL:
+- Totals: revenue, units and order count for a date range, summed from the
+  daily sales rollup (see sales_rollup.py) rather than raw purchases
+- Breakdowns grouped in SQL by day, ISBN, genre or author, also from the
+  rollup, so a 90-day or year-over-year view costs O(days x titles)
+- Sale lines: purchases with the prices stored at checkout, labelled
+  (id, timestamp, ...) so they can be keyset paginated for the report page
+  or streamed for export
+
+Revenue is what was charged (line total less discount share), so edited or
+deleted catalog entries do not change past sales; the catalog is only joined
+for titles, authors and genres. The purchase, book and rollup models are
+defined in app.py and handed to the service through init_app().
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+
+# Breakdown rows shown per grouping (largest revenue first, days in order)
+BREAKDOWN_LIMIT = 100
+
+GROUPINGS = ['day', 'isbn', 'genre', 'author']
+
+
+class SalesReporting:
+    """Aggregate and detail queries for the sales report and export."""
+
+    def __init__(self):
+        self.db = None
+        self.purchase = None
+        self.book = None
+        self.rollup = None
+
+    def init_app(self, db, purchase_model, book_model, rollup_model) -> None:
+        self.db = db
+        self.purchase = purchase_model
+        self.book = book_model
+        self.rollup = rollup_model
+
+    # -- building blocks ----------------------------------------------------
+
+    def _revenue(self):
+        Purchase = self.purchase
+        return func.coalesce(Purchase.line_total, 0.0) - func.coalesce(Purchase.discount_amount, 0.0)
+
+    def _in_range(self, query, start: Optional[datetime], end: Optional[datetime]):
+        """Limit to purchases from `start` up to the end of day `end`."""
+        Purchase = self.purchase
+        if start:
+            query = query.filter(Purchase.timestamp >= start)
+        if end:
+            query = query.filter(Purchase.timestamp < end + timedelta(days=1))
+        return query
+
+    def _rollup_in_range(self, query, start: Optional[datetime], end: Optional[datetime]):
+        """Limit to rollup days from `start` through `end`."""
+        Rollup = self.rollup
+        if start:
+            query = query.filter(Rollup.day >= _as_date(start))
+        if end:
+            query = query.filter(Rollup.day <= _as_date(end))
+        return query
+
+    def _group_column(self, group_by: str):
+        Rollup, Book = self.rollup, self.book
+        columns = {
+            'day': Rollup.day,
+            'isbn': Rollup.isbn,
+            'genre': func.coalesce(Book.genre, 'Fiction'),
+            'author': func.coalesce(Book.author, 'Unknown'),
+        }
+        if group_by not in columns:
+            raise ValueError(f"Unknown grouping '{group_by}'")
+        return columns[group_by]
+
+    # -- queries ------------------------------------------------------------
+
+    def lines_query(self, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Sale lines with their stored prices, labelled for keyset pagination; unordered."""
+        Purchase, Book = self.purchase, self.book
+        query = self.db.session.query(
+            Purchase.id.label('id'),
+            Purchase.book_isbn.label('isbn'),
+            Book.title.label('title'),
+            Book.author.label('author'),
+            Purchase.quantity.label('quantity'),
+            Purchase.unit_price.label('unit_price'),
+            func.coalesce(Purchase.discount_amount, 0.0).label('discount'),
+            self._revenue().label('total_price'),
+            Purchase.timestamp.label('timestamp'),
+        ).outerjoin(Book, Book.isbn == Purchase.book_isbn).filter(Purchase.book_isbn.isnot(None))
+        return self._in_range(query, start, end)
+
+    def daily_query(self, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Per-day, per-title totals (all status buckets), newest day first."""
+        Rollup, Book = self.rollup, self.book
+        query = self.db.session.query(
+            Rollup.day.label('day'),
+            Rollup.isbn.label('isbn'),
+            func.max(Book.title).label('title'),
+            func.max(Book.author).label('author'),
+            func.sum(Rollup.units).label('units'),
+            func.sum(Rollup.revenue).label('revenue'),
+            func.sum(Rollup.orders).label('orders'),
+        ).outerjoin(Book, Book.isbn == Rollup.isbn)
+        query = self._rollup_in_range(query, start, end)
+        return query.group_by(Rollup.day, Rollup.isbn).order_by(Rollup.day.desc(), Rollup.isbn)
+
+    def totals(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """Revenue, units sold and number of orders in the range."""
+        Rollup = self.rollup
+        query = self.db.session.query(
+            func.coalesce(func.sum(Rollup.revenue), 0.0),
+            func.coalesce(func.sum(Rollup.units), 0),
+            func.coalesce(func.sum(Rollup.orders), 0),
+        )
+        revenue, units, orders = self._rollup_in_range(query, start, end).one()
+        return {'revenue': revenue, 'units': units, 'orders': orders}
+
+    def breakdown(self, group_by: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, limit: int = BREAKDOWN_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Revenue, units and orders per day, ISBN, genre or author.
+
+        Raises:
+            ValueError: If `group_by` is not one of GROUPINGS.
+        """
+        Rollup, Book = self.rollup, self.book
+        key = self._group_column(group_by).label('key')
+        revenue = func.sum(Rollup.revenue).label('revenue')
+        query = self.db.session.query(
+            key,
+            revenue,
+            func.sum(Rollup.units).label('units'),
+            func.sum(Rollup.orders).label('orders'),
+        )
+        if group_by in ('genre', 'author'):
+            query = query.outerjoin(Book, Book.isbn == Rollup.isbn)
+        query = self._rollup_in_range(query, start, end).group_by(key)
+        query = query.order_by(key) if group_by == 'day' else query.order_by(revenue.desc(), key)
+        return [
+            {'key': row.key, 'revenue': row.revenue, 'units': row.units, 'orders': row.orders}
+            for row in query.limit(limit)
+        ]
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def year_earlier(value: datetime) -> datetime:
+    """The same calendar day one year before (29 February maps to the 28th)."""
+    try:
+        return value.replace(year=value.year - 1)
+    except ValueError:
+        return value.replace(year=value.year - 1, day=28)
@@ -0,0 +1,174 @@
+"""
+Daily Sales Rollup Module
+
+This module maintains `daily_sales_rollup`, one row per day x ISBN x status
+bucket holding units, revenue and order count:
+- Checkout adds each sale to its row in the same transaction as the purchase
+- Status changes move a purchase between buckets in the same transaction
+- rebuild() recomputes a date range (or everything) from purchases, for
+  backfills and repairs
+
+Reports then aggregate O(days x titles) rollup rows instead of every
+purchase. Revenue is what each purchase was charged (its stored line total
+less its discount share), so neither updates nor rebuilds read the catalog.
+Writes use SQLite's INSERT ... ON CONFLICT upsert. The rollup and purchase
+models are defined in app.py and handed to the service through init_app().
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+# Order statuses grouped into the buckets reports care about
+STATUS_BUCKETS = {
+    'Pending': 'open',
+    'Confirmed': 'open',
+    'Processing': 'open',
+    'Shipped': 'fulfilled',
+    'Delivered': 'fulfilled',
+    'Completed': 'fulfilled',
+    'Cancelled': 'cancelled',
+}
+DEFAULT_BUCKET = 'open'
+
+
+def status_bucket(status: Optional[str]) -> str:
+    return STATUS_BUCKETS.get(status, DEFAULT_BUCKET)
+
+
+class SalesRollup:
+    """Incremental maintenance and rebuild of the daily sales rollup."""
+
+    def __init__(self):
+        self.db = None
+        self.rollup = None
+        self.purchase = None
+
+    def init_app(self, db, rollup_model, purchase_model) -> None:
+        self.db = db
+        self.rollup = rollup_model
+        self.purchase = purchase_model
+
+    # -- incremental updates ------------------------------------------------
+
+    def _add(self, day: date, isbn: str, bucket: str, units: int, revenue: float, orders: int) -> None:
+        table = self.rollup.__table__
+        stmt = sqlite_insert(table).values(
+            day=day, isbn=isbn, status_bucket=bucket, units=units, revenue=revenue, orders=orders
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'isbn', 'status_bucket'],
+            set_={
+                'units': table.c.units + stmt.excluded.units,
+                'revenue': table.c.revenue + stmt.excluded.revenue,
+                'orders': table.c.orders + stmt.excluded.orders,
+            }
+        )
+        self.db.session.execute(stmt)
+
+    def record_sale(self, purchase) -> None:
+        """Add a new purchase line to its day's rollup. Call before commit."""
+        if not purchase.book_isbn:
+            return
+        day = (purchase.timestamp or datetime.utcnow()).date()
+        self._add(day, purchase.book_isbn, status_bucket(purchase.status),
+                  purchase.quantity or 0, _charged(purchase), 1)
+
+    def record_status_change(self, purchase, old_status: Optional[str]) -> None:
+        """
+        Move a purchase from its old status bucket to its current one.
+
+        The revenue moved is what the purchase was charged; for purchases
+        without stored prices it is the old bucket's average for that day and
+        title. Purchases with no rollup row yet (not backfilled) are left to
+        rebuild().
+        """
+        old_bucket = status_bucket(old_status)
+        new_bucket = status_bucket(purchase.status)
+        if old_bucket == new_bucket or not purchase.book_isbn or purchase.timestamp is None:
+            return
+
+        table = self.rollup.__table__
+        day = purchase.timestamp.date()
+        row = self.db.session.execute(
+            select(table.c.units, table.c.revenue).where(
+                table.c.day == day,
+                table.c.isbn == purchase.book_isbn,
+                table.c.status_bucket == old_bucket
+            )
+        ).first()
+        if row is None or not row.units:
+            return
+
+        quantity = purchase.quantity or 0
+        if purchase.line_total is not None:
+            revenue = _charged(purchase)
+        else:
+            revenue = row.revenue / row.units * quantity
+        self._add(day, purchase.book_isbn, old_bucket, -quantity, -revenue, -1)
+        self._add(day, purchase.book_isbn, new_bucket, quantity, revenue, 1)
+        # Drop the old row once its last purchase has moved out
+        self.db.session.execute(table.delete().where(
+            table.c.day == day,
+            table.c.isbn == purchase.book_isbn,
+            table.c.status_bucket == old_bucket,
+            table.c.orders <= 0
+        ))
+
+    # -- backfill -----------------------------------------------------------
+
+    def rebuild(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """
+        Recompute rollup rows for days `start`..`end` (inclusive) from purchases.
+
+        Either bound may be omitted; with neither, the whole table is rebuilt.
+        Purchases without stored prices count as zero revenue, so backfill
+        prices first. Runs in the caller's transaction; returns the number of
+        rollup rows written.
+        """
+        Purchase = self.purchase
+        table = self.rollup.__table__
+        # Core statements do not autoflush; pending purchases must be visible
+        self.db.session.flush()
+
+        delete = table.delete()
+        if start:
+            delete = delete.where(table.c.day >= start)
+        if end:
+            delete = delete.where(table.c.day <= end)
+        self.db.session.execute(delete)
+
+        bucket = case(
+            *[(Purchase.status == status, name) for status, name in STATUS_BUCKETS.items()],
+            else_=DEFAULT_BUCKET
+        )
+        day = func.date(Purchase.timestamp)
+        conditions = [Purchase.timestamp.isnot(None), Purchase.book_isbn.isnot(None)]
+        if start:
+            conditions.append(Purchase.timestamp >= datetime.combine(start, datetime.min.time()))
+        if end:
+            conditions.append(Purchase.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+        source = (
+            select(
+                day,
+                Purchase.book_isbn,
+                bucket,
+                func.sum(Purchase.quantity),
+                func.sum(func.coalesce(Purchase.line_total, 0.0) - func.coalesce(Purchase.discount_amount, 0.0)),
+                func.count(Purchase.id),
+            )
+            .where(and_(*conditions))
+            .group_by(day, Purchase.book_isbn, bucket)
+        )
+        result = self.db.session.execute(
+            table.insert().from_select(['day', 'isbn', 'status_bucket', 'units', 'revenue', 'orders'], source)
+        )
+        return result.rowcount
+
+
+def _charged(purchase) -> float:
+    """Line total less discount share; zero when no price was stored."""
+    return (purchase.line_total or 0.0) - (purchase.discount_amount or 0.0)
@@ -0,0 +1,240 @@
+"""
+Schema Migration Module
+
+This module replaces the one-off ALTER TABLE scripts with a versioned,
+repeatable runner:
+- A `schema_version` table recording which numbered migrations have run
+- Idempotent steps (add a column if missing, create an index if missing),
+  so a run that stops half way can simply be started again
+- Each step commits on its own, keeping SQLite's write lock short; with WAL
+  enabled (see sqlite_tuning.py) readers carry on while an index builds
+- A query plan check that warns when a hot query falls back to a full
+  table scan
+
+Missing tables are created by db.create_all() before the runner starts, so
+steps only alter tables that already exist. Data backfills that need the
+application (decrypting emails, pricing old purchases) stay in their
+scripts under scripts/.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+VERSION_TABLE = 'schema_version'
+
+# =============================================================================
+# STEPS
+# =============================================================================
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}
+    ).first() is not None
+
+
+class AddColumn:
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists."""
+
+    def __init__(self, table: str, column: str, ddl: str):
+        self.table = table
+        self.column = column
+        self.ddl = ddl
+
+    def __str__(self) -> str:
+        return f"add column {self.table}.{self.column}"
+
+    def apply(self, conn) -> bool:
+        if not _table_exists(conn, self.table):
+            return False
+        columns = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{self.table}")'))}
+        if self.column in columns:
+            return False
+        conn.execute(text(f'ALTER TABLE "{self.table}" ADD COLUMN {self.column} {self.ddl}'))
+        return True
+
+
+class CreateIndex:
+    """
+    CREATE INDEX IF NOT EXISTS.
+
+    No ANALYZE afterwards: on small tables the statistics can talk the planner
+    out of an index that pays off once the table grows.
+    """
+
+    def __init__(self, name: str, table: str, columns: Sequence[str]):
+        self.name = name
+        self.table = table
+        self.columns = list(columns)
+
+    def __str__(self) -> str:
+        return f"create index {self.name} on {self.table} ({', '.join(self.columns)})"
+
+    def apply(self, conn) -> bool:
+        if not _table_exists(conn, self.table):
+            return False
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {'name': self.name}
+        ).first()
+        if exists:
+            return False
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {self.name} ON "{self.table}" ({", ".join(self.columns)})'))
+        return True
+
+
+class Migration:
+    """One numbered schema version: a name and its ordered steps."""
+
+    def __init__(self, version: int, name: str, steps: Sequence):
+        self.version = version
+        self.name = name
+        self.steps = list(steps)
+
+# =============================================================================
+# MIGRATIONS
+# =============================================================================
+
+# Never renumber or edit a released migration; append a new one instead
+MIGRATIONS = [
+    Migration(1, 'catalog and account columns', [
+        AddColumn('book', 'genre', 'VARCHAR(100)'),
+        AddColumn('customer', 'city', 'VARCHAR(100)'),
+        AddColumn('customer', 'state', 'VARCHAR(50)'),
+        AddColumn('customer', 'zip_code', 'VARCHAR(20)'),
+        AddColumn('user', 'reset_token', 'VARCHAR(100)'),
+        AddColumn('user', 'reset_token_expires', 'DATETIME'),
+        AddColumn('customer', 'reset_token', 'VARCHAR(100)'),
+        AddColumn('customer', 'reset_token_expires', 'DATETIME'),
+    ]),
+    Migration(2, 'email blind index columns', [
+        # Backfilled by scripts/migrate_email_blind_index.py
+        AddColumn('customer', 'email_hash', 'VARCHAR(64)'),
+        CreateIndex('ix_customer_email_hash', 'customer', ['email_hash']),
+        AddColumn('purchases', 'customer_email_hash', 'VARCHAR(64)'),
+        CreateIndex('ix_purchases_customer_email_hash', 'purchases', ['customer_email_hash']),
+    ]),
+    Migration(3, 'purchase status index', [
+        CreateIndex('ix_purchases_status_timestamp', 'purchases', ['status', 'timestamp']),
+    ]),
+    Migration(4, 'purchase prices', [
+        # Backfilled by scripts/migrate_purchase_prices.py
+        AddColumn('purchases', 'unit_price', 'FLOAT'),
+        AddColumn('purchases', 'line_total', 'FLOAT'),
+        AddColumn('purchases', 'discount_amount', 'FLOAT DEFAULT 0.0'),
+        CreateIndex('ix_purchases_timestamp', 'purchases', ['timestamp']),
+    ]),
+    Migration(5, 'order headers', [
+        AddColumn('purchases', 'order_id', 'INTEGER REFERENCES orders (id)'),
+        CreateIndex('ix_purchases_order_id', 'purchases', ['order_id']),
+    ]),
+    Migration(6, 'hot column indexes', [
+        # purchases.status is served by the leading column of ix_purchases_status_timestamp
+        CreateIndex('ix_purchases_book_isbn', 'purchases', ['book_isbn']),
+        CreateIndex('ix_book_genre', 'book', ['genre']),
+        CreateIndex('ix_book_quantity', 'book', ['quantity']),
+        CreateIndex('ix_user_email', 'user', ['email']),
+        CreateIndex('ix_user_reset_token', 'user', ['reset_token']),
+        CreateIndex('ix_customer_reset_token', 'customer', ['reset_token']),
+    ]),
+]
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+def _ensure_version_table(conn) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+
+
+def applied_versions(engine) -> List[int]:
+    """Versions recorded in schema_version, oldest first."""
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return [row[0] for row in conn.execute(text(f"SELECT version FROM {VERSION_TABLE} ORDER BY version"))]
+
+
+def migrate(engine, migrations: Sequence[Migration] = MIGRATIONS,
+            log: Optional[Callable[[str], None]] = None) -> List[int]:
+    """
+    Apply every migration not yet recorded in schema_version, in version order.
+
+    Each step runs and commits in its own transaction and the version is
+    recorded once all its steps are done, so an interrupted run repeats
+    only idempotent work. Returns the versions applied.
+    """
+    done = set(applied_versions(engine))
+    applied = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        for step in migration.steps:
+            with engine.begin() as conn:
+                changed = step.apply(conn)
+            if changed and log:
+                log(f"  {migration.version}: {step}")
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, name, applied_at) VALUES (:version, :name, :now)"),
+                {'version': migration.version, 'name': migration.name, 'now': datetime.utcnow()}
+            )
+        if log:
+            log(f"Schema version {migration.version} ({migration.name}) applied.")
+        applied.append(migration.version)
+    return applied
+
+# =============================================================================
+# QUERY PLAN CHECK
+# =============================================================================
+
+# Lookups the routes run on every request or page view: (SQL, sample parameters)
+HOT_QUERIES: Dict[str, Tuple[str, dict]] = {
+    'orders by status': (
+        "SELECT id FROM purchases WHERE status = :status ORDER BY timestamp DESC LIMIT 50", {'status': 'Pending'}),
+    'sales in date range': (
+        "SELECT id FROM purchases WHERE timestamp >= :start AND timestamp < :end",
+        {'start': '2024-01-01', 'end': '2024-02-01'}),
+    'purchases of a book': (
+        "SELECT id FROM purchases WHERE book_isbn = :isbn", {'isbn': '0'}),
+    'order history by email': (
+        "SELECT id FROM purchases WHERE customer_email_hash = :hash", {'hash': ''}),
+    'order lines': (
+        "SELECT id FROM purchases WHERE order_id = :order_id", {'order_id': 0}),
+    'books by genre': (
+        "SELECT isbn FROM book WHERE genre = :genre", {'genre': 'Fiction'}),
+    'low stock books': (
+        "SELECT isbn FROM book WHERE quantity <= :threshold ORDER BY quantity", {'threshold': 5}),
+    'manager by email': (
+        'SELECT id FROM "user" WHERE email = :email', {'email': ''}),
+    'manager reset token': (
+        'SELECT id FROM "user" WHERE reset_token = :token', {'token': ''}),
+    'customer login': (
+        "SELECT id FROM customer WHERE email_hash = :hash", {'hash': ''}),
+    'customer reset token': (
+        "SELECT id FROM customer WHERE reset_token = :token", {'token': ''}),
+}
+
+
+def _is_full_scan(detail: str) -> bool:
+    # "SCAN book" reads every row; "SCAN book USING INDEX ..." and SEARCH do not
+    return detail.startswith('SCAN ') and 'USING' not in detail
+
+
+def full_scan_warnings(engine, queries: Dict[str, Tuple[str, dict]] = HOT_QUERIES) -> List[str]:
+    """EXPLAIN QUERY PLAN each hot query; one message per query that scans a whole table."""
+    warnings = []
+    with engine.connect() as conn:
+        for name, (sql, params) in queries.items():
+            try:
+                plan = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+            except OperationalError as e:
+                warnings.append(f"{name}: cannot plan query ({e.orig})")
+                continue
+            scans = [row[-1] for row in plan if _is_full_scan(row[-1])]
+            if scans:
+                warnings.append(f"{name}: full table scan ({'; '.join(scans)})")
+    return warnings
@@ -0,0 +1,165 @@
+"""
+Full-Text Catalog Search Module
+
+This module maintains an SQLite FTS5 index over the book catalog and provides:
+- Creation of the `book_fts` virtual table and the triggers that keep it in
+  sync with inserts and deletes on the `book` table and updates of its
+  indexed columns
+- Ranked matching using BM25 with per-column weights
+- Prefix matching so partial words ("harr pot") still find titles
+- Search across title, author, description and ISBN
+- isbn_fragment(), which spots ISBN-like input; FTS5 only matches token
+  prefixes, so callers add a substring match on the isbn column for it
+
+The index is an external-content FTS5 table keyed on the `book` rowid, so the
+text itself is not duplicated. `book` has a text primary key, so its rowid is
+implicit and VACUUM may renumber it, after which searches return the wrong
+books: run scripts/rebuild_search_index.py (which calls
+rebuild_search_index()) after every VACUUM. scripts/migrate_schema.py
+rebuilds it on every deploy as well.
+"""
+
+import re
+import weakref
+from typing import Optional
+
+from sqlalchemy import Float, Integer, text
+from sqlalchemy.exc import OperationalError
+
+# =============================================================================
+# INDEX CONFIGURATION
+# =============================================================================
+
+FTS_TABLE = 'book_fts'
+
+# Input made only of ISBN characters, with at least this many digits, also matches ISBNs by substring
+ISBN_MIN_DIGITS = 3
+_ISBN_INPUT = re.compile(r'[\d\- ]+[xX]?')
+
+# BM25 column weights in declaration order: isbn, title, author, description
+BM25_WEIGHTS = (8.0, 10.0, 5.0, 1.0)
+
+_CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        isbn, title, author, description,
+        content='book', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_ai AFTER INSERT ON book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, isbn, title, author, description)
+        VALUES (new.rowid, new.isbn, new.title, new.author, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_ad AFTER DELETE ON book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, isbn, title, author, description)
+        VALUES ('delete', old.rowid, old.isbn, old.title, old.author, old.description);
+    END""",
+    # Only changes to indexed columns touch the index; stock and price updates skip it
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_au AFTER UPDATE OF isbn, title, author, description ON book BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, isbn, title, author, description)
+        VALUES ('delete', old.rowid, old.isbn, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, isbn, title, author, description)
+        VALUES (new.rowid, new.isbn, new.title, new.author, new.description);
+    END""",
+]
+
+# Engines whose index has already been checked in this process
+_ready_engines = weakref.WeakKeyDictionary()
+
+# =============================================================================
+# INDEX MAINTENANCE
+# =============================================================================
+
+def ensure_search_index(engine) -> bool:
+    """
+    Create the FTS5 table and sync triggers if they do not exist yet.
+
+    A freshly created index is populated from the existing catalog. Returns
+    False when the SQLite build has no FTS5 support, in which case callers
+    should fall back to LIKE filtering.
+    """
+    if engine in _ready_engines:
+        return _ready_engines[engine]
+
+    try:
+        with engine.begin() as conn:
+            tables = {row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('book', :name)"),
+                {'name': FTS_TABLE}
+            )}
+            if 'book' not in tables:
+                # Catalog not created yet; try again on the next call
+                return False
+            existed = FTS_TABLE in tables
+            update_trigger = conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'book_fts_au'")
+            ).scalar()
+            if update_trigger and 'UPDATE OF' not in update_trigger:
+                # Created before the trigger was limited to the indexed columns
+                conn.execute(text("DROP TRIGGER book_fts_au"))
+            for statement in _CREATE_STATEMENTS:
+                conn.execute(text(statement))
+            if not existed:
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        _ready_engines[engine] = True
+    except OperationalError as e:
+        print(f"Full-text search unavailable, falling back to LIKE search: {e}")
+        _ready_engines[engine] = False
+
+    return _ready_engines[engine]
+
+
+def rebuild_search_index(engine) -> None:
+    """Rebuild the whole index from the `book` table (e.g. after VACUUM)."""
+    if not ensure_search_index(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+# =============================================================================
+# QUERYING
+# =============================================================================
+
+def build_match_expression(search: str) -> Optional[str]:
+    """
+    Turn free-form user input into a safe FTS5 MATCH expression.
+
+    Every word is quoted (so FTS5 operators typed by users are treated as
+    text) and made a prefix term. All words must match.
+    """
+    terms = re.findall(r'\w+', search or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def isbn_fragment(search: str) -> Optional[str]:
+    """
+    The digits (and a final X) of `search` if it looks like all or part of
+    an ISBN, e.g. "0451524" or "978-0-451"; otherwise None.
+    """
+    search = (search or '').strip()
+    if not _ISBN_INPUT.fullmatch(search):
+        return None
+    fragment = re.sub(r'[\- ]', '', search).upper()
+    if sum(char.isdigit() for char in fragment) < ISBN_MIN_DIGITS:
+        return None
+    return fragment
+
+
+def search_subquery(search: str):
+    """
+    Return a subquery of (book_rowid, rank) for books matching `search`.
+
+    Join it to Book on `book.rowid` and order by `rank` (lower is better).
+    Returns None when the input contains nothing searchable.
+    """
+    expression = build_match_expression(search)
+    if expression is None:
+        return None
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    return text(
+        f"SELECT rowid AS book_rowid, bm25({FTS_TABLE}, {weights}) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+    ).bindparams(match=expression).columns(book_rowid=Integer, rank=Float).subquery('book_search')
@@ -0,0 +1,237 @@
+"""
+Server-Side Session Module
+
+This module keeps Flask session data in the database instead of the signed
+cookie:
+- The cookie carries only an opaque, random session ID
+- Session contents are stored in a `server_sessions` row, serialized with
+  the same tagged JSON Flask uses for cookie sessions, so carts, flash
+  messages, tuples and datetimes round-trip unchanged
+- A per-process LRU cache in front of the table serves repeat requests
+  without a database read
+- Rows are only written when the session changed (or its expiry needs
+  extending), and expired rows are swept in small batches as requests come in
+- regenerate() moves a session to a fresh ID on login and logout, so an ID
+  captured earlier cannot be reused
+
+The storage backend is pluggable: ServerSessionInterface talks to any object
+with load/save/delete/sweep methods; SqlSessionStore is the one app.py uses.
+The LRU cache assumes one process serves a given session; run several
+worker processes with SESSION_CACHE_SIZE=0.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from werkzeug.datastructures import CallbackDict
+
+# Expired sessions deleted per sweep
+SWEEP_BATCH_SIZE = 500
+
+_serializer = TaggedJSONSerializer()
+
+# =============================================================================
+# SESSION OBJECT
+# =============================================================================
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that knows its ID and whether it was changed."""
+
+    def __init__(self, initial=None, sid: Optional[str] = None, new: bool = False,
+                 expires_at: Optional[datetime] = None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+        self.accessed = False
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+class SqlSessionStore:
+    """Session rows in a SQL table (id, data, expires_at) via the engine."""
+
+    def __init__(self):
+        self.db = None
+        self.table = None
+
+    def init_app(self, db, session_model) -> None:
+        self.db = db
+        self.table = session_model.__table__
+
+    def load(self, sid: str, now: datetime) -> Optional[Tuple[str, datetime]]:
+        """The stored (data, expires_at) for `sid`, or None if missing or expired."""
+        with self.db.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.data, self.table.c.expires_at).where(self.table.c.id == sid)
+            ).first()
+        if row is None or row.expires_at <= now:
+            return None
+        return row.data, row.expires_at
+
+    def save(self, sid: str, data: str, expires_at: datetime) -> None:
+        stmt = insert(self.table).values(id=sid, data=data, expires_at=expires_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.id],
+            set_={'data': stmt.excluded.data, 'expires_at': stmt.excluded.expires_at},
+        )
+        with self.db.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def delete(self, sid: str) -> None:
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == sid))
+
+    def sweep(self, now: datetime, limit: int = SWEEP_BATCH_SIZE) -> int:
+        """Delete up to `limit` expired sessions; returns how many were removed."""
+        expired = select(self.table.c.id).where(self.table.c.expires_at <= now).limit(limit)
+        with self.db.engine.begin() as conn:
+            return conn.execute(delete(self.table).where(self.table.c.id.in_(expired))).rowcount
+
+# =============================================================================
+# FLASK SESSION INTERFACE
+# =============================================================================
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface storing session data in `store`, behind an LRU cache."""
+
+    session_class = ServerSession
+
+    def __init__(self, store, cache_size: int = 1024, sweep_interval: float = 300):
+        self.store = store
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        self._cache: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    # -- cache ----------------------------------------------------------------
+
+    def _cache_get(self, sid: str) -> Optional[Tuple[str, datetime]]:
+        with self._lock:
+            entry = self._cache.get(sid)
+            if entry is not None:
+                self._cache.move_to_end(sid)
+            return entry
+
+    def _cache_put(self, sid: str, entry: Optional[Tuple[str, datetime]]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            if entry is None:
+                self._cache.pop(sid, None)
+                return
+            self._cache[sid] = entry
+            self._cache.move_to_end(sid)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # -- lifetime -------------------------------------------------------------
+
+    def _expires_at(self, app, session, now: datetime) -> datetime:
+        # Non-permanent sessions end with the browser, but the row still needs a lifetime
+        return now + app.permanent_session_lifetime
+
+    def _needs_refresh(self, app, session, now: datetime) -> bool:
+        """Extend an unchanged session's row once half its lifetime has passed."""
+        if session.expires_at is None or not self.should_set_cookie(app, session):
+            return False
+        return session.expires_at - now < app.permanent_session_lifetime / 2
+
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """Remove expired sessions from the store and the cache."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            for sid in [sid for sid, (_, expires_at) in self._cache.items() if expires_at <= now]:
+                del self._cache[sid]
+        return self.store.sweep(now)
+
+    def _maybe_sweep(self, now: datetime) -> None:
+        clock = time.monotonic()
+        with self._lock:
+            if clock < self._next_sweep:
+                return
+            self._next_sweep = clock + self.sweep_interval
+        self.sweep(now)
+
+    def regenerate(self, session) -> None:
+        """
+        Move `session` to a new random ID and delete the row under the old one.
+
+        Call it whenever the session gains or loses privileges (login, 2FA,
+        logout), so an ID seen before the change is worthless after it.
+        """
+        if not session.new:
+            self.store.delete(session.sid)
+            self._cache_put(session.sid, None)
+        session.sid = secrets.token_urlsafe(32)
+        # Saved under the new ID, or its cookie deleted if the session is now empty
+        session.new = False
+        session.modified = True
+
+    # -- SessionInterface -----------------------------------------------------
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        now = datetime.utcnow()
+        if sid:
+            entry = self._cache_get(sid)
+            if entry is not None and entry[1] <= now:
+                entry = None
+            if entry is None:
+                entry = self.store.load(sid, now)
+                self._cache_put(sid, entry)
+            if entry is not None:
+                data, expires_at = entry
+                return self.session_class(_serializer.loads(data), sid=sid, expires_at=expires_at)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        now = datetime.utcnow()
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                self._cache_put(session.sid, None)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        if not (session.modified or session.new or self._needs_refresh(app, session, now)):
+            return
+
+        expires_at = self._expires_at(app, session, now)
+        data = _serializer.dumps(dict(session))
+        self.store.save(session.sid, data, expires_at)
+        self._cache_put(session.sid, (data, expires_at))
+        self._maybe_sweep(now)
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly, domain=domain, path=path,
+            secure=secure, samesite=samesite,
+        )
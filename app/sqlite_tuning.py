@@ -0,0 +1,135 @@
+"""
+SQLite Connection Tuning Module
+
+This module applies a pragma profile to every new SQLite connection and
+reports what the database actually ended up using:
+- WAL journaling, so readers keep reading while a checkout commits and a
+  commit appends to the log instead of rewriting pages
+- busy_timeout, so a writer waits for the lock instead of failing at once
+  with "database is locked"
+- synchronous=NORMAL, which in WAL mode only fsyncs at checkpoints
+- A larger page cache, memory-mapped reads and in-memory temp tables
+- Engine pool settings sized for threaded servers
+
+Every value can be overridden with a SQLITE_<PRAGMA> environment variable
+(e.g. SQLITE_SYNCHRONOUS=FULL). journal_mode=WAL is stored in the database
+file; the other pragmas only last for the connection, which is why they are
+set from the engine's "connect" event rather than once at startup.
+"""
+
+import os
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event, text
+
+# =============================================================================
+# PROFILE
+# =============================================================================
+
+# Applied in this order; journal_mode goes first since it needs no open transaction
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,       # milliseconds
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,       # negative = KiB, i.e. 64 MiB per connection
+    'mmap_size': 268435456,     # 256 MiB
+    'temp_store': 'MEMORY',
+}
+
+# Connections kept open per process, plus the extra ones allowed under load
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_OVERFLOW = 10
+
+# How SQLite reports enumerated pragmas when read back
+_ENUM_READBACK = {
+    'synchronous': {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'},
+    'temp_store': {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'},
+}
+
+
+def pragma_profile(environ=None) -> Dict[str, object]:
+    """The default pragmas with any SQLITE_<PRAGMA> environment overrides applied."""
+    environ = os.environ if environ is None else environ
+    profile = {}
+    for name, default in DEFAULT_PRAGMAS.items():
+        value = environ.get(f'SQLITE_{name.upper()}')
+        if value is None:
+            profile[name] = default
+        elif isinstance(default, int):
+            profile[name] = int(value)
+        else:
+            profile[name] = value.upper()
+    return profile
+
+
+def engine_options(profile: Dict[str, object], environ=None) -> Dict[str, object]:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a file database used by a threaded server.
+
+    The driver's own lock timeout matches busy_timeout, so the wait also
+    applies before the connect event has run. Connections move between
+    request threads through the pool, never concurrently.
+    """
+    environ = os.environ if environ is None else environ
+    return {
+        'pool_size': int(environ.get('SQLITE_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        'max_overflow': int(environ.get('SQLITE_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+        'pool_timeout': 30,
+        'connect_args': {
+            'timeout': profile['busy_timeout'] / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+# =============================================================================
+# CONNECTION HOOK
+# =============================================================================
+
+def install_pragmas(engine, profile: Dict[str, object]) -> None:
+    """Run the profile's PRAGMA statements on every connection `engine` opens."""
+
+    @event.listens_for(engine, 'connect')
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in profile.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+
+# =============================================================================
+# STARTUP CHECK
+# =============================================================================
+
+def effective_settings(engine, names=None) -> Dict[str, object]:
+    """Read the pragmas back from a pooled connection, enums as names."""
+    settings = {}
+    with engine.connect() as conn:
+        for name in names or DEFAULT_PRAGMAS:
+            value = conn.execute(text(f'PRAGMA {name}')).scalar()
+            value = _ENUM_READBACK.get(name, {}).get(value, value)
+            settings[name] = value.upper() if isinstance(value, str) else value
+    return settings
+
+
+def check_settings(engine, profile: Dict[str, object]) -> Tuple[Dict[str, object], List[str]]:
+    """
+    Compare the effective settings with `profile`.
+
+    Returns the effective settings and a message for each pragma that did not
+    take (for example journal_mode stays MEMORY on an in-memory database, and
+    mmap_size is capped by how SQLite was compiled).
+    """
+    settings = effective_settings(engine, profile)
+    problems = []
+    for name, wanted in profile.items():
+        actual = settings[name]
+        if isinstance(wanted, str) and isinstance(actual, str):
+            matches = actual == wanted.upper()
+        else:
+            matches = str(actual) == str(wanted)
+        if not matches:
+            problems.append(f"PRAGMA {name} is {actual}, expected {wanted}")
+    return settings, problems
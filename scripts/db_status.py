@@ -7,7 +7,8 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from app.app import app, db, Book, User, Purchase
+from app.app import app, db, Book, User, Purchase, SQLITE_PRAGMAS
+from app.sqlite_tuning import check_settings
 
 def main():
     with app.app_context():
@@ -47,6 +48,14 @@ def main():
             print(f"   - Processing: {processing}")
             print(f"   - Completed: {completed}")
         
+        # Connection settings
+        settings, problems = check_settings(db.engine, SQLITE_PRAGMAS)
+        print("SQLite settings:")
+        for name, value in settings.items():
+            print(f"   - {name}: {value}")
+        for problem in problems:
+            print(f"   WARNING: {problem}")
+        
         print("=" * 50)
         
         if book_count == 0 or user_count == 0:
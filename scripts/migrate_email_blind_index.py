@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add blind-index columns for encrypted emails.
+
+This script adds customer.email_hash and purchases.customer_email_hash, creates
+an index on each, and backfills them by decrypting the stored email once per
+row. After it runs, login and order-history lookups by email become single
+indexed probes instead of decrypt-and-compare scans.
+
+Safe to run more than once: only rows with a missing hash are backfilled.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, encryption
+from sqlalchemy import text
+
+BATCH_SIZE = 500
+
+# (table, encrypted column, hash column, index name)
+BLIND_INDEXES = [
+    ('customer', 'email_encrypted', 'email_hash', 'ix_customer_email_hash'),
+    ('purchases', 'customer_email_encrypted', 'customer_email_hash', 'ix_purchases_customer_email_hash'),
+]
+
+
+def add_blind_index_columns():
+    """Add the hash columns and their indexes if they are missing."""
+    for table, _, hash_column, index_name in BLIND_INDEXES:
+        result = db.session.execute(text(f"PRAGMA table_info({table})"))
+        columns = [row[1] for row in result.fetchall()]
+
+        if hash_column not in columns:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {hash_column} VARCHAR(64)"))
+            print(f"Added column: {table}.{hash_column}")
+        else:
+            print(f"Column {table}.{hash_column} already exists.")
+
+        db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({hash_column})"))
+
+    db.session.commit()
+
+
+def backfill_blind_indexes():
+    """Compute hashes for every row that has an encrypted email but no hash."""
+    for table, encrypted_column, hash_column, _ in BLIND_INDEXES:
+        updated = 0
+        last_id = 0
+
+        while True:
+            rows = db.session.execute(text(
+                f"SELECT id, {encrypted_column} FROM {table} "
+                f"WHERE id > :last_id AND {hash_column} IS NULL AND {encrypted_column} IS NOT NULL "
+                f"ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': BATCH_SIZE}).fetchall()
+
+            if not rows:
+                break
+
+            params = []
+            for row_id, encrypted_value in rows:
+                email = encryption.decrypt(encrypted_value)
+                if email:
+                    params.append({'id': row_id, 'hash': encryption.blind_index(email)})
+                last_id = row_id
+
+            if params:
+                db.session.execute(
+                    text(f"UPDATE {table} SET {hash_column} = :hash WHERE id = :id"),
+                    params
+                )
+                db.session.commit()
+                updated += len(params)
+
+        print(f"Backfilled {updated} row(s) in {table}.{hash_column}")
+
+
+def migrate_email_blind_index():
+    """Run the full blind-index migration."""
+    with app.app_context():
+        try:
+            add_blind_index_columns()
+            backfill_blind_indexes()
+            print("Database migration completed successfully!")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("Starting Email Blind Index Migration...")
+    migrate_email_blind_index()
+    print("Migration completed!")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Database migration script for order headers.
+
+Creates the `orders` table and adds purchases.order_id (indexed). New
+checkouts write one `orders` row holding the customer's encrypted contact
+details and link each purchase line to it, instead of encrypting and storing
+them again on every line.
+
+Existing purchases are left as they are: rows without an order keep their
+own contact columns, and the Purchase accessors read those. Grouping old
+rows into orders is not attempted, since the lines of one old checkout
+cannot be told apart reliably from separate checkouts by the same customer.
+
+Safe to run more than once.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, CustomerOrder
+from sqlalchemy import inspect, text
+
+
+def migrate_order_headers():
+    """Create the orders table and link purchases to it."""
+    with app.app_context():
+        try:
+            connection = db.session.connection()
+            CustomerOrder.__table__.create(connection, checkfirst=True)
+
+            columns = {column['name'] for column in inspect(connection).get_columns('purchases')}
+            if 'order_id' not in columns:
+                print("Adding purchases.order_id...")
+                db.session.execute(text("ALTER TABLE purchases ADD COLUMN order_id INTEGER REFERENCES orders (id)"))
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_purchases_order_id ON purchases (order_id)"
+            ))
+            db.session.commit()
+            print("Order headers are in place.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("Starting Order Headers Migration...")
+    migrate_order_headers()
+    print("Migration completed!")
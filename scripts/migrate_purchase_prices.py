@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Database migration script to store prices on purchase records.
+
+Adds unit_price, line_total and discount_amount to purchases and backfills
+existing rows. The price actually charged for old purchases was never
+recorded, so they take the book's current catalog price and no discount;
+purchases whose book no longer exists keep NULL prices. Also creates the
+purchases timestamp index and rebuilds the daily sales rollup so its
+revenue matches the stored prices.
+
+Safe to run more than once; only rows without a unit price are backfilled.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, sales_rollup, DailySalesRollup
+from sqlalchemy import inspect, text
+
+NEW_COLUMNS = [
+    ('unit_price', 'FLOAT'),
+    ('line_total', 'FLOAT'),
+    ('discount_amount', 'FLOAT DEFAULT 0.0'),
+]
+
+
+def migrate_purchase_prices():
+    """Add the price columns, backfill them and rebuild the sales rollup."""
+    with app.app_context():
+        try:
+            existing = {column['name'] for column in inspect(db.session.connection()).get_columns('purchases')}
+            for name, column_type in NEW_COLUMNS:
+                if name not in existing:
+                    print(f"Adding purchases.{name}...")
+                    db.session.execute(text(f"ALTER TABLE purchases ADD COLUMN {name} {column_type}"))
+
+            result = db.session.execute(text(
+                "UPDATE purchases "
+                "SET unit_price = (SELECT price FROM book WHERE book.isbn = purchases.book_isbn), "
+                "    discount_amount = COALESCE(discount_amount, 0.0) "
+                "WHERE unit_price IS NULL AND book_isbn IN (SELECT isbn FROM book)"
+            ))
+            print(f"Backfilled prices on {result.rowcount} purchases.")
+            db.session.execute(text(
+                "UPDATE purchases SET line_total = unit_price * quantity "
+                "WHERE line_total IS NULL AND unit_price IS NOT NULL"
+            ))
+
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_purchases_timestamp ON purchases (timestamp)"
+            ))
+
+            DailySalesRollup.__table__.create(db.session.connection(), checkfirst=True)
+            rows = sales_rollup.rebuild()
+            db.session.commit()
+            print(f"Rebuilt daily sales rollup ({rows} rows).")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("Starting Purchase Prices Migration...")
+    migrate_purchase_prices()
+    print("Migration completed!")
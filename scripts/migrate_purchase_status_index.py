@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Database migration script to index purchases on (status, timestamp).
+
+db.create_all() only creates indexes for new tables, so existing databases
+need this once. The index lets the dashboard's GROUP BY status counts and the
+status-filtered order listings read the index instead of scanning purchases.
+
+Safe to run more than once.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db
+from sqlalchemy import text
+
+
+def migrate_purchase_status_index():
+    """Create ix_purchases_status_timestamp if it is missing."""
+    with app.app_context():
+        try:
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_purchases_status_timestamp ON purchases (status, timestamp)"
+            ))
+            db.session.execute(text("ANALYZE purchases"))
+            db.session.commit()
+            print("Index ix_purchases_status_timestamp is in place.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Migration failed: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    print("Starting Purchase Status Index Migration...")
+    migrate_purchase_status_index()
+    print("Migration completed!")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Bring the database schema up to the latest version.
+
+Creates any missing tables, then applies the numbered migrations in
+app/schema_migrations.py that schema_version does not list yet, rebuilds
+the catalog search index (book rowids may have been renumbered by a VACUUM
+since the last deploy; see scripts/rebuild_search_index.py), and finally
+checks the hot queries' plans for full table scans. The app runs the same
+steps on startup; this script is for deploys and for databases used by
+other tools.
+
+Usage:
+    python scripts/migrate_schema.py [--check]
+
+With --check, only the applied versions and the query plan warnings are
+shown. Safe to run more than once.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db
+from app.schema_migrations import MIGRATIONS, applied_versions, full_scan_warnings, migrate
+from app.search_index import rebuild_search_index
+
+
+def migrate_schema(check_only=False):
+    """Apply pending migrations and rebuild the search index (unless check_only); report full scans."""
+    with app.app_context():
+        if not check_only:
+            db.create_all()
+            applied = migrate(db.engine, log=print)
+            if not applied:
+                print("No pending migrations.")
+            rebuild_search_index(db.engine)
+            print("Search index rebuilt.")
+
+        versions = applied_versions(db.engine)
+        latest = max((m.version for m in MIGRATIONS), default=0)
+        print(f"Schema version: {max(versions, default=0)} (latest {latest})")
+
+        warnings = full_scan_warnings(db.engine)
+        for warning in warnings:
+            print(f"WARNING: {warning}")
+        if not warnings:
+            print("All hot queries use an index.")
+
+
+if __name__ == "__main__":
+    print("Starting Schema Migration...")
+    migrate_schema(check_only='--check' in sys.argv[1:])
+    print("Migration completed!")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily_sales_rollup table from purchases.
+
+Checkout and status changes keep the rollup current, but purchases made
+before the table existed (or imported directly into the database) need a
+backfill. Creates the table if it is missing, then recomputes every day in
+the given range; with no arguments the whole table is rebuilt. Revenue
+comes from the prices stored on purchases, so run
+scripts/migrate_purchase_prices.py first on databases from before they were
+recorded.
+
+Usage:
+    python scripts/rebuild_sales_rollup.py [START_DATE [END_DATE]]
+
+Dates are YYYY-MM-DD and inclusive. Safe to run more than once.
+"""
+
+import sys
+import os
+from datetime import datetime
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, sales_rollup, DailySalesRollup
+
+
+def rebuild_sales_rollup(start=None, end=None):
+    """Recompute rollup rows for start..end (inclusive)."""
+    with app.app_context():
+        try:
+            DailySalesRollup.__table__.create(db.session.connection(), checkfirst=True)
+            rows = sales_rollup.rebuild(start, end)
+            db.session.commit()
+            print(f"Wrote {rows} rollup rows.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Rebuild failed: {e}")
+            raise
+
+
+if __name__ == "__main__":
+    dates = [datetime.strptime(arg, '%Y-%m-%d').date() for arg in sys.argv[1:3]]
+    start = dates[0] if dates else None
+    end = dates[1] if len(dates) > 1 else None
+    print("Starting Daily Sales Rollup Rebuild...")
+    rebuild_sales_rollup(start, end)
+    print("Rebuild completed!")
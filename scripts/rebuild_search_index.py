@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Rebuild the full-text catalog search index (book_fts) from the book table.
+
+The index finds books by the `book` table's rowid. `book` has a text primary
+key, so that rowid is implicit and SQLite may renumber it during VACUUM;
+search then silently returns the wrong books. Run this script:
+- after every VACUUM of the database (sqlite3 app.db 'VACUUM', or a tool
+  that vacuums on compaction)
+- after restoring or copying the database with a tool that rewrites tables
+- if search results stop matching the catalog
+
+scripts/migrate_schema.py also rebuilds the index, so deploys are covered.
+The rebuild takes a write lock for as long as it runs, which is well under
+a second for a catalog of a few thousand books.
+
+Usage:
+    python scripts/rebuild_search_index.py
+
+Safe to run more than once.
+"""
+
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db
+from app.search_index import ensure_search_index, rebuild_search_index as rebuild_index
+
+
+def rebuild_search_index():
+    """Recreate every book_fts row from the current book rows."""
+    with app.app_context():
+        db.create_all()
+        if not ensure_search_index(db.engine):
+            print("This SQLite build has no FTS5 support; search uses LIKE filters and needs no index.")
+            return
+        rebuild_index(db.engine)
+        count = db.session.execute(db.text("SELECT COUNT(*) FROM book")).scalar()
+        print(f"Indexed {count} books.")
+
+
+if __name__ == "__main__":
+    print("Starting Search Index Rebuild...")
+    rebuild_search_index()
+    print("Rebuild completed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Convert stored ciphertexts to the compact "v2:" storage format.
+
+Values written before the format prefix existed hold the Fernet token
+base64-encoded a second time. This rewrites them as "v2:" + token, which
+is a third smaller and needs no decryption, so the job is cheap to run
+alongside the live app. Legacy values keep being read correctly in the
+meantime.
+
+Rows are converted in small batches, each in its own transaction, with a
+pause between batches. Progress is checkpointed, so the job can be stopped
+(Ctrl+C) and started again; it carries on after the last finished batch.
+
+Usage:
+    python scripts/reencode_ciphertexts.py [--batch-size N] [--pause SECONDS] [--restart]
+"""
+
+import argparse
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, ENCRYPTED_COLUMNS
+from app.ciphertext_jobs import DEFAULT_BATCH_SIZE, CiphertextRewriter
+from app.encryption_utils import reencode
+
+JOB_NAME = 'reencode-v2'
+
+
+def reencode_ciphertexts(batch_size=DEFAULT_BATCH_SIZE, pause=0.2, restart=False):
+    """Rewrite legacy ciphertexts in every encrypted column."""
+    with app.app_context():
+        db.create_all()
+        rewriter = CiphertextRewriter(db.engine, JOB_NAME, reencode, batch_size=batch_size, pause=pause)
+        if restart:
+            rewriter.reset()
+        try:
+            result = rewriter.run(ENCRYPTED_COLUMNS, log=print)
+        except KeyboardInterrupt:
+            print("Stopped; run again to resume.")
+            return
+        print(f"Scanned {result.rows} rows, re-encoded {result.rewritten} values.")
+        if result.failed:
+            print(f"WARNING: {result.failed} values were not valid ciphertext and were left as they are.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.2, help='seconds to sleep between batches')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and start over')
+    args = parser.parse_args()
+    print("Starting Ciphertext Re-encoding...")
+    reencode_ciphertexts(args.batch_size, args.pause, args.restart)
+    print("Re-encoding completed!")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Re-encrypt stored data under a new encryption key while the app keeps running.
+
+Rotation steps:
+1. Note the blind-index key (python app/encryption_utils.py --print-index-key)
+   and set it as BLIND_INDEX_KEY, so email lookups keep working once the old
+   key is gone. The app and this script refuse to start with old keys
+   configured and no BLIND_INDEX_KEY.
+2. Set the new key in ENCRYPTION_KEY (or ENCRYPTION_PASSWORD) and move the
+   old one to ENCRYPTION_OLD_KEYS (or ENCRYPTION_OLD_PASSWORDS), then restart
+   the app. New data is encrypted with the new key; old data still decrypts.
+3. Run this script with the same environment. It re-encrypts every value
+   still under an old key, in small batches with a pause between them and
+   an optional duty cycle that caps its CPU use.
+4. When --status shows every table done, drop the old key from the
+   environment and restart the app.
+
+Progress is checkpointed per key, so the job can be stopped (Ctrl+C) and
+started again. The manager-only /admin/encryption/rotation endpoint reports
+the same progress.
+
+Usage:
+    python scripts/rotate_encryption_key.py [--status] [--batch-size N] [--pause SECONDS]
+                                            [--duty-cycle FRACTION] [--restart]
+"""
+
+import argparse
+import sys
+import os
+root_dir = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(root_dir)
+sys.path.append(os.path.join(root_dir, 'app'))
+
+from app.app import app, db, encryption, ENCRYPTED_COLUMNS, KEY_ROTATION_JOB
+from app.ciphertext_jobs import DEFAULT_BATCH_SIZE, CiphertextRewriter
+
+
+def rotation_status():
+    """Print how far the rotation to the current key has got."""
+    with app.app_context():
+        db.create_all()
+        rewriter = CiphertextRewriter(db.engine, KEY_ROTATION_JOB, encryption.rotate)
+        print(f"Job {KEY_ROTATION_JOB}: {len(encryption.keys)} key(s) in the ring.")
+        for table in rewriter.progress(ENCRYPTED_COLUMNS):
+            state = 'done' if table['done'] else f"at id {table['last_key']} of {table['max_key']}"
+            print(f"  {table['table']}: {state}")
+
+
+def rotate_encryption_key(batch_size=DEFAULT_BATCH_SIZE, pause=0.2, duty_cycle=0.5, restart=False):
+    """Re-encrypt every encrypted column under the current key."""
+    if len(encryption.keys) == 1:
+        print("WARNING: no old keys configured (ENCRYPTION_OLD_KEYS / ENCRYPTION_OLD_PASSWORDS); "
+              "values under other keys will be reported as failed.")
+    with app.app_context():
+        db.create_all()
+        rewriter = CiphertextRewriter(db.engine, KEY_ROTATION_JOB, encryption.rotate,
+                                      batch_size=batch_size, pause=pause, duty_cycle=duty_cycle)
+        if restart:
+            rewriter.reset()
+        try:
+            result = rewriter.run(ENCRYPTED_COLUMNS, log=print)
+        except KeyboardInterrupt:
+            print("Stopped; run again to resume.")
+            return
+        print(f"Scanned {result.rows} rows, re-encrypted {result.rewritten} values.")
+        if result.failed:
+            print(f"WARNING: {result.failed} values could not be decrypted with any configured key "
+                  "and were left as they are. Keep the old keys until they are fixed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--status', action='store_true', help='show progress and exit')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--pause', type=float, default=0.2, help='seconds to sleep between batches')
+    parser.add_argument('--duty-cycle', type=float, default=0.5,
+                        help='largest share of wall time spent working, between 0 and 1')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and start over')
+    args = parser.parse_args()
+    if args.status:
+        rotation_status()
+        sys.exit(0)
+    print("Starting Encryption Key Rotation...")
+    rotate_encryption_key(args.batch_size, args.pause, args.duty_cycle, args.restart)
+    print("Key rotation completed!")
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+from query_budget_plugin import query_budget  # noqa: F401  (fixture)
+
+# Tests that import app.app get a throwaway database and never send mail. Assigned, not
+# defaulted: a DATABASE_URL exported by the developer must never reach the suite.
+TEST_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bookstore-tests-'), 'app.db')}"
+os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+os.environ['MAIL_TRANSPORT'] = 'memory'
+os.environ['MAIL_WORKERS'] = '0'
+
+
+@pytest.fixture(scope='module')
+def app_db():
+    """app.app's db with fresh tables; refuses any database the suite did not create."""
+    from app.app import app, db
+
+    with app.app_context():
+        if str(db.engine.url) != TEST_DATABASE_URL:
+            pytest.fail(f"app database is {db.engine.url}, not the suite's {TEST_DATABASE_URL}")
+        db.create_all()
+    yield db
+    with app.app_context():
+        db.drop_all()
+
@@ -0,0 +1,123 @@
+"""
+Query Budget Plugin
+
+This test-only plugin lets tests pin down how many SQL statements a piece of code
+runs:
+- QueryLog records every statement executed on an engine (by default on
+  every engine) while it is active, with its parameters
+- repeated() finds statements run again and again with different
+  parameters, the shape of an N+1 loop
+- check_budget() raises QueryBudgetExceeded when a block ran more
+  statements than its budget, or contains an N+1 pattern, and lists the
+  statements it saw so the failure explains itself
+- The `query_budget` fixture wraps both for a `with` block; conftest.py
+  imports it so every test module can use it
+
+Request-level numbers for a running server come from
+app/request_metrics.py instead.
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Distinct parameter sets of one SQL statement that count as an N+1 pattern
+DEFAULT_REPEAT_THRESHOLD = 3
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more statements than allowed, or an N+1 pattern."""
+
+
+class CapturedQuery:
+    """One executed statement and its parameters."""
+
+    def __init__(self, statement: str, parameters):
+        self.statement = statement
+        self.parameters = parameters
+
+    def __repr__(self) -> str:
+        return f"<CapturedQuery {self.statement!r} {self.parameters!r}>"
+
+
+def _normalize(statement: str) -> str:
+    return ' '.join(statement.split())
+
+
+class QueryLog:
+    """Context manager recording the statements executed on `target` while open."""
+
+    def __init__(self, target=Engine, ignore: Sequence[str] = ()):
+        self.target = target
+        self.ignore = list(ignore)
+        self.queries: List[CapturedQuery] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if any(pattern in statement for pattern in self.ignore):
+            return
+        self.queries.append(CapturedQuery(_normalize(statement), parameters))
+
+    def __enter__(self) -> 'QueryLog':
+        event.listen(self.target, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        event.remove(self.target, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def statements(self) -> List[str]:
+        return [query.statement for query in self.queries]
+
+    def repeated(self, threshold: int = DEFAULT_REPEAT_THRESHOLD) -> Dict[str, int]:
+        """SQL run with at least `threshold` different parameter sets, and how many."""
+        parameter_sets = defaultdict(set)
+        for query in self.queries:
+            parameter_sets[query.statement].add(repr(query.parameters))
+        return {statement: len(params) for statement, params in parameter_sets.items() if len(params) >= threshold}
+
+    def report(self) -> str:
+        return '\n'.join(f"  {i}. {query.statement} {query.parameters!r}" for i, query in enumerate(self.queries, 1))
+
+
+def check_budget(log: QueryLog, max_queries: Optional[int] = None,
+                 repeat_threshold: Optional[int] = DEFAULT_REPEAT_THRESHOLD, label: str = 'block') -> None:
+    """
+    Raise QueryBudgetExceeded if `log` holds more than `max_queries`
+    statements or, unless `repeat_threshold` is None, an N+1 pattern.
+    """
+    problems = []
+    if max_queries is not None and log.count > max_queries:
+        problems.append(f"{label} ran {log.count} SQL statements, budget is {max_queries}")
+    if repeat_threshold is not None:
+        for statement, times in log.repeated(repeat_threshold).items():
+            problems.append(f"{label} ran the same statement with {times} different parameters "
+                            f"(N+1?): {statement}")
+    if problems:
+        raise QueryBudgetExceeded('\n'.join(problems) + '\nStatements:\n' + log.report())
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fail when a block runs more SQL statements than its budget, or an N+1 pattern:
+
+        with query_budget(3, label='GET /cart'):
+            client.get('/cart')
+
+    The context manager yields the QueryLog, so tests can inspect the statements.
+    """
+    @contextmanager
+    def budget(max_queries=None, repeat_threshold=DEFAULT_REPEAT_THRESHOLD, ignore=(), label='block'):
+        with QueryLog(ignore=ignore) as log:
+            yield log
+        check_budget(log, max_queries, repeat_threshold, label)
+
+    return budget
@@ -0,0 +1,105 @@
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+
+from app.book_cache import BookCache
+
+
+@pytest.fixture
+def env():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy(app)
+
+    class Book(db.Model):
+        isbn = db.Column(db.String(20), primary_key=True)
+        title = db.Column(db.String(100))
+        quantity = db.Column(db.Integer)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Book(isbn='a', title='A', quantity=3), Book(isbn='b', title='B', quantity=1)])
+        db.session.commit()
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        cache = BookCache(max_size=2)
+        cache.init_app(db, Book)
+        yield db, Book, cache, statements
+
+
+def test_repeat_lookups_skip_the_database(env):
+    db, Book, cache, statements = env
+    assert cache.get('a').title == 'A'
+    db.session.remove()
+    statements.clear()
+
+    book = cache.get('a')
+    assert (book.title, book.quantity) == ('A', 3)
+    assert cache.get('missing') is None
+    statements.clear()
+    assert cache.get('missing') is None
+    assert statements == []
+
+
+def test_cached_books_are_attached_to_the_session(env):
+    db, Book, cache, statements = env
+    cache.get('a')
+    db.session.remove()
+    book = cache.get('a')
+    assert book in db.session
+    assert db.session.get(Book, 'a') is book
+
+
+def test_bump_drops_cached_books(env):
+    db, Book, cache, statements = env
+    assert cache.get('a').quantity == 3
+    db.session.execute(db.text("UPDATE book SET quantity = 0 WHERE isbn = 'a'"))
+    db.session.commit()
+    db.session.remove()
+    assert cache.get('a').quantity == 3
+
+    cache.bump()
+    db.session.remove()
+    assert cache.get('a').quantity == 0
+
+
+def test_invalidate_drops_only_the_given_books(env):
+    db, Book, cache, statements = env
+    cache.get_many(['a', 'b'])
+    db.session.execute(db.text("UPDATE book SET quantity = quantity + 1"))
+    db.session.commit()
+    db.session.remove()
+
+    cache.invalidate(['a'])
+    cache.invalidate([])
+    db.session.remove()
+    statements.clear()
+    assert cache.get('b').quantity == 1
+    assert statements == []
+    assert cache.get('a').quantity == 4
+
+
+def test_fresh_reads_need_populate_existing(env):
+    db, Book, cache, statements = env
+    cache.get('a')
+    db.session.execute(db.text("UPDATE book SET quantity = 0 WHERE isbn = 'a'"))
+    db.session.commit()
+    db.session.remove()
+
+    cached = cache.get('a')
+    # A plain query hands back the cached object from the identity map as it is
+    assert Book.query.filter(Book.isbn.in_(['a'])).one().quantity == 3
+    fresh = Book.query.filter(Book.isbn.in_(['a'])).execution_options(populate_existing=True).one()
+    assert fresh is cached and fresh.quantity == 0
+
+
+def test_get_many_queries_only_misses_and_stays_bounded(env):
+    db, Book, cache, statements = env
+    cache.get('a')
+    statements.clear()
+    assert set(cache.get_many(['a', 'b', 'c'])) == {'a', 'b'}
+    assert len(statements) == 1
+    assert len(cache._entries) == 2
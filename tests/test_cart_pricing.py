@@ -0,0 +1,55 @@
+from app.cart_pricing import price_cart
+
+
+class FakeBook:
+    def __init__(self, isbn, price, quantity, title='Book'):
+        self.isbn = isbn
+        self.price = price
+        self.quantity = quantity
+        self.title = title
+
+
+CODES = {'SAVE10': [0.10, 30.0]}
+
+
+def test_price_cart_totals_and_discount():
+    books = {'a': FakeBook('a', 20.0, 5), 'b': FakeBook('b', 5.0, 5)}
+    quote = price_cart({'a': 1, 'b': 2}, books, 'SAVE10', CODES)
+    assert [b.isbn for b, _ in quote.items] == ['a', 'b']
+    assert quote.subtotal == 30.0
+    assert quote.discount_code == 'SAVE10'
+    assert round(quote.discount_amount, 2) == 3.0
+    assert round(quote.total, 2) == 27.0
+    assert quote.first_shortfall is None
+
+
+def test_price_cart_below_minimum_and_unknown_code():
+    books = {'a': FakeBook('a', 10.0, 5)}
+    assert price_cart({'a': 1}, books, 'SAVE10', CODES).discount_amount == 0
+    assert price_cart({'a': 4}, books, 'NOPE', CODES).discount_amount == 0
+
+
+def test_price_cart_reports_shortfalls_and_missing_books():
+    books = {'a': FakeBook('a', 10.0, 1, title='Scarce')}
+    quote = price_cart({'a': 3, 'gone': 1}, books)
+    assert quote.missing_isbns == ['gone']
+    book, requested = quote.first_shortfall
+    assert (book.title, requested) == ('Scarce', 3)
+
+
+def test_priced_lines_split_discount_to_the_cent():
+    books = {'a': FakeBook('a', 10.0, 5), 'b': FakeBook('b', 10.0, 5), 'c': FakeBook('c', 13.33, 5)}
+    quote = price_cart({'a': 1, 'b': 1, 'c': 1}, books, 'SAVE10', CODES)
+    lines = quote.priced_lines()
+    assert [(b.isbn, qty, unit, total) for b, qty, unit, total, _ in lines] == [
+        ('a', 1, 10.0, 10.0), ('b', 1, 10.0, 10.0), ('c', 1, 13.33, 13.33)]
+    shares = [share for *_, share in lines]
+    assert shares[:2] == [1.0, 1.0]
+    assert round(sum(shares), 2) == round(quote.discount_amount, 2)
+    assert all(share == 0 for *_, share in price_cart({'a': 1}, books).priced_lines())
+
+
+def test_price_cart_counts_own_hold_as_available():
+    books = {'a': FakeBook('a', 10.0, 0)}
+    assert price_cart({'a': 2}, books).first_shortfall is not None
+    assert price_cart({'a': 2}, books, held={'a': 2}).first_shortfall is None
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.ciphertext_jobs import CiphertextRewriter, EncryptedColumns
+
+SPECS = [EncryptedColumns('customer', ['email_encrypted', 'phone_encrypted'])]
+
+
+def upper(value):
+    if value.isupper():
+        return None
+    if value == 'bad':
+        raise ValueError(value)
+    return value.upper()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "jobs.db"}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE customer (id INTEGER PRIMARY KEY, email_encrypted TEXT, phone_encrypted TEXT)'))
+        conn.execute(text('INSERT INTO customer VALUES (:id, :email, :phone)'), [
+            {'id': i, 'email': f'e{i}', 'phone': None if i % 2 else f'p{i}'} for i in range(1, 11)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def values(engine):
+    with engine.connect() as conn:
+        return conn.execute(text('SELECT email_encrypted, phone_encrypted FROM customer ORDER BY id')).all()
+
+
+def test_rewrites_every_value_in_batches(engine):
+    result = CiphertextRewriter(engine, 'upper', upper, batch_size=3).run(SPECS)
+    assert (result.rows, result.rewritten, result.failed, result.finished) == (10, 15, 0, True)
+    assert all(email.isupper() for email, _ in values(engine))
+
+    # A finished job does nothing on the next run
+    assert CiphertextRewriter(engine, 'upper', upper, batch_size=3).run(SPECS).rows == 0
+
+
+def test_stopped_job_resumes_after_last_batch(engine):
+    batches = []
+    rewriter = CiphertextRewriter(engine, 'upper', upper, batch_size=4)
+    result = rewriter.run(SPECS, should_stop=lambda: len(batches) == 1, log=batches.append)
+    assert not result.finished and result.rows == 4
+    assert rewriter.pending_tables(SPECS) == ['customer']
+
+    result = rewriter.run(SPECS)
+    assert result.finished and result.rows == 6
+    assert rewriter.pending_tables(SPECS) == []
+
+    rewriter.reset()
+    assert rewriter.pending_tables(SPECS) == ['customer']
+
+
+def test_failures_are_counted_and_concurrent_writes_win(engine):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE customer SET email_encrypted = 'bad' WHERE id = 1"))
+
+    def racing(value):
+        # The application rewrites row 2 between the job's read and its update
+        if value == 'e2':
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE customer SET email_encrypted = 'fresh' WHERE id = 2"))
+        return upper(value)
+
+    result = CiphertextRewriter(engine, 'upper', racing, batch_size=20).run(SPECS)
+    assert result.failed == 1
+    assert [row[0] for row in values(engine)[:3]] == ['bad', 'fresh', 'E3']
+
+
+def test_progress_and_duty_cycle(engine, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('app.ciphertext_jobs.time.sleep', sleeps.append)
+    rewriter = CiphertextRewriter(engine, 'upper', upper, batch_size=4, duty_cycle=0.25)
+    assert rewriter.progress(SPECS)[0]['last_key'] == 0
+
+    rewriter.run(SPECS, should_stop=lambda: len(sleeps) == 1)
+    status = rewriter.progress(SPECS)[0]
+    assert (status['table'], status['last_key'], status['max_key'], status['done']) == ('customer', 4, 10, False)
+    assert sleeps[0] > 0
+
+    rewriter.run(SPECS)
+    assert rewriter.progress(SPECS)[0]['done']
+    with pytest.raises(ValueError):
+        CiphertextRewriter(engine, 'upper', upper, duty_cycle=0)
@@ -0,0 +1,39 @@
+import csv
+import gzip
+import io
+
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from app.csv_export import iter_chunks, iter_csv
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = 'items'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20))
+
+
+def test_iter_chunks_fetches_fixed_size_batches():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(Item(id=i, name=f'item {i}') for i in range(1, 8))
+        session.commit()
+        chunks = list(iter_chunks(session.query(Item).order_by(Item.id), chunk_size=3))
+    assert [len(c) for c in chunks] == [3, 3, 1]
+    assert [item.id for chunk in chunks for item in chunk] == list(range(1, 8))
+
+
+def test_iter_csv_yields_one_piece_per_chunk():
+    pieces = list(iter_csv(['id', 'name'], [[[1, 'a, b']], [[2, 'say "hi"']]]))
+    assert len(pieces) == 3
+    rows = list(csv.reader(io.StringIO(b''.join(pieces).decode('utf-8'))))
+    assert rows == [['id', 'name'], ['1', 'a, b'], ['2', 'say "hi"']]
+
+
+def test_iter_csv_gzip_and_quoting():
+    data = b''.join(iter_csv(['isbn'], [[['0123']]], compress=True, quoting=csv.QUOTE_ALL))
+    assert gzip.decompress(data).decode('utf-8') == '"isbn"\r\n"0123"\r\n'
@@ -0,0 +1,170 @@
+import pytest
+
+from app.encryption_utils import STORAGE_PREFIX, DataEncryption, EncryptedField, reencode, stored_to_token
+
+
+def test_blind_index_is_deterministic_and_normalized():
+    enc = DataEncryption('test-password')
+    assert enc.blind_index('Reader@Example.com ') == enc.blind_index('reader@example.com')
+    assert enc.blind_index('reader@example.com') != enc.blind_index('other@example.com')
+    assert len(enc.blind_index('reader@example.com')) == 64
+    assert enc.blind_index('') is None
+
+
+def test_blind_index_depends_on_key():
+    assert DataEncryption('one').blind_index('a@b.com') != DataEncryption('two').blind_index('a@b.com')
+
+
+def test_derived_key_is_cached_per_password(monkeypatch):
+    from app import encryption_utils
+
+    calls = []
+    real_pbkdf2 = encryption_utils.PBKDF2HMAC
+
+    def counting_pbkdf2(*args, **kwargs):
+        calls.append(kwargs.get('salt'))
+        return real_pbkdf2(*args, **kwargs)
+
+    monkeypatch.setattr(encryption_utils, 'PBKDF2HMAC', counting_pbkdf2)
+    first = DataEncryption('cache-test-password')
+    second = DataEncryption('cache-test-password')
+    assert first.key == second.key
+    assert len(calls) == 1
+    assert second.decrypt(first.encrypt('hello')) == 'hello'
+
+
+def test_pre_derived_key_from_environment(monkeypatch, tmp_path):
+    from cryptography.fernet import Fernet
+
+    key = Fernet.generate_key()
+    monkeypatch.delenv('ENCRYPTION_KEY', raising=False)
+    key_file = tmp_path / 'fernet.key'
+    key_file.write_bytes(key + b'\n')
+    monkeypatch.setenv('ENCRYPTION_KEY_FILE', str(key_file))
+    assert DataEncryption().key == key
+
+    monkeypatch.setenv('ENCRYPTION_KEY', key.decode())
+    monkeypatch.delenv('ENCRYPTION_KEY_FILE')
+    assert DataEncryption().key == key
+
+
+def test_decrypt_many_matches_single_decrypt():
+    enc = DataEncryption('batch-password')
+    plain = ['a@example.com', None, '', '+1-555-0100', '1 Main St']
+    encrypted = enc.encrypt_many(plain)
+    assert encrypted[1] is None and encrypted[2] is None
+    assert enc.decrypt_many(encrypted) == ['a@example.com', None, None, '+1-555-0100', '1 Main St']
+    assert [enc.decrypt(v) for v in encrypted if v] == enc.decrypt_many(v for v in encrypted if v)
+
+
+def test_decrypt_many_reports_bad_values_as_none():
+    enc = DataEncryption('batch-password')
+    good = enc.encrypt('ok')
+    assert enc.decrypt_many([good, 'not-a-token', good]) == ['ok', None, 'ok']
+
+
+def test_decrypt_many_process_pool(monkeypatch):
+    from app import encryption_utils
+
+    monkeypatch.setattr(encryption_utils, 'PARALLEL_THRESHOLD', 4)
+    monkeypatch.setattr(encryption_utils, 'PARALLEL_CHUNK_SIZE', 2)
+    enc = DataEncryption('batch-password')
+    plain = [f'user{i}@example.com' for i in range(5)]
+    try:
+        assert enc.decrypt_many(enc.encrypt_many(plain), workers=2) == plain
+        pool = enc._pool
+        # Later batches reuse the running pool
+        assert enc.decrypt_many(enc.encrypt_many(plain), workers=2) == plain
+        assert enc._pool is pool
+    finally:
+        enc.close()
+    assert enc._pool is None
+
+
+class CountingEncryption(DataEncryption):
+    def __init__(self):
+        super().__init__('field-test-password')
+        self.decrypts = 0
+
+    def decrypt(self, encrypted_data):
+        self.decrypts += 1
+        return super().decrypt(encrypted_data)
+
+
+def make_record_class(enc):
+    class Record:
+        email_encrypted = None
+        email_hash = None
+        email = EncryptedField(enc, 'email_encrypted', index_column='email_hash')
+    return Record
+
+
+def test_encrypted_field_decrypts_once_per_instance():
+    enc = CountingEncryption()
+    Record = make_record_class(enc)
+    record = Record()
+    record.email_encrypted = enc.encrypt('reader@example.com')
+
+    assert [record.email, record.email, record.email] == ['reader@example.com'] * 3
+    assert enc.decrypts == 1
+
+    # A new ciphertext under the column (refresh, re-encryption) is decrypted again
+    record.email_encrypted = enc.encrypt('other@example.com')
+    assert record.email == 'other@example.com'
+    assert enc.decrypts == 2
+
+
+def test_encrypted_field_set_encrypts_indexes_and_memoizes():
+    enc = CountingEncryption()
+    Record = make_record_class(enc)
+    record = Record()
+    record.email = 'Reader@Example.com'
+    assert enc.decrypt(record.email_encrypted) == 'Reader@Example.com'
+    assert record.email_hash == enc.blind_index('reader@example.com')
+
+    enc.decrypts = 0
+    assert record.email == 'Reader@Example.com'
+    assert enc.decrypts == 0
+
+    record.email = ''
+    assert (record.email_encrypted, record.email_hash, record.email) == (None, None, None)
+
+
+def test_compact_format_and_legacy_values_both_decrypt():
+    import base64
+
+    enc = DataEncryption('format-test-password')
+    stored = enc.encrypt('reader@example.com')
+    assert stored.startswith(STORAGE_PREFIX)
+
+    legacy = base64.urlsafe_b64encode(stored_to_token(stored)).decode('ascii')
+    assert len(stored) < len(legacy)
+    assert enc.decrypt(legacy) == 'reader@example.com'
+    assert enc.decrypt_many([legacy, stored]) == ['reader@example.com', 'reader@example.com']
+
+    assert reencode(legacy) == stored
+    assert reencode(stored) is None and reencode(None) is None
+    with pytest.raises(ValueError):
+        reencode('not-ciphertext')
+
+
+def test_key_rotation_keeps_old_values_readable():
+    old = DataEncryption('old-password')
+    stored = old.encrypt('reader@example.com')
+
+    # A key ring without an explicit blind-index key is refused
+    with pytest.raises(ValueError, match='BLIND_INDEX_KEY'):
+        DataEncryption('new-password', old_keys=[old.key])
+
+    new = DataEncryption('new-password', old_keys=[old.key], index_key=old.index_key)
+    assert new.decrypt(stored) == 'reader@example.com'
+    assert new.decrypt_many([stored]) == ['reader@example.com']
+    # Blind indexes stay valid across the rotation
+    assert new.blind_index('reader@example.com') == old.blind_index('reader@example.com')
+
+    rotated = new.rotate(stored)
+    assert rotated.startswith(STORAGE_PREFIX) and rotated != stored
+    assert DataEncryption('new-password').decrypt(rotated) == 'reader@example.com'
+    assert new.rotate(rotated) is None and new.rotate(new.encrypt('x')) is None
+    with pytest.raises(ValueError):
+        DataEncryption('new-password').rotate(stored)
@@ -0,0 +1,136 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.inventory import InsufficientStock, InventoryService
+
+
+@pytest.fixture
+def env(tmp_path):
+    # A file database so worker threads get their own connections
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'inventory.db'}"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db = SQLAlchemy(app)
+
+    class Book(db.Model):
+        isbn = db.Column(db.String(20), primary_key=True)
+        quantity = db.Column(db.Integer)
+        in_stock = db.Column(db.Boolean)
+
+    class Reservation(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        token = db.Column(db.String(32), index=True)
+        isbn = db.Column(db.String(20))
+        quantity = db.Column(db.Integer)
+        expires_at = db.Column(db.DateTime)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Book(isbn='a', quantity=5, in_stock=True), Book(isbn='b', quantity=1, in_stock=True)])
+        db.session.commit()
+        service = InventoryService(hold_seconds=600)
+        service.init_app(db, Book, Reservation)
+        yield app, db, service
+
+
+def test_take_is_all_or_nothing(env):
+    app, db, service = env
+    assert service.take({'a': 2, 'b': 1}) == {'a': 3, 'b': 0}
+    with pytest.raises(InsufficientStock) as excinfo:
+        service.take({'a': 1, 'b': 1})
+    assert (excinfo.value.isbn, excinfo.value.requested, excinfo.value.available) == ('b', 1, 0)
+    with pytest.raises(InsufficientStock):
+        service.take({'missing': 1})
+    db.session.commit()
+    assert service.quantities(['a', 'b']) == {'a': 3, 'b': 0}
+    assert dict(db.session.execute(db.text('SELECT isbn, in_stock FROM book')).all()) == {'a': 1, 'b': 0}
+
+
+def test_hold_claim_and_release(env):
+    app, db, service = env
+    token = service.hold({'a': 2})
+    assert service.held(token) == {'a': 2}
+    assert service.quantities(['a']) == {'a': 3}
+    # Claiming the same items consumes the hold without taking more
+    assert service.claim(token, {'a': 2}) == {'a': 3}
+    assert service.held(token) == {}
+
+    # A changed cart returns the hold and takes the new items
+    token = service.hold({'a': 1})
+    assert service.claim(token, {'a': 2, 'b': 1}) == {'a': 1, 'b': 0}
+
+    token = service.hold({'a': 1})
+    assert service.release(token) == {'a': 1}
+    assert service.release(token) == {}
+
+
+def test_release_expired(env):
+    app, db, service = env
+    now = datetime(2024, 1, 1, 12)
+    old = service.hold({'a': 2}, now=now - timedelta(hours=1))
+    fresh = service.hold({'a': 1}, now=now)
+    assert service.release_expired(now=now) == 2
+    assert service.held(old) == {} and service.held(fresh) == {'a': 1}
+    assert service.quantities(['a']) == {'a': 4}
+
+
+def test_void_drops_holds_without_restocking(env):
+    app, db, service = env
+    token = service.hold({'a': 2})
+    # Marked out of stock while the hold is outstanding
+    assert service.void(['a']) == 1
+    db.session.execute(db.text("UPDATE book SET quantity = 0, in_stock = 0 WHERE isbn = 'a'"))
+    assert service.release(token) == {} and service.release_expired(now=datetime.max) == 0
+    assert service.quantities(['a']) == {'a': 0}
+    with pytest.raises(InsufficientStock):
+        service.claim(token, {'a': 2})
+
+
+def test_sweep_if_due_is_throttled(env):
+    app, db, service = env
+    service.hold({'a': 2}, now=datetime(2024, 1, 1))
+    assert service.sweep_if_due() == 2
+    assert service.quantities(['a']) == {'a': 5}
+    service.hold({'a': 1}, now=datetime(2024, 1, 1))
+    assert service.sweep_if_due() is None
+
+
+def test_concurrent_checkouts_never_oversell(env):
+    app, db, service = env
+    with app.app_context():
+        db.session.execute(db.text("UPDATE book SET quantity = 25 WHERE isbn = 'a'"))
+        db.session.commit()
+
+    sold, refused, errors = [], [], []
+    start = threading.Barrier(16)
+
+    def buyer():
+        with app.app_context():
+            start.wait()
+            for _ in range(5):
+                try:
+                    service.take({'a': 1})
+                    db.session.commit()
+                    sold.append(1)
+                except InsufficientStock:
+                    db.session.rollback()
+                    refused.append(1)
+                except Exception as e:  # pragma: no cover - reported below
+                    db.session.rollback()
+                    errors.append(e)
+
+    threads = [threading.Thread(target=buyer) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        remaining = service.quantities(['a'])['a']
+    assert errors == []
+    assert len(sold) == 25 and len(refused) == 16 * 5 - 25
+    assert remaining == 0
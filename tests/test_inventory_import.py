@@ -0,0 +1,80 @@
+import io
+
+import pytest
+from sqlalchemy import Boolean, Column, Float, Integer, MetaData, String, Table, Text, create_engine, select
+
+from app.inventory_import import ImportReport, import_books, parse_isbn
+
+metadata = MetaData()
+book = Table(
+    'book', metadata,
+    Column('isbn', String(20), primary_key=True),
+    Column('title', String(100), nullable=False),
+    Column('author', String(100), nullable=False),
+    Column('price', Float, nullable=False),
+    Column('quantity', Integer, default=0),
+    Column('in_stock', Boolean, default=True),
+    Column('cover_type', String(50)),
+    Column('description', Text),
+    Column('genre', String(100)),
+)
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(book.insert(), [{'isbn': '1', 'title': 'Old', 'author': 'A', 'price': 1.0, 'quantity': 1}])
+        yield conn
+
+
+def csv_bytes(*lines):
+    return io.BytesIO('\n'.join(lines).encode('utf-8'))
+
+
+def test_inserts_and_updates_across_chunks(conn):
+    stream = csv_bytes(
+        '﻿ISBN,Title,Author,Price,Quantity,Genre',
+        '1,New Title,A,$9.50,0,Mystery',
+        '2,Two,B,3,4,',
+        '3,Three,C,3,4,Mystery',
+        '2,Two Again,B,3,5,',
+    )
+    overwritten = []
+    result = import_books(stream, conn, book, ['Mystery', 'Fiction'], chunk_size=2, on_update=overwritten.append)
+    assert (result.added, result.updated, result.skipped) == (2, 2, 0)
+    assert overwritten == [['1'], ['2']]
+    rows = {r.isbn: r for r in conn.execute(select(book))}
+    assert rows['1'].title == 'New Title' and rows['1'].price == 9.5 and rows['1'].in_stock is False
+    assert rows['2'].title == 'Two Again' and rows['2'].genre == 'Fiction'
+
+
+def test_bad_rows_go_to_report(conn, tmp_path):
+    path = tmp_path / 'report.csv'
+    report = ImportReport(str(path))
+    stream = csv_bytes(
+        'isbn,title,author,price,quantity,genre',
+        ',No ISBN,A,1,1,',
+        '5,Bad Price,A,abc,1,',
+        '6,Odd Genre,A,1,1,Cookbooks',
+    )
+    result = import_books(stream, conn, book, ['Fiction'], report=report)
+    report.close()
+    assert (result.added, result.skipped, result.warnings) == (1, 2, 1)
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith('line,level,message')
+    assert lines[1].startswith('2,error,missing required fields: ISBN')
+    assert lines[3].startswith('4,warning,')
+
+
+def test_report_file_only_created_when_needed(conn, tmp_path):
+    report = ImportReport(str(tmp_path / 'report.csv'))
+    import_books(csv_bytes('isbn,title,author', '7,T,A'), conn, book, [], report=report)
+    report.close()
+    assert not report.has_entries and not (tmp_path / 'report.csv').exists()
+
+
+def test_parse_isbn_undoes_scientific_notation():
+    assert parse_isbn(' 9.78045E+12 ') == '9780450000000'
+    assert parse_isbn('978-0-45') == '978-0-45'
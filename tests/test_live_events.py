@@ -0,0 +1,40 @@
+from app.live_events import EventBus, format_sse, stream_events
+
+
+def test_publish_fans_out_to_subscribers():
+    bus = EventBus()
+    first, _ = bus.subscribe()
+    second, _ = bus.subscribe()
+    event_id = bus.publish('order_created', {'total': 3})
+    assert first.queue.get_nowait() == (event_id, 'order_created', {'total': 3})
+    assert second.queue.get_nowait() == (event_id, 'order_created', {'total': 3})
+    bus.unsubscribe(first)
+    assert bus.subscriber_count == 1
+
+
+def test_resubscribe_replays_missed_events():
+    bus = EventBus(replay_size=2)
+    for i in range(3):
+        bus.publish('status_changed', {'n': i})
+    subscription, complete = bus.subscribe(last_event_id=1)
+    assert complete
+    assert [subscription.queue.get_nowait()[0] for _ in range(2)] == [2, 3]
+    # Too old for the buffer, or from before a restart
+    assert bus.subscribe(last_event_id=0)[1] is False
+    assert bus.subscribe(last_event_id=10)[1] is False
+    assert bus.subscribe(last_event_id=3)[1] is True
+
+
+def test_slow_subscriber_is_told_to_resync():
+    bus = EventBus(queue_size=1)
+    stream = stream_events(bus, heartbeat_seconds=0.01)
+    assert next(stream).startswith('retry:')
+    bus.publish('low_stock', {'isbn': '1'})
+    bus.publish('low_stock', {'isbn': '2'})
+    assert next(stream) == format_sse('resync', {})
+    assert list(stream) == []
+    assert bus.subscriber_count == 0
+
+
+def test_format_sse():
+    assert format_sse('low_stock', {'quantity': 2}, 7) == 'id: 7\nevent: low_stock\ndata: {"quantity":2}\n\n'
@@ -0,0 +1,133 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.mail_queue import MailDispatcher, MemoryTransport
+
+
+class FlakyTransport(MemoryTransport):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def send(self, sender, recipients, message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('smtp down')
+        super().send(sender, recipients, message)
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "mail.db"}'
+    db = SQLAlchemy(app)
+
+    class OutboxEmail(db.Model):
+        __tablename__ = 'email_outbox'
+        id = db.Column(db.Integer, primary_key=True)
+        recipient = db.Column(db.String(255), nullable=False)
+        subject = db.Column(db.String(255), nullable=False)
+        body = db.Column(db.Text, nullable=False)
+        status = db.Column(db.String(20), default='pending')
+        attempts = db.Column(db.Integer, default=0)
+        next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+        claim_token = db.Column(db.String(32))
+        claimed_at = db.Column(db.DateTime)
+        last_error = db.Column(db.Text)
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        sent_at = db.Column(db.DateTime)
+
+    with app.app_context():
+        db.create_all()
+        yield app, db, OutboxEmail
+
+
+def test_enqueue_only_writes_outbox_until_flushed(outbox):
+    app, db, OutboxEmail = outbox
+    transport = MemoryTransport()
+    dispatcher = MailDispatcher(transport=transport, sender='store@example.com', workers=0)
+    dispatcher.init_app(app, db, OutboxEmail)
+
+    assert dispatcher.enqueue(['a@example.com', 'b@example.com'], 'Hello', 'Body')
+    assert transport.messages == []
+    assert OutboxEmail.query.filter_by(status='pending').count() == 2
+
+    assert dispatcher.flush() == 2
+    assert sorted(m['recipients'][0] for m in transport.messages) == ['a@example.com', 'b@example.com']
+    assert OutboxEmail.query.filter_by(status='sent').count() == 2
+    assert dispatcher.flush() == 0
+
+
+def test_failed_send_is_retried_with_backoff_then_given_up(outbox):
+    app, db, OutboxEmail = outbox
+    transport = FlakyTransport(failures=10)
+    dispatcher = MailDispatcher(transport=transport, sender='s@example.com', workers=0, max_attempts=2)
+    dispatcher.init_app(app, db, OutboxEmail)
+    dispatcher.enqueue('a@example.com', 'Hi', 'Body')
+
+    assert dispatcher.flush() == 1
+    message = OutboxEmail.query.one()
+    assert message.status == 'pending'
+    assert message.next_attempt_at > datetime.utcnow()
+    assert 'smtp down' in message.last_error
+
+    # Not due yet, so nothing is claimed
+    assert dispatcher.flush() == 0
+
+    message.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    assert dispatcher.flush() == 1
+    assert OutboxEmail.query.one().status == 'failed'
+
+
+def test_background_workers_deliver_queued_mail(outbox):
+    app, db, OutboxEmail = outbox
+    transport = MemoryTransport()
+    dispatcher = MailDispatcher(transport=transport, sender='s@example.com', workers=2, poll_seconds=0.05)
+    dispatcher.init_app(app, db, OutboxEmail)
+    try:
+        for i in range(5):
+            dispatcher.enqueue(f'user{i}@example.com', 'Hi', 'Body')
+        for _ in range(100):
+            if len(transport.messages) == 5:
+                break
+            time.sleep(0.05)
+    finally:
+        dispatcher.stop()
+    assert len(transport.messages) == 5
+
+
+class ReversingCipher:
+    def encrypt(self, text):
+        return 'enc:' + text[::-1]
+
+    def decrypt(self, stored):
+        return stored[4:][::-1] if stored.startswith('enc:') else None
+
+
+def test_bodies_encrypted_at_rest_blanked_when_sent_and_purged(outbox):
+    app, db, OutboxEmail = outbox
+    transport = MemoryTransport()
+    dispatcher = MailDispatcher(transport=transport, sender='s@example.com', workers=0,
+                                cipher=ReversingCipher(), retention_days=7)
+    dispatcher.init_app(app, db, OutboxEmail)
+
+    # The caller's pending changes are neither committed nor rolled back
+    db.session.add(OutboxEmail(recipient='mine@example.com', subject='Draft', body='x', status='draft'))
+    assert dispatcher.enqueue('a@example.com', 'Code', 'Your code is 123456')
+    assert OutboxEmail.query.filter_by(status='draft').count() == 1
+    db.session.rollback()
+    assert OutboxEmail.query.filter_by(status='draft').count() == 0
+
+    assert OutboxEmail.query.one().body == 'enc:654321 si edoc ruoY'
+    assert dispatcher.flush() == 1
+    assert 'Your code is 123456' in transport.messages[0]['message']
+    assert OutboxEmail.query.one().body == ''
+
+    # Finished rows are deleted once past the retention period
+    assert dispatcher.purge(now=datetime.utcnow() + timedelta(days=8)) == 1
+    assert OutboxEmail.query.count() == 0
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.order_stats import OrderStatistics
+
+
+@pytest.fixture
+def setup():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy(app)
+
+    class Purchase(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        status = db.Column(db.String(50))
+        timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    with app.app_context():
+        db.create_all()
+        for status in ['Pending', 'Pending', 'Shipped', None]:
+            db.session.add(Purchase(status=status))
+        db.session.commit()
+        stats = OrderStatistics(ttl_seconds=60)
+        stats.init_app(db, Purchase)
+        yield db, Purchase, stats
+
+
+def test_counts_from_one_query(setup):
+    db, Purchase, stats = setup
+    assert stats.counts() == {'Pending': 2, 'Shipped': 1}
+    assert stats.dashboard_counts()['Completed'] == 0
+    assert stats.statuses() == ['Pending', 'Shipped']
+    assert stats.total() == 4
+
+
+def test_cache_until_invalidated(setup):
+    db, Purchase, stats = setup
+    assert stats.counts()['Pending'] == 2
+    Purchase.query.filter_by(status='Pending').update({'status': 'Completed'})
+    db.session.commit()
+    assert stats.counts()['Pending'] == 2
+    stats.invalidate()
+    assert stats.counts() == {'Completed': 2, 'Shipped': 1}
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from app.pagination import apply_order_filters, decode_cursor, encode_cursor, paginate_keyset
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = 'rows'
+    id = Column(Integer, primary_key=True)
+    status = Column(String(20))
+    timestamp = Column(DateTime)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        base = datetime(2024, 1, 1)
+        # Several rows share a timestamp so ties are broken on id
+        for i in range(1, 31):
+            session.add(Row(id=i, status='Pending' if i % 2 else 'Shipped', timestamp=base + timedelta(hours=i // 4)))
+        session.add(Row(id=31, status='Pending', timestamp=None))
+        session.commit()
+        yield session
+
+
+def test_cursor_round_trip():
+    ts = datetime(2024, 5, 6, 7, 8, 9)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_pages_cover_every_row_once_in_order(session):
+    seen, cursor = [], None
+    while True:
+        page = paginate_keyset(session.query(Row), Row, cursor=cursor, limit=7)
+        assert len(page.items) <= 7
+        seen.extend(page.items)
+        cursor = page.next_cursor
+        if not page.has_more:
+            break
+    assert len(seen) == 31 and len({r.id for r in seen}) == 31
+    dated = [(r.timestamp, r.id) for r in seen if r.timestamp]
+    assert dated == sorted(dated, reverse=True)
+    assert seen[-1].timestamp is None
+
+
+def test_filters_include_whole_end_day(session):
+    query = apply_order_filters(session.query(Row), Row, status='Shipped',
+                                start_date='2024-01-01', end_date='2024-01-01')
+    rows = query.all()
+    assert rows and all(r.status == 'Shipped' and r.timestamp.date() == datetime(2024, 1, 1).date() for r in rows)
+    with pytest.raises(ValueError):
+        apply_order_filters(session.query(Row), Row, start_date='01/02/2024')
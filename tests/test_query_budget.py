@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from query_budget_plugin import QueryBudgetExceeded, QueryLog, check_budget
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT)'))
+        conn.execute(text('INSERT INTO book VALUES (:id, :title)'), [{'id': i, 'title': f'Book {i}'} for i in range(5)])
+    yield engine
+    engine.dispose()
+
+
+def test_repeated_statements_are_reported_as_n_plus_one(engine):
+    with QueryLog(engine) as log, engine.connect() as conn:
+        ids = [row[0] for row in conn.execute(text('SELECT id FROM book'))]
+        for book_id in ids:
+            conn.execute(text('SELECT title FROM book WHERE id = :id'), {'id': book_id})
+    assert log.count == 6
+    assert log.repeated() == {'SELECT title FROM book WHERE id = ?': 5}
+    with pytest.raises(QueryBudgetExceeded, match='N\\+1'):
+        check_budget(log)
+    check_budget(log, repeat_threshold=None)
+
+
+def test_budget_counts_statements_and_ignores_patterns(engine):
+    with QueryLog(engine, ignore=['sqlite_master']) as log, engine.connect() as conn:
+        conn.execute(text('SELECT name FROM sqlite_master'))
+        conn.execute(text('SELECT title FROM book WHERE id IN (1, 2, 3)'))
+        # The same parameters twice is a re-read, not an N+1 loop
+        conn.execute(text('SELECT title FROM book WHERE id = :id'), {'id': 1})
+        conn.execute(text('SELECT title FROM book WHERE id = :id'), {'id': 1})
+    check_budget(log, max_queries=3)
+    with pytest.raises(QueryBudgetExceeded, match='ran 3 SQL statements, budget is 2'):
+        check_budget(log, max_queries=2, label='GET /cart')
+
+    # Statements after the block are not recorded
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert log.count == 3
+
+
+def test_query_budget_fixture(engine, query_budget):
+    with query_budget(1) as log, engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+    assert log.statements == ['SELECT 1']
+
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(1), engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+            conn.execute(text('SELECT 2'))
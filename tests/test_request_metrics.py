@@ -0,0 +1,103 @@
+import json
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.request_metrics import BACKGROUND, Histogram, RequestMetrics
+
+
+class Mailer:
+    def send(self, recipient):
+        return recipient
+
+
+@pytest.fixture
+def env(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'metrics.db'}"
+    db = SQLAlchemy(app)
+
+    class Book(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        title = db.Column(db.String(50))
+
+    logged = []
+    metrics = RequestMetrics(log=logged.append, repeat_threshold=3)
+    mailer = Mailer()
+    metrics.instrument(mailer, 'send', 'smtp')
+
+    @app.route('/books')
+    def books():
+        # One query for the ids, then one per book: an N+1 loop
+        ids = [row.id for row in db.session.query(Book.id).all()]
+        titles = [db.session.get(Book, book_id).title for book_id in ids]
+        mailer.send('reader@example.com')
+        return {'titles': titles}
+
+    @app.route('/fail')
+    def fail():
+        raise RuntimeError('boom')
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Book(title=f'Book {i}') for i in range(4)])
+        db.session.commit()
+        metrics.init_app(app, db)
+    yield app, metrics, mailer, logged
+
+
+def test_histogram_quantiles():
+    hist = Histogram((1, 2, 4, 8))
+    for value in [0.5] * 50 + [3] * 45 + [7] * 5:
+        hist.observe(value)
+    assert hist.quantile(0.5) == 1
+    assert 2 < hist.quantile(0.95) <= 4
+    assert 4 < hist.quantile(0.99) <= 7
+    assert list(hist.cumulative())[-1] == (float('inf'), 100)
+
+
+def test_requests_are_measured_per_endpoint(env):
+    app, metrics, mailer, logged = env
+    client = app.test_client()
+    for _ in range(3):
+        assert client.get('/books').status_code == 200
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    assert client.get('/fail').status_code == 500
+
+    rows = {row['endpoint']: row for row in metrics.snapshot()}
+    books = rows['books']
+    assert (books['requests'], books['errors'], books['max_queries']) == (3, 0, 5)
+    assert books['max_repeated'] == 3 and books['suspect_n_plus_one']
+    assert books['calls']['smtp']['count'] == 3
+    assert rows['fail']['errors'] == 1
+
+    record = json.loads(logged[0])
+    assert (record['endpoint'], record['queries'], record['smtp_count']) == ('books', 5, 1)
+
+    # Calls outside a request are kept apart
+    mailer.send('worker@example.com')
+    rows = {row['endpoint']: row for row in metrics.snapshot()}
+    assert rows[BACKGROUND]['calls']['smtp']['count'] == 1
+
+
+def test_failing_amount_counts_one_call_and_keeps_the_result():
+    metrics = RequestMetrics()
+    mailer = Mailer()
+    metrics.instrument(mailer, 'send', 'smtp', amount=lambda recipients: len(recipients))
+    assert list(mailer.send(r for r in ['a', 'b'])) == ['a', 'b']
+    rows = {row['endpoint']: row for row in metrics.snapshot()}
+    assert rows[BACKGROUND]['calls']['smtp']['count'] == 1
+
+
+def test_prometheus_text(env):
+    app, metrics, _, _ = env
+    app.test_client().get('/books')
+    text = metrics.prometheus()
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_request_sql_queries_bucket{endpoint="books",le="5.0"} 1' in text
+    assert 'http_request_duration_seconds_count{endpoint="books"} 1' in text
+    assert 'app_instrumented_calls_total{endpoint="books",operation="smtp"} 1' in text
+
+    metrics.reset()
+    assert metrics.snapshot() == []
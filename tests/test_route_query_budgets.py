@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.app import app, book_cache, db, order_stats, sales_rollup, Book, Customer, CustomerOrder, User
+
+# Budgets count every statement of the request, loading the user and saving the session included
+BOOKS = 20
+
+
+@pytest.fixture(scope='module')
+def shop(app_db):
+    with app.app_context():
+        manager = User(username='budget-mgr', email='mgr@example.com', is_manager=True)
+        manager.set_password('pw')
+        customer = Customer(username='reader', full_name='Reader', password_hash='x')
+        customer.email = 'reader@example.com'
+        db.session.add_all([manager, customer])
+        db.session.add_all([
+            Book(isbn=f'isbn-{i}', title=f'Book {i}', author='Author', price=10.0, quantity=50, genre='Fiction')
+            for i in range(BOOKS)
+        ])
+        now = datetime.utcnow()
+        for i in range(BOOKS):
+            order = CustomerOrder(customer_name='Reader', timestamp=now - timedelta(days=i))
+            order.customer_email = 'reader@example.com'
+            db.session.add(order)
+            order.add_line(book_isbn=f'isbn-{i}', quantity=1, unit_price=10.0, line_total=10.0)
+        db.session.commit()
+        sales_rollup.rebuild()
+        ids = {'manager': str(manager.id), 'customer': customer.get_id()}
+    return ids
+
+
+def client_for(user_id=None, cart=None):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        if user_id:
+            session['_user_id'] = user_id
+            session['_fresh'] = True
+            session['last_activity'] = datetime.now().isoformat()
+        if cart:
+            session['cart'] = cart
+    return client
+
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    # Every budget is measured without help from the in-process caches
+    book_cache.bump()
+    order_stats.invalidate()
+
+
+def test_cart_with_twenty_items(shop, query_budget):
+    client = client_for(cart={f'isbn-{i}': 1 for i in range(BOOKS)})
+    with query_budget(3, label='GET /cart'):
+        response = client.get('/cart')
+    assert response.status_code == 200 and b'Book 19' in response.data
+
+
+def test_customer_orders(shop, query_budget):
+    client = client_for(shop['customer'])
+    with query_budget(4, label='GET /customer/orders'):
+        response = client.get('/customer/orders')
+    assert response.status_code == 200 and b'Book 19' in response.data
+
+
+def test_all_orders(shop, query_budget):
+    client = client_for(shop['manager'])
+    with query_budget(4, label='GET /all_orders'):
+        response = client.get('/all_orders')
+    assert response.status_code == 200
+
+
+def test_sales_report(shop, query_budget):
+    client = client_for(shop['manager'])
+    start = (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%d')
+    end = datetime.utcnow().strftime('%Y-%m-%d')
+    with query_budget(6, label='GET /sales-report'):
+        response = client.get(f'/sales-report?start_date={start}&end_date={end}')
+    assert response.status_code == 200
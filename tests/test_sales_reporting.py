@@ -0,0 +1,94 @@
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.sales_reporting import SalesReporting, year_earlier
+from app.sales_rollup import SalesRollup
+
+
+@pytest.fixture
+def reporting():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy(app)
+
+    class Book(db.Model):
+        isbn = db.Column(db.String(20), primary_key=True)
+        author = db.Column(db.String(100))
+        title = db.Column(db.String(100))
+        price = db.Column(db.Float)
+        genre = db.Column(db.String(100))
+
+    class Purchase(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        book_isbn = db.Column(db.String(20))
+        quantity = db.Column(db.Integer)
+        timestamp = db.Column(db.DateTime)
+        status = db.Column(db.String(50))
+        unit_price = db.Column(db.Float)
+        line_total = db.Column(db.Float)
+        discount_amount = db.Column(db.Float)
+
+    def sale(isbn, quantity, unit_price, timestamp, discount=0.0):
+        return Purchase(book_isbn=isbn, quantity=quantity, unit_price=unit_price,
+                        line_total=unit_price * quantity, discount_amount=discount, timestamp=timestamp)
+
+    class Rollup(db.Model):
+        day = db.Column(db.Date, primary_key=True)
+        isbn = db.Column(db.String(20), primary_key=True)
+        status_bucket = db.Column(db.String(20), primary_key=True)
+        units = db.Column(db.Integer)
+        revenue = db.Column(db.Float)
+        orders = db.Column(db.Integer)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            # Book 1 has been repriced since these sales; 'gone' was deleted
+            Book(isbn='1', author='Ann', title='One', price=12.0, genre='Mystery'),
+            Book(isbn='2', author='Bob', title='Two', price=4.0, genre=None),
+            sale('1', 2, 10.0, datetime(2024, 1, 1, 9)),
+            sale('2', 1, 4.0, datetime(2024, 1, 1, 23, 30)),
+            sale('1', 1, 10.0, datetime(2024, 1, 2, 8), discount=1.0),
+            sale('gone', 5, 2.0, datetime(2024, 1, 1)),
+            sale('2', 3, 4.0, datetime(2024, 1, 5)),
+        ])
+        rollup = SalesRollup()
+        rollup.init_app(db, Rollup, Purchase)
+        rollup.rebuild()
+        db.session.commit()
+        service = SalesReporting()
+        service.init_app(db, Purchase, Book, Rollup)
+        yield service
+
+
+def test_totals_use_stored_prices_and_keep_deleted_books(reporting):
+    totals = reporting.totals(datetime(2024, 1, 1), datetime(2024, 1, 2))
+    assert totals == {'revenue': 43.0, 'units': 9, 'orders': 4}
+
+
+def test_breakdowns(reporting):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 5)
+    by_day = reporting.breakdown('day', start, end)
+    assert [(r['key'], r['revenue']) for r in by_day] == [
+        (date(2024, 1, 1), 34.0), (date(2024, 1, 2), 9.0), (date(2024, 1, 5), 12.0)]
+    by_genre = reporting.breakdown('genre', start, end)
+    assert [(r['key'], r['units'], r['orders']) for r in by_genre] == [('Mystery', 3, 2), ('Fiction', 9, 3)]
+    with pytest.raises(ValueError):
+        reporting.breakdown('weekday')
+
+
+def test_lines_query_uses_stored_prices(reporting):
+    lines = reporting.lines_query(datetime(2024, 1, 2), datetime(2024, 1, 2)).all()
+    assert [(l.title, l.unit_price, l.discount, l.total_price) for l in lines] == [('One', 10.0, 1.0, 9.0)]
+
+
+
+def test_daily_query_and_year_earlier(reporting):
+    rows = reporting.daily_query(datetime(2024, 1, 1), datetime(2024, 1, 2)).all()
+    assert [(r.day, r.isbn, r.units, r.revenue) for r in rows] == [
+        (date(2024, 1, 2), '1', 1, 9.0), (date(2024, 1, 1), '1', 2, 20.0),
+        (date(2024, 1, 1), '2', 1, 4.0), (date(2024, 1, 1), 'gone', 5, 10.0)]
+    assert year_earlier(datetime(2024, 2, 29)) == datetime(2023, 2, 28)
@@ -0,0 +1,115 @@
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+from app.sales_rollup import SalesRollup, status_bucket
+
+
+@pytest.fixture
+def env():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db = SQLAlchemy(app)
+
+    class Purchase(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        book_isbn = db.Column(db.String(20))
+        quantity = db.Column(db.Integer)
+        timestamp = db.Column(db.DateTime)
+        status = db.Column(db.String(50))
+        line_total = db.Column(db.Float)
+        discount_amount = db.Column(db.Float)
+
+    class Rollup(db.Model):
+        day = db.Column(db.Date, primary_key=True)
+        isbn = db.Column(db.String(20), primary_key=True)
+        status_bucket = db.Column(db.String(20), primary_key=True)
+        units = db.Column(db.Integer)
+        revenue = db.Column(db.Float)
+        orders = db.Column(db.Integer)
+
+    with app.app_context():
+        db.create_all()
+        rollup = SalesRollup()
+        rollup.init_app(db, Rollup, Purchase)
+        yield db, rollup, Purchase, Rollup
+
+
+def snapshot(db, Rollup):
+    return sorted((r.day, r.isbn, r.status_bucket, r.units, r.revenue, r.orders)
+                  for r in db.session.query(Rollup))
+
+
+def checkout(db, rollup, Purchase, isbn, quantity, price, when, status='Pending', discount=0.0):
+    purchase = Purchase(book_isbn=isbn, quantity=quantity, timestamp=when, status=status,
+                        line_total=price * quantity, discount_amount=discount)
+    db.session.add(purchase)
+    rollup.record_sale(purchase)
+    db.session.commit()
+    return purchase
+
+
+def test_status_buckets():
+    assert status_bucket('Confirmed') == 'open'
+    assert status_bucket('Delivered') == 'fulfilled'
+    assert status_bucket('Cancelled') == 'cancelled'
+    assert status_bucket(None) == 'open'
+
+
+def test_record_sale_accumulates_per_day_and_title(env):
+    db, rollup, Purchase, Rollup = env
+    checkout(db, rollup, Purchase, '1', 2, 10.0, datetime(2024, 3, 1, 9))
+    checkout(db, rollup, Purchase, '1', 1, 10.0, datetime(2024, 3, 1, 18))
+    checkout(db, rollup, Purchase, '2', 1, 4.0, datetime(2024, 3, 2), discount=0.5)
+    assert snapshot(db, Rollup) == [
+        (date(2024, 3, 1), '1', 'open', 3, 30.0, 2),
+        (date(2024, 3, 2), '2', 'open', 1, 3.5, 1),
+    ]
+
+
+def test_status_change_moves_between_buckets(env):
+    db, rollup, Purchase, Rollup = env
+    first = checkout(db, rollup, Purchase, '1', 2, 10.0, datetime(2024, 3, 1))
+    checkout(db, rollup, Purchase, '1', 1, 10.0, datetime(2024, 3, 1))
+
+    first.status = 'Cancelled'
+    rollup.record_status_change(first, 'Pending')
+    db.session.commit()
+    assert snapshot(db, Rollup) == [
+        (date(2024, 3, 1), '1', 'cancelled', 2, 20.0, 1),
+        (date(2024, 3, 1), '1', 'open', 1, 10.0, 1),
+    ]
+
+    # Moving within a bucket is a no-op
+    first.status = 'Cancelled'
+    rollup.record_status_change(first, 'Cancelled')
+    db.session.commit()
+    assert len(snapshot(db, Rollup)) == 2
+
+
+def test_rebuild_matches_incremental_updates(env):
+    db, rollup, Purchase, Rollup = env
+    checkout(db, rollup, Purchase, '1', 2, 10.0, datetime(2024, 3, 1))
+    shipped = checkout(db, rollup, Purchase, '2', 3, 4.0, datetime(2024, 3, 2))
+    shipped.status = 'Shipped'
+    rollup.record_status_change(shipped, 'Pending')
+    db.session.commit()
+    incremental = snapshot(db, Rollup)
+
+    assert rollup.rebuild() == 2
+    db.session.commit()
+    assert snapshot(db, Rollup) == incremental
+
+
+def test_rebuild_range_leaves_other_days(env):
+    db, rollup, Purchase, Rollup = env
+    db.session.add_all([
+        Purchase(book_isbn='1', quantity=1, timestamp=datetime(2024, 3, 1), status='Pending', line_total=10.0),
+        Purchase(book_isbn='1', quantity=4, timestamp=datetime(2024, 3, 2, 23, 59), status='Delivered', line_total=40.0),
+    ])
+    db.session.commit()
+    rollup.rebuild(date(2024, 3, 2), date(2024, 3, 2))
+    db.session.commit()
+    assert snapshot(db, Rollup) == [(date(2024, 3, 2), '1', 'fulfilled', 4, 40.0, 1)]
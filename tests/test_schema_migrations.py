@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.schema_migrations import (
+    AddColumn, CreateIndex, Migration, applied_versions, full_scan_warnings, migrate,
+)
+
+MIGRATIONS = [
+    Migration(1, 'genre', [AddColumn('book', 'genre', 'VARCHAR(100)')]),
+    Migration(2, 'genre index', [CreateIndex('ix_book_genre', 'book', ['genre'])]),
+    # Tables that do not exist yet are left to create_all()
+    Migration(3, 'missing table', [AddColumn('orders', 'note', 'TEXT')]),
+]
+
+QUERIES = {'books by genre': ("SELECT isbn FROM book WHERE genre = :genre", {'genre': 'Fiction'})}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "schema.db"}')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE book (isbn VARCHAR(20) PRIMARY KEY, title VARCHAR(100))'))
+        conn.execute(text("INSERT INTO book VALUES ('1', 'One')"))
+    yield engine
+    engine.dispose()
+
+
+def columns(engine, table):
+    with engine.connect() as conn:
+        return {row[1] for row in conn.execute(text(f'PRAGMA table_info({table})'))}
+
+
+def test_migrate_applies_pending_versions_once(engine):
+    logged = []
+    assert migrate(engine, MIGRATIONS, log=logged.append) == [1, 2, 3]
+    assert 'genre' in columns(engine, 'book')
+    assert applied_versions(engine) == [1, 2, 3]
+    assert '  1: add column book.genre' in logged
+
+    assert migrate(engine, MIGRATIONS) == []
+    assert migrate(engine, MIGRATIONS + [Migration(4, 'title index', [CreateIndex('ix_book_title', 'book', ['title'])])]) == [4]
+
+
+def test_steps_are_idempotent_after_an_interrupted_run(engine):
+    # The column exists but the version was never recorded
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE book ADD COLUMN genre VARCHAR(100)'))
+    assert migrate(engine, MIGRATIONS) == [1, 2, 3]
+    assert applied_versions(engine) == [1, 2, 3]
+
+
+def test_full_scan_warning_clears_once_indexed(engine):
+    migrate(engine, MIGRATIONS[:1])
+    warnings = full_scan_warnings(engine, QUERIES)
+    assert len(warnings) == 1 and warnings[0].startswith('books by genre: full table scan')
+
+    migrate(engine, MIGRATIONS)
+    assert full_scan_warnings(engine, QUERIES) == []
+
+
+def test_unplannable_query_is_reported(engine):
+    warnings = full_scan_warnings(engine, {'missing': ("SELECT 1 FROM nowhere", {})})
+    assert warnings[0].startswith('missing: cannot plan query')
@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import column, create_engine, literal_column, select, table, text
+
+from app.search_index import build_match_expression, ensure_search_index, isbn_fragment, search_subquery
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "search.db"}')
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE book (isbn VARCHAR(20) PRIMARY KEY, title VARCHAR(100), '
+            'author VARCHAR(100), description TEXT)'
+        ))
+        conn.execute(text("INSERT INTO book VALUES ('9780451524935', '1984', 'George Orwell', 'Dystopian classic')"))
+    assert ensure_search_index(engine)
+    yield engine
+    engine.dispose()
+
+
+def search(engine, query):
+    matches = search_subquery(query)
+    book = table('book', column('isbn'))
+    stmt = (
+        select(book.c.isbn)
+        .select_from(book.join(matches, literal_column('book.rowid') == matches.c.book_rowid))
+        .order_by(matches.c.rank)
+    )
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(stmt)]
+
+
+def test_existing_rows_are_indexed(engine):
+    assert search(engine, 'orwell') == ['9780451524935']
+
+
+def test_prefix_and_isbn_match(engine):
+    assert search(engine, 'dysto') == ['9780451524935']
+    assert search(engine, '978045152') == ['9780451524935']
+
+
+def test_triggers_keep_index_in_sync(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO book VALUES ('9780062315007', 'The Alchemist', 'Paulo Coelho', 'Dreams')"))
+        conn.execute(text("UPDATE book SET title = 'Nineteen Eighty-Four' WHERE isbn = '9780451524935'"))
+    assert search(engine, 'alchem') == ['9780062315007']
+    assert search(engine, 'nineteen') == ['9780451524935']
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM book WHERE isbn = '9780062315007'"))
+    assert search(engine, 'alchem') == []
+
+
+def test_update_trigger_is_limited_to_indexed_columns(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "old.db"}')
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE book (isbn VARCHAR(20) PRIMARY KEY, title VARCHAR(100), '
+            'author VARCHAR(100), description TEXT, quantity INTEGER)'
+        ))
+        conn.execute(text("INSERT INTO book VALUES ('1', 'Dune', 'Frank Herbert', 'Desert planet', 5)"))
+        # Trigger as created by earlier versions, firing on every column
+        conn.execute(text("CREATE VIRTUAL TABLE book_fts USING fts5(isbn, title, author, description, "
+                          "content='book', content_rowid='rowid')"))
+        conn.execute(text("INSERT INTO book_fts(book_fts) VALUES ('rebuild')"))
+        conn.execute(text("CREATE TRIGGER book_fts_au AFTER UPDATE ON book BEGIN SELECT 1; END"))
+    assert ensure_search_index(engine)
+    with engine.connect() as conn:
+        trigger = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'book_fts_au'")).scalar()
+    assert 'AFTER UPDATE OF isbn, title, author, description ON book' in trigger
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE book SET quantity = 4 WHERE isbn = '1'"))
+        conn.execute(text("UPDATE book SET title = 'Dune Messiah' WHERE isbn = '1'"))
+    assert search(engine, 'messiah') == ['1']
+    engine.dispose()
+
+
+def test_title_match_ranks_above_description_match(engine):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO book VALUES ('1', 'Dragons', 'A. Author', 'Nothing here')"))
+        conn.execute(text("INSERT INTO book VALUES ('2', 'Other', 'B. Author', 'A book about dragons')"))
+    assert search(engine, 'dragons') == ['1', '2']
+
+
+def test_match_expression_quotes_user_input():
+    assert build_match_expression('harry "pot') == '"harry"* "pot"*'
+    assert build_match_expression('  -- ') is None
+
+
+def test_isbn_fragment_recognizes_isbn_like_input():
+    assert isbn_fragment(' 978-0-451 ') == '9780451'
+    assert isbn_fragment('0451524') == '0451524'
+    assert isbn_fragment('0-8044-2957-x') == '080442957X'
+    assert isbn_fragment('12') is None
+    assert isbn_fragment('1984 orwell') is None
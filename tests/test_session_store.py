@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, flash, get_flashed_messages, session
+from flask_sqlalchemy import SQLAlchemy
+
+from app.session_store import ServerSessionInterface, SqlSessionStore
+
+
+@pytest.fixture
+def env(tmp_path):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'sessions.db'}"
+    db = SQLAlchemy(app)
+
+    class ServerSessionRecord(db.Model):
+        __tablename__ = 'server_sessions'
+        id = db.Column(db.String(64), primary_key=True)
+        data = db.Column(db.Text, nullable=False)
+        expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    store = SqlSessionStore()
+    store.init_app(db, ServerSessionRecord)
+    interface = ServerSessionInterface(store, cache_size=2)
+    app.session_interface = interface
+
+    @app.route('/add/<isbn>')
+    def add(isbn):
+        cart = session.get('cart', {})
+        cart[isbn] = cart.get(isbn, 0) + 1
+        session['cart'] = cart
+        flash(f"Added {isbn}", 'success')
+        return 'ok'
+
+    @app.route('/cart')
+    def cart():
+        return {'cart': session.get('cart', {}), 'flashes': get_flashed_messages(with_categories=True)}
+
+    @app.route('/clear')
+    def clear():
+        session.clear()
+        return 'ok'
+
+    @app.route('/login')
+    def login():
+        interface.regenerate(session)
+        session['user'] = 'reader'
+        return 'ok'
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        interface.regenerate(session)
+        return 'ok'
+
+    with app.app_context():
+        db.create_all()
+    yield app, db, interface, ServerSessionRecord
+
+
+def rows(app, db, model):
+    with app.app_context():
+        return db.session.query(model).all()
+
+
+def test_cookie_carries_only_the_session_id(env):
+    app, db, interface, model = env
+    client = app.test_client()
+    client.get('/add/111')
+    cookie = client.get_cookie('session').value
+    [row] = rows(app, db, model)
+    assert row.id == cookie
+    assert 'cart' not in cookie and '"cart"' in row.data
+
+    # Flash messages (lists of tuples) survive the round trip
+    assert client.get('/cart').json == {'cart': {'111': 1}, 'flashes': [['success', 'Added 111']]}
+
+
+def test_reads_go_to_the_store_when_the_cache_misses(env):
+    app, db, interface, model = env
+    client = app.test_client()
+    client.get('/add/111')
+    interface._cache.clear()
+    client.get('/add/111')
+    assert client.get('/cart').json['cart'] == {'111': 2}
+
+
+def test_empty_sessions_are_not_stored_and_cleared_ones_are_deleted(env):
+    app, db, interface, model = env
+    client = app.test_client()
+    client.get('/cart')
+    assert rows(app, db, model) == [] and client.get_cookie('session') is None
+
+    client.get('/add/111')
+    client.get('/cart')
+    client.get('/clear')
+    assert rows(app, db, model) == []
+
+
+def test_unknown_or_expired_ids_start_a_new_session(env):
+    app, db, interface, model = env
+    client = app.test_client()
+    client.set_cookie('session', 'forged')
+    assert client.get('/cart').json['cart'] == {}
+
+    client.get('/add/111')
+    with app.app_context():
+        db.session.query(model).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+        db.session.commit()
+    interface._cache.clear()
+    assert client.get('/cart').json['cart'] == {}
+    with app.app_context():
+        assert interface.sweep() == 1
+    assert rows(app, db, model) == []
+
+
+def test_regenerate_moves_the_session_to_a_new_id(env):
+    app, db, interface, model = env
+    client = app.test_client()
+    client.get('/add/111')
+    before = client.get_cookie('session').value
+
+    client.get('/login')
+    after = client.get_cookie('session').value
+    [row] = rows(app, db, model)
+    assert after != before and row.id == after
+    assert client.get('/cart').json['cart'] == {'111': 1}
+
+    # The old ID is gone from the store and the cache
+    stale = app.test_client()
+    stale.set_cookie('session', before)
+    assert stale.get('/cart').json['cart'] == {}
+
+    client.get('/logout')
+    assert rows(app, db, model) == [] and client.get_cookie('session') is None
@@ -0,0 +1,61 @@
+import threading
+
+from sqlalchemy import create_engine, text
+
+from app.sqlite_tuning import DEFAULT_PRAGMAS, check_settings, engine_options, install_pragmas, pragma_profile
+
+
+def make_engine(path, profile):
+    engine = create_engine(f'sqlite:///{path}', **engine_options(profile, environ={}))
+    install_pragmas(engine, profile)
+    return engine
+
+
+def test_profile_reads_environment_overrides():
+    profile = pragma_profile({'SQLITE_SYNCHRONOUS': 'full', 'SQLITE_BUSY_TIMEOUT': '250'})
+    assert profile['synchronous'] == 'FULL'
+    assert profile['busy_timeout'] == 250
+    assert profile['journal_mode'] == 'WAL'
+    assert engine_options(profile, environ={})['connect_args']['timeout'] == 0.25
+
+
+def test_every_connection_gets_the_profile(tmp_path):
+    engine = make_engine(tmp_path / 'tuned.db', dict(DEFAULT_PRAGMAS))
+    settings, problems = check_settings(engine, DEFAULT_PRAGMAS)
+    assert problems == []
+    assert settings['journal_mode'] == 'WAL' and settings['synchronous'] == 'NORMAL'
+    assert settings['temp_store'] == 'MEMORY'
+    engine.dispose()
+
+
+def test_check_reports_pragmas_that_did_not_take():
+    engine = create_engine('sqlite://')
+    install_pragmas(engine, dict(DEFAULT_PRAGMAS))
+    _, problems = check_settings(engine, DEFAULT_PRAGMAS)
+    # In-memory databases cannot use WAL (or memory-map anything)
+    assert 'PRAGMA journal_mode is MEMORY, expected WAL' in problems
+    assert not any('busy_timeout' in problem or 'synchronous' in problem for problem in problems)
+
+
+def test_readers_do_not_wait_for_an_open_write(tmp_path):
+    engine = make_engine(tmp_path / 'wal.db', dict(DEFAULT_PRAGMAS, busy_timeout=100))
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE book (isbn TEXT PRIMARY KEY, quantity INTEGER)'))
+        conn.execute(text("INSERT INTO book VALUES ('a', 5)"))
+
+    seen = []
+    with engine.connect() as writer:
+        writer.execute(text("UPDATE book SET quantity = 4 WHERE isbn = 'a'"))
+
+        def read():
+            with engine.connect() as reader:
+                seen.append(reader.execute(text("SELECT quantity FROM book")).scalar())
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        writer.commit()
+
+    # The reader saw the last committed value instead of timing out on the lock
+    assert seen == [5]
+    engine.dispose()